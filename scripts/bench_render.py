@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Compare uncached, per-call and batch timetable rendering.
+
+Builds N class timetables from data/sample_timetable.csv (rotating the
+subjects so every class differs) and reports images/second for each path:
+uncached draws every string with ImageDraw.text, per-call and batch blit
+masks from the sprite atlas.
+"""
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+
+# Ensure repo root is on sys.path to import `src` when invoked as a script
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.render_image import _RenderContext, _render, encode_jpeg, render_timetable_bytes, render_timetable_batch
+
+
+def load_sample(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return [
+            {"period": int(r["period"]), "subject": r["subject"], "room": r.get("room", "")}
+            for r in csv.DictReader(f)
+        ]
+
+
+def build_jobs(sample, classes: int, periods: int):
+    subjects = [r["subject"] for r in sample] + ["과학", "음악", "미술", "정보"]
+    date_str = "2025년09월02일 화요일"
+    jobs = []
+    for c in range(classes):
+        tt = [
+            {"period": p, "subject": subjects[(c + p) % len(subjects)], "room": ""}
+            for p in range(1, periods + 1)
+        ]
+        jobs.append((date_str, tt))
+    return jobs
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--classes", type=int, default=30, help="Number of class images (default: 30)")
+    p.add_argument("--periods", type=int, default=7, help="Periods per timetable (default: 7)")
+    p.add_argument("--sample", default=str(ROOT / "data" / "sample_timetable.csv"))
+    args = p.parse_args()
+
+    jobs = build_jobs(load_sample(args.sample), args.classes, args.periods)
+
+    t0 = time.perf_counter()
+    for date_str, tt in jobs:
+        img, _ = _render(date_str, tt, ctx=_RenderContext(cache_text=False))
+        encode_jpeg(img)
+    uncached = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for date_str, tt in jobs:
+        render_timetable_bytes(date_str, tt)
+    single = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    render_timetable_batch(jobs)
+    batch = time.perf_counter() - t0
+
+    n = len(jobs)
+    print(f"uncached: {n / uncached:7.2f} img/s ({uncached * 1000 / n:.1f} ms/img)")
+    print(f"per-call: {n / single:7.2f} img/s ({single * 1000 / n:.1f} ms/img)")
+    print(f"batch   : {n / batch:7.2f} img/s ({batch * 1000 / n:.1f} ms/img)")
+    print(f"speedup : {uncached / batch:.2f}x (batch vs uncached)")
+
+
+if __name__ == "__main__":
+    main()
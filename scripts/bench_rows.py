@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Compare legacy dict rows with slot-based Period/Timetable rows.
+
+Builds whole-school, multi-week timetables from data/sample_timetable.csv
+and reports memory per 10k rows (tracemalloc) and the time to hash every
+day: legacy `calc_hash` (sorted JSON + SHA-256) versus the incremental
+binary digest carried by Timetable.
+"""
+import argparse
+import csv
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Ensure repo root is on sys.path to import `src` when invoked as a script
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.detect_change import calc_hash, timetable_hash
+from src.timetable_types import Period, Timetable
+
+
+def load_subjects(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        subjects = [r["subject"] for r in csv.DictReader(f)]
+    return subjects + ["과학", "음악", "미술", "정보", "한국사", "기술·가정"]
+
+
+def build_raw(subjects, days: int, classes: int, periods: int):
+    """(date, rows) per class-day, with fresh (non-shared) subject strings like NEIS JSON yields."""
+    out = []
+    for d in range(days):
+        ymd = f"2025{9 + d // 30:02d}{1 + d % 30:02d}"
+        for c in range(classes):
+            rows = [
+                {"period": p, "subject": "".join(subjects[(c + p + d) % len(subjects)]), "room": f"{200 + c}"}
+                for p in range(1, periods + 1)
+            ]
+            out.append((ymd, rows))
+    return out
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    obj = build()
+    secs = time.perf_counter() - t0
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return obj, size, secs
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--days", type=int, default=20, help="School days (default: 20)")
+    p.add_argument("--classes", type=int, default=36, help="Classes in the school (default: 36)")
+    p.add_argument("--periods", type=int, default=7, help="Periods per day (default: 7)")
+    p.add_argument("--sample", default=str(ROOT / "data" / "sample_timetable.csv"))
+    args = p.parse_args()
+
+    raw = build_raw(load_subjects(args.sample), args.days, args.classes, args.periods)
+    n_rows = sum(len(rows) for _, rows in raw)
+
+    dicts, dict_mem, _ = measure(
+        lambda: [(ymd, [{"period": r["period"], "subject": r["subject"].strip(), "room": r["room"]} for r in rows])
+                 for ymd, rows in raw]
+    )
+    tts, slot_mem, build_s = measure(
+        lambda: [Timetable((Period(r["period"], r["subject"], r["room"]) for r in rows), date=ymd) for ymd, rows in raw]
+    )
+
+    t0 = time.perf_counter()
+    legacy = [calc_hash({"date": ymd, "timetable": rows}) for ymd, rows in dicts]
+    legacy_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    digests = [timetable_hash(tt.date, tt) for tt in tts]
+    digest_s = time.perf_counter() - t0
+    assert len(set(legacy)) == len(set(digests))
+
+    per10k = 10_000 / n_rows
+    print(f"{len(raw)} class-days, {n_rows} rows")
+    print(f"{'':12}{'KB/10k rows':>14}{'hash all ms':>14}{'us/day':>10}")
+    print(f"{'dict rows':12}{dict_mem * per10k / 1024:14.1f}{legacy_s * 1000:14.2f}{legacy_s / len(raw) * 1e6:10.1f}")
+    print(f"{'Period rows':12}{slot_mem * per10k / 1024:14.1f}{digest_s * 1000:14.2f}{digest_s / len(raw) * 1e6:10.1f}")
+    print(f"(Timetable build incl. incremental digest: {build_s * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
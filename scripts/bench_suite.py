@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""Benchmark suite for the render / normalize / hash / daily-job stages.
+
+Fixtures come from data/sample_timetable.csv. The daily-job stage runs the
+real `daily_job` against the local fake NEIS, Graph and image-host servers
+(src/fake_servers.py), so no network or keys are needed. --latency and
+--error-rate inject faults into those servers.
+
+Each stage runs in its own process so peak RSS is attributable to it.
+Results (p50/p95 latency, throughput, peak RSS) are printed and written as
+JSON; pass --compare with an earlier result file to see per-stage deltas.
+
+    python scripts/bench_suite.py --out bench_results/$(git rev-parse --short HEAD).json
+    python scripts/bench_suite.py --compare bench_results/<older>.json
+"""
+import argparse
+import csv
+import datetime as dt
+import json
+import multiprocessing as mp
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Ensure repo root is on sys.path to import `src` when invoked as a script
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+SAMPLE_CSV = ROOT / "data" / "sample_timetable.csv"
+STAGES = ["render", "normalize", "hash", "daily_job", "graph_batch"]
+
+
+def load_fixture(path=SAMPLE_CSV):
+    with open(path, "r", encoding="utf-8") as f:
+        return [
+            {"period": int(r["period"]), "subject": r["subject"], "room": r.get("room", "")}
+            for r in csv.DictReader(f)
+        ]
+
+
+# --- Stages (each runs in a child process) -----------------------------------
+
+
+def _stage_render(rows, iters):
+    from src.render_image import render_timetable_bytes
+
+    date_str = "2025년09월02일 화요일"
+    render_timetable_bytes(date_str, rows)  # warm fonts/templates/atlas
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        render_timetable_bytes(date_str, rows)
+        yield time.perf_counter() - t0
+
+
+def _stage_normalize(rows, iters):
+    from src.fetch_neis import _normalize_subject
+
+    names = [r["subject"] for r in rows]
+    with open(ROOT / "data" / "subject_aliases.json", "r", encoding="utf-8") as f:
+        names += list(json.load(f).keys())
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        for n in names:
+            _normalize_subject(n)
+        yield time.perf_counter() - t0
+
+
+def _stage_hash(rows, iters):
+    from src.detect_change import calc_hash
+
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        calc_hash({"date": "20250902", "timetable": rows})
+        yield time.perf_counter() - t0
+
+
+def _stage_daily_job(rows, iters):
+    from src import daemon
+
+    state_path = os.environ["STATE_PATH"]
+    ymd = daemon.now_kr().strftime("%Y%m%d")
+    for _ in range(iters):
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        t0 = time.perf_counter()
+        daemon.daily_job()
+        dt_ = time.perf_counter() - t0
+        with open(state_path, "r", encoding="utf-8") as f:
+            if not json.load(f).get(ymd, {}).get("post_id", "").startswith("STUB_POST_"):
+                raise RuntimeError("daily_job did not publish through the stub")
+        yield dt_
+
+
+def _stage_graph_batch(rows, iters, accounts=10, latency=0.02):
+    """Derive creds for N accounts: N sequential GETs vs one batch round trip.
+
+    Uses its own Graph stub with per-request latency so round trips dominate.
+    """
+    import requests
+    from src import token_manager
+    from src.fake_servers import Faults, graph_route, start_server
+
+    srv, url = start_server(graph_route, Faults(latency=latency))
+    token_manager.GRAPH = url + "/v23.0"
+    accs = [{"user_token": f"U{i}", "page_id": str(1000 + i)} for i in range(accounts)]
+    expected = [(f"PAGE_TOKEN_{a['page_id']}", f"IG_{a['page_id']}") for a in accs]
+    seq = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        got = []
+        for a in accs:
+            j = requests.get(f"{url}/v23.0/{a['page_id']}", params={"fields": "access_token,instagram_business_account{id}", "access_token": a["user_token"]}, timeout=10).json()
+            got.append((j["access_token"], j["instagram_business_account"]["id"]))
+        seq.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        batched = token_manager.get_creds_many(accs)
+        dt_ = time.perf_counter() - t0
+        if batched != expected or got != expected:
+            raise RuntimeError("batch results do not match per-account lookups")
+        yield dt_
+    srv.shutdown()
+    print(f"graph_batch: {accounts} accounts, sequential p50 {_pct(seq, 50) * 1000:.1f} ms vs batch (reported below)")
+
+
+def _child(stage, iters, env, q):
+    os.chdir(ROOT)  # templates/fonts/aliases resolve relative to the repo root
+    os.environ.update(env)
+    rows = load_fixture()
+    fn = globals()[f"_stage_{stage}"]
+    try:
+        t_start = time.perf_counter()
+        samples = list(fn(rows, iters))
+        wall = time.perf_counter() - t_start
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+        if rss_kb and sys.platform == "darwin":
+            rss_kb //= 1024  # bytes on macOS
+        q.put({"samples": samples, "wall": wall, "peak_rss_kb": rss_kb})
+    except Exception as e:
+        q.put({"error": repr(e)})
+
+
+def _pct(samples, p):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+
+def run_stage(stage, iters, env):
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(stage, iters, env, q))
+    proc.start()
+    res = q.get()
+    proc.join()
+    if "error" in res:
+        return {"error": res["error"]}
+    s = res["samples"]
+    return {
+        "iterations": len(s),
+        "p50_ms": _pct(s, 50) * 1000,
+        "p95_ms": _pct(s, 95) * 1000,
+        "mean_ms": statistics.fmean(s) * 1000,
+        "throughput_per_s": len(s) / sum(s) if sum(s) else None,
+        "peak_rss_kb": res["peak_rss_kb"],
+    }
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    p = argparse.ArgumentParser(description="Run the render/normalize/hash/daily_job benchmark suite")
+    p.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {STAGES}")
+    p.add_argument("--iters", type=int, default=50, help="Iterations per stage (default: 50)")
+    p.add_argument("--out", help="Write JSON results to this path")
+    p.add_argument("--compare", help="Earlier JSON results to diff against")
+    p.add_argument("--latency", type=float, default=0.0, help="Seconds added to every fake-server request")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Share of fake-server requests failing with 500")
+    args = p.parse_args()
+
+    rows = load_fixture()
+    work = tempfile.mkdtemp(prefix="bench-")
+    log_env = {"LOG_LEVEL": "WARNING", "LOG_DIR": os.path.join(work, "logs")}
+    # Imported only now: src.config reads LOG_DIR/LOG_LEVEL on import, and the
+    # fake servers' logs must not land in the repo's logs/
+    os.environ.update(log_env)
+    from src.fake_servers import FakeStack, Faults
+
+    fakes = FakeStack(rows, faults=Faults(latency=args.latency, error_rate=args.error_rate, seed=0))
+    env = {
+        **fakes.env(),
+        **log_env,
+        "NEIS_KEY": "bench",
+        "POST_TEST_MODE": "false",
+        "IG_PAGE_ACCESS_TOKEN": "bench-token",
+        "IG_BUSINESS_ID": "17841400000000000",
+        "IMAGE_URL_TEMPLATE": "",
+        "RENDER_SAVE_DIR": "",
+        "STATE_PATH": os.path.join(work, "state", "posted.json"),
+        "STATE_DIR": os.path.join(work, "state"),
+        "SPRITE_CACHE_DIR": os.path.join(work, "sprites"),
+    }
+
+    results = {
+        "commit": _git_rev(),
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": args.iters,
+        "stages": {},
+    }
+    for stage in [s.strip() for s in args.stages.split(",") if s.strip()]:
+        results["stages"][stage] = run_stage(stage, args.iters, env)
+    fakes.shutdown()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("stages", {})
+
+    print(f"{'stage':<10} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>9} {'peak RSS MB':>12}")
+    for stage, r in results["stages"].items():
+        if "error" in r:
+            print(f"{stage:<10} ERROR {r['error']}")
+            continue
+        rss = f"{r['peak_rss_kb'] / 1024:.1f}" if r["peak_rss_kb"] else "-"
+        line = f"{stage:<10} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['throughput_per_s']:9.1f} {rss:>12}"
+        b = baseline.get(stage)
+        if b and "p50_ms" in b and b["p50_ms"]:
+            line += f"   p50 {100 * (r['p50_ms'] - b['p50_ms']) / b['p50_ms']:+.1f}%"
+        print(line)
+
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
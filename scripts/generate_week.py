@@ -1,8 +1,12 @@
 #!/usr/bin/env python
 import os
 import sys
+import json
+import time
 import argparse
+import contextvars
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
 from typing import List
 
@@ -14,9 +18,12 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-# Reuse existing modules without modifying them
 from src.fetch_neis import find_school_codes, get_timetable
-from src.render_image import render_timetable_image
+from src.render_image import render_timetable_bytes
+from src.detect_change import calc_hash
+from src.uploader import get_public_image_url
+from src.post_instagram import upload_carousel_via_urls, CAROUSEL_MIN, CAROUSEL_MAX
+from src import neis_quota
 
 
 TZ = pytz.timezone("Asia/Seoul")
@@ -29,6 +36,25 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--start", help="Start date YYYYMMDD (default: Monday of current week)")
     p.add_argument("--days", type=int, default=5, help="Number of days (default: 5)")
     p.add_argument("--include-weekend", action="store_true", help="Shortcut to 7 days from Monday")
+    p.add_argument("--out-dir", default="out", help="Directory for rendered images (default: out)")
+    p.add_argument("--no-save", action="store_true", help="Render in memory only; do not write images to disk")
+    p.add_argument(
+        "--carousel",
+        action="store_true",
+        help="Publish the generated days as one Instagram carousel post (respects POST_TEST_MODE)",
+    )
+    p.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Parallel NEIS fetches and render processes (default: 1, serial)",
+    )
+    p.add_argument(
+        "--since-changed",
+        action="store_true",
+        help="Skip dates whose saved image already matches the timetable and renderer (tracked in <out-dir>/manifest.json)",
+    )
+    p.add_argument("--upload-workers", type=int, default=4, help="Concurrent image uploads in carousel mode (default: 4)")
     return p.parse_args()
 
 
@@ -46,11 +72,94 @@ def date_list(start: dt.date, days: int) -> List[dt.date]:
     return [start + dt.timedelta(days=i) for i in range(days)]
 
 
+def build_week_caption(days, school_name: str, grade: int, class_nm) -> str:
+    """One caption for the whole week: a line per day with its subjects in order."""
+    first, last = days[0][0], days[-1][0]
+    lines = [f"[{school_name} {grade}학년 {class_nm}반 | {first.strftime('%m/%d')}~{last.strftime('%m/%d')} 주간 시간표]"]
+    for d, tt in days:
+        subjects = " · ".join((row.get("subject", "-") or "-").strip() for row in tt) or "등록된 시간표 없음"
+        lines.append(f"{'월화수목금토일'[d.weekday()]}  {subjects}")
+    return "\n".join(lines)
+
+
+def publish_carousel(rendered, args, school_name: str, grade: int, class_nm) -> str:
+    """Upload all images concurrently, then create and publish a single carousel."""
+    post_test_mode = os.getenv("POST_TEST_MODE", "true").lower() == "true"
+
+    def upload(item):
+        d, tt, data, out_path = item
+        if post_test_mode:
+            return "https://example.com/placeholder.jpg"
+        return get_public_image_url(out_path, data=data, filename=f"{d.strftime('%Y%m%d')}.jpg")
+
+    with ThreadPoolExecutor(max_workers=max(1, args.upload_workers)) as pool:
+        urls = list(pool.map(upload, rendered))
+    caption = build_week_caption([(d, tt) for d, tt, _, _ in rendered], school_name, grade, class_nm)
+    return upload_carousel_via_urls(urls, caption)
+
+
 def main():
     load_dotenv()
 
     args = parse_args()
+    # Bulk generation yields NEIS quota to the daily post and update checks
+    with neis_quota.priority("bulk"):
+        generate(args)
+    neis_quota.log_summary("generate_week")
+
+
+# Env prefixes that change the rendered layout; part of the --since-changed key
+RENDER_ENV_PREFIXES = ("DATE_", "SUBJECT_", "FONT_", "LUNCH_", "BRAND_", "TEMPLATE_")
+MANIFEST_NAME = "manifest.json"
+# Modules whose code decides the pixels: layout, text tiles, font subsets and row normalization
+RENDER_MODULES = ("render_image.py", "sprite_atlas.py", "font_subset.py", "render_assets.py", "timetable_types.py")
+
+
+def render_fingerprint() -> str:
+    """Identify renderer inputs besides the timetable: code, assets and layout env."""
+    parts = []
+    for p in [*(ROOT / "src" / name for name in RENDER_MODULES), *sorted((ROOT / "assets").glob("*"))]:
+        try:
+            st = p.stat()
+            parts.append([p.name, st.st_size, int(st.st_mtime)])
+        except OSError:
+            continue
+    env = sorted((k, v) for k, v in os.environ.items() if k.startswith(RENDER_ENV_PREFIXES))
+    return calc_hash({"files": parts, "env": env})
+
 
+def load_manifest(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir: str, manifest: dict) -> None:
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = os.path.join(out_dir, f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST_NAME))
+
+
+def _render_one(date_str, tt, brand, school_name, grade, class_nm, out_path):
+    # Runs in a worker process; each worker keeps its own fonts/templates/atlas
+    t0 = time.perf_counter()
+    data = render_timetable_bytes(
+        date_str,
+        tt,
+        brand_color=brand,
+        school_name=school_name,
+        grade=grade,
+        class_nm=class_nm,
+        out_path=out_path,
+    )
+    return data, time.perf_counter() - t0
+
+
+def generate(args: argparse.Namespace):
     # Resolve date range
     if args.start:
         start = dt.datetime.strptime(args.start, "%Y%m%d").date()
@@ -59,6 +168,13 @@ def main():
         start = monday_of_week(today)
 
     days = 7 if args.include_weekend else args.days
+    if args.carousel and not CAROUSEL_MIN <= days <= CAROUSEL_MAX:
+        raise SystemExit(f"--carousel needs {CAROUSEL_MIN}-{CAROUSEL_MAX} days, got {days}")
+    # IMAGE_URL_TEMPLATE serves files from disk, so carousel uploads keep the disk copy
+    no_save = args.no_save and not (args.carousel and os.getenv("IMAGE_URL_TEMPLATE", "").strip())
+    if args.since_changed and no_save:
+        raise SystemExit("--since-changed compares against saved images; it cannot be combined with --no-save")
+    jobs = max(1, args.jobs)
 
     # School/env settings (same defaults as daemon)
     school_name = os.getenv("SCHOOL_NAME", "선린인터넷고등학교")
@@ -73,27 +189,74 @@ def main():
     sem = os.getenv("SEM") or None
     brand = os.getenv("BRAND_COLOR_HEX", "#2A6CF0")
 
+    t_start = time.perf_counter()
     # Find school codes once
     sc = find_school_codes(school_name)
     atpt, sd = sc["ATPT_OFCDC_SC_CODE"], sc["SD_SCHUL_CODE"]
 
-    os.makedirs("out", exist_ok=True)
-
-    for d in date_list(start, days):
-        ymd = d.strftime("%Y%m%d")
-        date_str = format_date_kr(d)
-        tt = get_timetable(school_level, atpt, sd, ymd, grade, class_nm, AY=ay, SEM=sem)
-        out_path = f"out/{ymd}.jpg"
-        render_timetable_image(
-            date_str,
-            tt,
-            out_path,
-            brand_color=brand,
-            school_name=school_name,
-            grade=grade,
-            class_nm=class_nm,
-        )
-        print(f"Generated: {out_path} ({len(tt)} periods)")
+    dates = date_list(start, days)
+    manifest = load_manifest(args.out_dir) if args.since_changed else {}
+    fingerprint = render_fingerprint() if args.since_changed else ""
+
+    # Fetches are network-bound: overlap them on threads (each carries the bulk NEIS priority).
+    # Renders are CPU-bound: with --jobs > 1 they go to a process pool.
+    fetch_pool = ThreadPoolExecutor(max_workers=jobs)
+    render_pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        fetches = [
+            fetch_pool.submit(
+                contextvars.copy_context().run,
+                get_timetable, school_level, atpt, sd, d.strftime("%Y%m%d"), grade, class_nm, AY=ay, SEM=sem,
+            )
+            for d in dates
+        ]
+        pending = []
+        for d, fut in zip(dates, fetches):
+            ymd = d.strftime("%Y%m%d")
+            tt = fut.result()
+            out_path = None if no_save else os.path.join(args.out_dir, f"{ymd}.jpg")
+            key = calc_hash({"timetable": tt, "brand": brand, "school": school_name, "grade": grade,
+                             "class": class_nm, "render": fingerprint}) if args.since_changed else None
+            if key and manifest.get(ymd) == key and os.path.exists(out_path):
+                pending.append((d, tt, out_path, key, None))
+                continue
+            call = (format_date_kr(d), tt, brand, school_name, grade, class_nm, out_path)
+            job = render_pool.submit(_render_one, *call) if render_pool else _render_one(*call)
+            pending.append((d, tt, out_path, key, job))
+
+        # Collect in date order so progress output stays ordered
+        rendered, render_s, n_rendered = [], 0.0, 0
+        for i, (d, tt, out_path, key, job) in enumerate(pending, start=1):
+            ymd = d.strftime("%Y%m%d")
+            if job is None:
+                with open(out_path, "rb") as f:
+                    data = f.read()
+                print(f"[{i}/{len(pending)}] Up to date: {out_path}")
+            else:
+                data, secs = job.result() if render_pool else job
+                render_s += secs
+                n_rendered += 1
+                if key:
+                    manifest[ymd] = key
+                print(f"[{i}/{len(pending)}] Generated: {out_path or ymd + ' (memory)'} ({len(tt)} periods, {len(data)} bytes, {secs * 1000:.0f} ms)")
+            rendered.append((d, tt, data, out_path))
+    finally:
+        fetch_pool.shutdown(cancel_futures=True)
+        if render_pool:
+            render_pool.shutdown(cancel_futures=True)
+
+    if args.since_changed:
+        save_manifest(args.out_dir, manifest)
+    wall = time.perf_counter() - t_start
+    per_image = f"{render_s / n_rendered * 1000:.0f} ms render/image, " if n_rendered else ""
+    print(
+        f"Done: {n_rendered} rendered, {len(rendered) - n_rendered} up to date in {wall:.2f}s "
+        f"({per_image}{wall / max(1, len(rendered)) * 1000:.0f} ms wall/image, jobs={jobs})"
+    )
+
+    if args.carousel:
+        post_id = publish_carousel(rendered, args, school_name, grade, class_nm)
+        print(f"Published carousel: post_id={post_id} ({len(rendered)} images)")
 
 
 if __name__ == "__main__":
@@ -1,16 +1,22 @@
 import os
+import sys
 import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Allow `python src/check_neis.py` to import the package-level quota governor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import neis_quota  # noqa: E402
+
 KEY = os.getenv("NEIS_KEY")
 if not KEY:
     raise SystemExit("NEIS_KEY가 .env에 설정되어 있지 않습니다.")
 
-url = "https://open.neis.go.kr/hub/schoolInfo"
+url = os.getenv("NEIS_HOST", "https://open.neis.go.kr/hub").rstrip("/") + "/schoolInfo"
 school = os.getenv("SCHOOL_NAME", "선린인터넷고등학교")
 params = {"KEY": KEY, "Type": "json", "pIndex": 1, "pSize": 1, "SCHUL_NM": school}
+neis_quota.acquire()
 r = requests.get(url, params=params, timeout=15)
 r.raise_for_status()
 data = r.json()
@@ -1,6 +1,13 @@
-import logging
 import os
-from logging.handlers import RotatingFileHandler
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing.util
+from logging.handlers import QueueHandler, RotatingFileHandler
 from dotenv import load_dotenv
 import pytz
 
@@ -13,8 +20,172 @@ TZ = pytz.timezone(TZ_NAME)
 
 LOG_DIR = os.getenv("LOG_DIR", "logs")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" writes one JSON object per line; anything else is the plain text format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").strip().lower()
+# Records buffered for the background writer; 0 logs synchronously on the caller's thread
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000") or 0)
+# Records written per batch before the handlers are flushed
+LOG_BATCH = 256
 
 _configured = False
+_queue = None
+_writer = None
+_handlers = []
+_dropped = [0]
+_dropped_lock = threading.Lock()
+# Held by the writer while it touches handler streams; fork waits for it so a
+# child never inherits a stream locked mid-write
+_io_lock = threading.Lock()
+
+
+class _BatchFlush:
+    """Skip the per-record flush; the writer thread flushes once per batch."""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        try:
+            super().flush()
+        except (OSError, ValueError):
+            # The stream was closed under us (e.g. a test runner restoring stderr)
+            pass
+
+
+class _BatchedFileHandler(_BatchFlush, RotatingFileHandler):
+    pass
+
+
+class _BatchedStreamHandler(_BatchFlush, logging.StreamHandler):
+    pass
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+_exc_formatter = logging.Formatter()
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller: when the queue is full the record is counted and dropped."""
+
+    def prepare(self, record):
+        # QueueHandler.prepare would format the record here and fold the traceback into
+        # msg. Only resolve the arguments (they may change before the writer runs) and
+        # render the traceback into exc_text, so the formatters still see it separately.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if _writer is None:
+            # After shutdown_logging(): write synchronously rather than lose late records
+            with _io_lock:
+                for h in _handlers:
+                    if record.levelno >= h.level:
+                        h.handle(record)
+                        h.flush_batch()
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Any thread can hit a full queue; += on the shared counter is not atomic
+            with _dropped_lock:
+                _dropped[0] += 1
+
+
+def _write_loop(q, handlers, reported):
+    last_report = 0.0
+    while True:
+        batch = [q.get()]
+        while len(batch) < LOG_BATCH:
+            try:
+                batch.append(q.get_nowait())
+            except queue.Empty:
+                break
+        stop = None in batch
+        with _io_lock:
+            for record in batch:
+                if record is None:
+                    continue
+                for h in handlers:
+                    if record.levelno >= h.level:
+                        h.handle(record)
+            # Report drops at most every 10s (and on shutdown) so a burst does not flood the log
+            now = time.monotonic()
+            if _dropped[0] != reported and (stop or now - last_report >= 10):
+                note = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                         "Log queue full: dropped %d record(s)", (_dropped[0] - reported,), None)
+                reported, last_report = _dropped[0], now
+                for h in handlers:
+                    h.handle(note)
+            for h in handlers:
+                h.flush_batch()
+        if stop:
+            return
+
+
+def _start_writer():
+    global _queue, _writer
+    _queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _writer = threading.Thread(
+        target=_write_loop, args=(_queue, _handlers, _dropped[0]), name="log-writer", daemon=True
+    )
+    _writer.start()
+    return _queue
+
+
+def _before_fork():
+    _io_lock.acquire()
+
+
+def _after_fork_in_parent():
+    _io_lock.release()
+
+
+def _after_fork_in_child():
+    # The parent's writer thread does not exist in a forked child; give it its own
+    global _io_lock, _dropped_lock
+    _io_lock = threading.Lock()
+    _dropped_lock = threading.Lock()
+    if _writer is None:
+        return
+    q = _start_writer()
+    for h in logging.getLogger().handlers:
+        if isinstance(h, _DroppingQueueHandler):
+            h.queue = q
+
+
+class _ForkToken:
+    pass
+
+
+_fork_token = _ForkToken()
+
+
+def _drain_at_worker_exit(_):
+    # multiprocessing children leave through os._exit, which skips atexit; their exit
+    # finalizers still run (lowest priority: after everything else has logged)
+    multiprocessing.util.Finalize(None, shutdown_logging, exitpriority=-100)
 
 
 def configure_logging():
@@ -27,25 +198,68 @@ def configure_logging():
     root = logging.getLogger()
     root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
 
-    fmt = logging.Formatter(
-        fmt="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    if LOG_FORMAT == "json":
+        fmt = _JsonFormatter(datefmt="%Y-%m-%dT%H:%M:%S%z")
+    else:
+        fmt = logging.Formatter(
+            fmt="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+
+    async_mode = LOG_QUEUE_SIZE > 0
+    file_cls = _BatchedFileHandler if async_mode else RotatingFileHandler
+    stream_cls = _BatchedStreamHandler if async_mode else logging.StreamHandler
 
     # File handler with rotation
-    fh = RotatingFileHandler(log_path, maxBytes=1_000_000, backupCount=5, encoding="utf-8")
+    fh = file_cls(log_path, maxBytes=1_000_000, backupCount=5, encoding="utf-8")
     fh.setFormatter(fmt)
-    root.addHandler(fh)
 
     # Console handler (useful for foreground runs)
-    ch = logging.StreamHandler()
+    ch = stream_cls()
     ch.setFormatter(fmt)
-    root.addHandler(ch)
+
+    if async_mode:
+        # Callers only enqueue; one background thread formats, writes and rotates
+        _handlers[:] = [fh, ch]
+        root.addHandler(_DroppingQueueHandler(_start_writer()))
+        atexit.register(shutdown_logging)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(
+                before=_before_fork, after_in_parent=_after_fork_in_parent, after_in_child=_after_fork_in_child
+            )
+        # Registered here rather than in the fork hook: a new process clears its finalizers after forking
+        multiprocessing.util.register_after_fork(_fork_token, _drain_at_worker_exit)
+    else:
+        root.addHandler(fh)
+        root.addHandler(ch)
 
     _configured = True
 
 
+def shutdown_logging(timeout: float = 5.0) -> None:
+    """Drain queued records and flush the handlers (idempotent; also runs at exit)."""
+    global _writer
+    w = _writer
+    if w is None:
+        return
+    _writer = None
+    if w.is_alive():
+        try:
+            _queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        w.join(timeout)
+    for h in _handlers:
+        try:
+            h.flush_batch()
+        except Exception:
+            pass
+
+
+def dropped_log_records() -> int:
+    return _dropped[0]
+
+
 def get_logger(name: str) -> logging.Logger:
     configure_logging()
     return logging.getLogger(name)
-
@@ -1,19 +1,57 @@
 import os
+import sys
+import time
+import hashlib
+import signal
 import datetime as dt
 import argparse
+import threading
+import contextvars
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
-from .config import get_logger, TZ
-from .fetch_neis import find_school_codes, get_timetable
-from .render_image import render_timetable_image
-from .detect_change import calc_hash, record_post, last_hash
-from .post_instagram import upload_image_via_url
+from .config import get_logger, shutdown_logging, TZ
+from .timetable_cache import find_school_codes_cached, get_timetable_swr, wait_revalidation, prefetch, prefetch_dates
+from .render_image import render_timetable_bytes, layout_key as render_layout_key
+from .sprite_atlas import flush_shared_atlas
+from .timetable_types import Timetable
+from .detect_change import (
+    timetable_hash,
+    hash_matches,
+    record_post,
+    update_posted,
+    last_hash,
+    last_post_id,
+    last_timetable,
+    save_staged,
+    load_staged,
+    clear_staged,
+)
+from .timetable_diff import diff
+from .post_instagram import (
+    create_media_container, create_media_containers, container_request, publish_container, published_media_id,
+)
+from . import post_instagram
 from .uploader import get_public_image_url
+from .graph_throttle import GraphRateLimited
+from . import tracing
+from . import graph_batch
+from . import neis_quota
+from . import tenants
+from . import run_lease
+from . import run_journal
+from . import mem_watchdog
+from .run_journal import UPLOAD, CONTAINER, PUBLISH, PUBLISHED
 
 log = get_logger(__name__)
 
+# Set by main() when running resident, so throttled jobs can be queued for later
+_scheduler = None
+
+# Stand-in image URL in test mode or when no public URL could be obtained
+PLACEHOLDER_URL = "https://example.com/placeholder.jpg"
+
 
 def now_kr() -> dt.datetime:
     return dt.datetime.now(TZ)
@@ -30,95 +68,627 @@ def build_caption(date_str, tt, school_name, grade, class_nm):
     if not tt:
         lines.append("오늘은 등록된 시간표가 없어요.")
     else:
-        for i, row in enumerate(tt, start=1):
-            subj = (row.get('subject', '-') or '-').strip()
-            lines.append(f"{i}교시  {subj}")
+        # Period rows are already stripped and interned
+        for i, row in enumerate(Timetable.from_rows(tt), start=1):
+            lines.append(f"{i}교시  {row.subject or '-'}")
     return "\n".join(lines)
 
 
-def daily_job():
+def _env_config() -> dict:
+    class_nm = os.getenv("CLASS_NM", "11")
     try:
-        school_name = os.getenv("SCHOOL_NAME", "선린인터넷고등학교")
-        school_level = os.getenv("SCHOOL_LEVEL", "his")
-        grade = int(os.getenv("GRADE", "3"))
-        class_nm = os.getenv("CLASS_NM", "11")
-        try:
-            class_nm = int(class_nm)
-        except Exception:
-            pass
-        ay = os.getenv("AY") or None
-        sem = os.getenv("SEM") or None
-        brand = os.getenv("BRAND_COLOR_HEX", "#2A6CF0")
-
-        sc = find_school_codes(school_name)
-        atpt, sd = sc["ATPT_OFCDC_SC_CODE"], sc["SD_SCHUL_CODE"]
-
-        ymd = now_kr().strftime("%Y%m%d")
-        date_str = format_date_kr(now_kr())
-        tt = get_timetable(school_level, atpt, sd, ymd, grade, class_nm, AY=ay, SEM=sem)
-
-        os.makedirs("out", exist_ok=True)
-        img_path = f"out/{ymd}.jpg"
-        render_timetable_image(
+        class_nm = int(class_nm)
+    except Exception:
+        pass
+    return {
+        "school_name": os.getenv("SCHOOL_NAME", "선린인터넷고등학교"),
+        "school_level": os.getenv("SCHOOL_LEVEL", "his"),
+        "grade": int(os.getenv("GRADE", "3")),
+        "class_nm": class_nm,
+        "ay": os.getenv("AY") or None,
+        "sem": os.getenv("SEM") or None,
+        "brand": os.getenv("BRAND_COLOR_HEX", "#2A6CF0"),
+    }
+
+
+def _job_config() -> dict:
+    """Config of the tenant being run (the env config outside of a tenant)."""
+    return tenants.current() or _env_config()
+
+
+def _fetch_today(run, cfg, revalidate=True):
+    """Look up the school and fetch today's timetable; returns (ymd, date_str, tt, hash).
+
+    A cached copy (evening prefetch) is served immediately while a live fetch
+    revalidates it in the background; see `_run_job`.
+    """
+    with tracing.span("school_lookup"):
+        sc = tenants.shared("school", (cfg["school_name"],), lambda: find_school_codes_cached(cfg["school_name"]))
+    atpt, sd = sc["ATPT_OFCDC_SC_CODE"], sc["SD_SCHUL_CODE"]
+
+    now = now_kr()
+    ymd = now.strftime("%Y%m%d")
+    run.attrs["date"] = ymd
+    date_str = format_date_kr(now)
+    # fetch + normalize spans are recorded inside get_timetable_typed (or a cache-hit fetch span);
+    # tenants asking for the same class and day share one fetch
+    tt = tenants.shared(
+        "timetable",
+        (cfg["school_level"], atpt, sd, ymd, cfg["grade"], cfg["class_nm"], cfg["ay"], cfg["sem"]),
+        lambda: get_timetable_swr(
+            cfg["school_level"], atpt, sd, ymd, cfg["grade"], cfg["class_nm"],
+            AY=cfg["ay"], SEM=cfg["sem"], revalidate=revalidate,
+        ),
+    )
+    with tracing.span("hash"):
+        current_h = timetable_hash(ymd, tt)
+    return ymd, date_str, tt, current_h
+
+
+def _image_meta(img_bytes) -> dict:
+    if img_bytes is None:
+        return {}
+    return {"image_sha256": hashlib.sha256(img_bytes).hexdigest(), "image_bytes": len(img_bytes)}
+
+
+def _render_and_upload(cfg, ymd, date_str, tt, journal=None):
+    """Render in memory and obtain a public URL; returns (img_bytes, img_path, image_url).
+
+    Tenants that would draw the same image (same timetable, labels and
+    layout) share one render and upload. With a journal, an upload of the
+    same image by an earlier, interrupted run is reused.
+    """
+    key = (
+        Timetable.from_rows(tt, date=ymd).digest(), date_str, cfg["brand"], cfg["school_name"],
+        cfg["grade"], cfg["class_nm"], render_layout_key(),
+    )
+    img_bytes, img_path, image_url = tenants.shared(
+        "render", key, lambda: _render_and_upload_once(cfg, ymd, date_str, tt, journal)
+    )
+    if journal is not None and image_url != PLACEHOLDER_URL:
+        done = journal.get(UPLOAD)
+        if not done or done.get("image_url") != image_url:
+            journal.record(UPLOAD, image_url=image_url, **_image_meta(img_bytes))
+    return img_bytes, img_path, image_url
+
+
+def _render_and_upload_once(cfg, ymd, date_str, tt, journal=None):
+    # Rendering stays in memory; the disk copy is an optional sink (RENDER_SAVE_DIR, empty disables).
+    # IMAGE_URL_TEMPLATE serves the file from disk, so it always needs the sink.
+    save_dir = os.getenv("RENDER_SAVE_DIR", "out").strip()
+    if not save_dir and os.getenv("IMAGE_URL_TEMPLATE", "").strip():
+        save_dir = "out"
+    img_name = f"{cfg['name']}-{ymd}.jpg" if cfg.get("name") else f"{ymd}.jpg"
+    img_path = os.path.join(save_dir, img_name) if save_dir else None
+    with tracing.span("render"):
+        img_bytes = render_timetable_bytes(
             date_str,
             tt,
-            img_path,
-            brand_color=brand,
-            school_name=school_name,
-            grade=grade,
-            class_nm=class_nm,
+            cfg["brand"],
+            school_name=cfg["school_name"],
+            grade=cfg["grade"],
+            class_nm=cfg["class_nm"],
+            out_path=img_path,
         )
+        tracing.annotate(bytes=len(img_bytes))
 
-        caption = build_caption(date_str, tt, school_name, grade, class_nm)
-
-        previous_h = last_hash(ymd)
-        current_h = calc_hash({"date": ymd, "timetable": tt})
-        if previous_h and previous_h == current_h:
-            log.info("No change detected for %s. Skipping post.", ymd)
-            return
-
-        # In test mode, do not attempt network uploads for image URL.
-        post_test_mode = os.getenv("POST_TEST_MODE", "true").lower() == "true"
+    # In test mode, do not attempt network uploads for image URL.
+    post_test_mode = os.getenv("POST_TEST_MODE", "true").lower() == "true"
+    done = journal.get(UPLOAD) if journal is not None else None
+    with tracing.span("upload", bytes=len(img_bytes)):
         if post_test_mode:
-            image_url = "https://example.com/placeholder.jpg"
+            image_url = PLACEHOLDER_URL
+        elif done and done.get("image_sha256") == _image_meta(img_bytes)["image_sha256"]:
+            image_url = done["image_url"]
+            tracing.annotate(resumed=True)
+            log.info("Reusing the upload journaled by an earlier run: %s", image_url)
         else:
             try:
-                image_url = get_public_image_url(img_path)
+                image_url = get_public_image_url(img_path, data=img_bytes, filename=img_name)
             except Exception as e:
                 log.warning("Image URL unavailable: %s", e)
-                image_url = "https://example.com/placeholder.jpg"
+                tracing.annotate(fallback=True)
+                image_url = PLACEHOLDER_URL
+    return img_bytes, img_path, image_url
+
+
+def _staged_max_age() -> int:
+    # Graph containers expire after 24h; stay well inside that
+    return int(os.getenv("STAGED_MAX_AGE_SEC", "43200") or 43200)
+
+
+def _caption_sha(caption: str) -> str:
+    return hashlib.sha256(caption.encode("utf-8")).hexdigest()
+
+
+def _create_container(journal, image_url, caption):
+    """create_media_container, reusing a journaled container for the same image and caption."""
+    caption_sha = _caption_sha(caption)
+    done = journal.get(CONTAINER)
+    if (
+        done and done.get("image_url") == image_url and done.get("caption_sha256") == caption_sha
+        and time.time() - done["ts"] < _staged_max_age()
+    ):
+        log.info("Reusing the container journaled by an earlier run: %s", done["creation_id"])
+        return done["creation_id"]
+    turn = _turn.get()
+    if turn is not None and not post_instagram.TEST_MODE:
+        creation_id = turn.create_container(image_url, caption)
+    else:
+        creation_id = create_media_container(image_url, caption)
+    journal.record(CONTAINER, creation_id=creation_id, image_url=image_url, caption_sha256=caption_sha)
+    return creation_id
+
+
+def _publish(journal, creation_id, caption_sha, current_h, img_bytes, tt):
+    """publish_container, journaled before (intent) and after (post id) the call.
+
+    The intent carries the caption digest, which finds the post again if the
+    run stops before the post id is recorded.
+    """
+    intent = journal.record(
+        PUBLISH, creation_id=creation_id, caption_sha256=caption_sha, hash=current_h,
+        timetable=Timetable.from_rows(tt).to_dicts(), **_image_meta(img_bytes),
+    )
+    post_id = publish_container(creation_id)
+    journal.record(PUBLISHED, post_id=str(post_id), **{k: v for k, v in intent.items() if k not in ("stage", "ts")})
+    return post_id
+
+
+def _open_journal(run, ymd):
+    """This tenant's journal for ymd, after recording a post an interrupted run published.
+
+    A journaled publish without a recorded post id is checked against Graph
+    (the container's status, then the recent media with the intent's caption),
+    so an ambiguous crash never leads to a second post.
+    """
+    run_journal.prune()
+    key = tenants.state_key(ymd)
+    journal = run_journal.Journal(key)
+    pub, intent = journal.get(PUBLISHED), journal.get(PUBLISH)
+    if pub is None and intent is not None:
+        post_id = published_media_id(intent["creation_id"], intent.get("caption_sha256"), intent["ts"])
+        if post_id:
+            pub = journal.record(PUBLISHED, post_id=str(post_id), **{k: v for k, v in intent.items() if k not in ("stage", "ts")})
+    if pub is not None:
+        if last_post_id(key) != pub["post_id"]:
+            with tracing.span("state_write"):
+                record_post(key, pub["post_id"], pub["hash"], image_meta=pub, timetable=pub.get("timetable"))
+            run.attrs["recovered_post_id"] = pub["post_id"]
+            log.warning("Recorded post %s for %s from the journal; the run that published it stopped first", pub["post_id"], key)
+        journal.clear()
+    return journal
+
+
+def _already_posted(run, ymd, current_h, tt) -> bool:
+    """True when today's post is current: same hash, or only changes that are not visible.
+
+    A hash mismatch is diffed per period against the posted timetable. Room
+    changes (not drawn or captioned) and alias-only subject respellings keep
+    the existing post and just refresh the stored hash.
+    """
+    key = tenants.state_key(ymd)
+    stored = last_hash(key)
+    if hash_matches(stored, current_h, ymd, tt):
+        return True
+    prev = last_timetable(key) if stored else None
+    if prev is None:
+        return False
+    with tracing.span("diff"):
+        d = diff(prev, tt)
+        tracing.annotate(changes=len(d.changes), visible=len(d.visible))
+    run.attrs["diff"] = d.to_list()
+    if not d.visible:
+        log.info("Only non-visible changes for %s (%s); keeping the existing post", ymd, d.summary())
+        update_posted(key, current_h, tt)
+        return True
+    log.info("Timetable changed for %s: %s", ymd, d.summary())
+    return False
+
+
+def _finish(run, ymd, post_id, current_h, img_bytes, img_desc, tt=None, journal=None):
+    with tracing.span("state_write"):
+        record_post(tenants.state_key(ymd), str(post_id), current_h, image=img_bytes, timetable=tt)
+    if journal is not None:
+        journal.clear()
+    run.attrs.update(outcome="posted", post_id=str(post_id))
+    log.info("Daily job done: post_id=%s, img=%s", post_id, img_desc)
+
+
+def _img_desc(img_path, img_bytes):
+    return img_path or f"<memory:{len(img_bytes)} bytes>"
+
+
+def _run_leased(name, fn, run, revalidate):
+    """Run fn under the (tenant, date) lease so overlapping invocations of a job do not both post.
+
+    A run that arrives while the same job is in flight waits and reuses its result.
+    """
+    key = tenants.state_key(now_kr().strftime("%Y%m%d"))
+    with run_lease.hold(key, name) as lease:
+        if lease.reused:
+            run.attrs.update(lease.result, reused=True)
+            log.info("%s for %s finished in another run; reusing its result: %s", name, key, lease.result)
+            return
+        if lease.busy:
+            run.attrs["outcome"] = "busy"
+            log.warning("%s for %s is still running elsewhere; skipping this run", name, key)
+            return
+        fn(run, revalidate=revalidate)
+        lease.result = {k: run.attrs[k] for k in ("outcome", "post_id", "creation_id") if k in run.attrs}
+
+
+class _Turn:
+    """One tenant's run inside a `_ContainerBatch`."""
+
+    def __init__(self, batch, fn):
+        self.batch, self.fn = batch, fn
+        self.go = threading.Event()
+        self.thread = None
+        self.item = self.result = None
+        self.spent = self.mark = 0
+
+    def neis_spent(self) -> int:
+        """NEIS requests made by this tenant, leaving out those of tenants that ran while it waited."""
+        return self.spent + neis_quota.spent() - self.mark
+
+    def create_container(self, image_url, caption):
+        """Queue this tenant's container for the pass's next Graph batch and wait for its id."""
+        self.item = container_request(image_url, caption)
+        with tracing.span("create_container", batched=True):
+            self.batch._pending.append(self)
+            self.batch._yield(self)
+            self.go.wait()
+            tracing.annotate(accounts=self.batch.last_size)
+        return graph_batch.raise_for_item(self.result)
+
+
+class _ContainerBatch:
+    """Runs a pass's tenants in turn, creating their media containers in shared Graph batches.
+
+    Each tenant runs on its own thread, but only one runs at a time: it goes
+    until it needs a container (or is done), then the next tenant starts. Once
+    every tenant is waiting or done, the waiting containers are created with
+    one create_media_containers call and those tenants resume, one by one.
+    A Graph rate limit stops new tenants from starting and is raised once
+    the others have finished.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._yielded = threading.Event()
+        self.last_size = 0
+        self.stopped = None
+
+    def _resume(self, turn):
+        self._yielded.clear()
+        turn.mark = neis_quota.spent()
+        if turn.thread is None:
+            ctx = contextvars.copy_context()
+            turn.thread = threading.Thread(target=ctx.run, args=(self._body, turn), daemon=True)
+            turn.thread.start()
+        else:
+            turn.go.set()
+        self._yielded.wait()
+
+    def _yield(self, turn):
+        turn.spent += neis_quota.spent() - turn.mark
+        turn.go.clear()
+        self._yielded.set()
 
-        post_id = upload_image_via_url(image_url, caption)
-        record_post(ymd, str(post_id), current_h)
-        log.info("Daily job done: post_id=%s, img=%s", post_id, img_path)
+    def _body(self, turn):
+        _turn.set(turn)
+        try:
+            turn.fn()
+        except GraphRateLimited as e:
+            self.stopped = e
+        finally:
+            self._yield(turn)
+
+    def run(self, fns):
+        for fn in fns:
+            if self.stopped is not None:
+                break
+            self._resume(_Turn(self, fn))
+        while self._pending:
+            waiting, self._pending = self._pending, []
+            self.last_size = len(waiting)
+            if self.stopped is not None:
+                results = [self.stopped] * len(waiting)
+            else:
+                try:
+                    results = create_media_containers([t.item for t in waiting])
+                except Exception as e:
+                    results = [e] * len(waiting)
+            for turn, result in zip(waiting, results):
+                turn.result = result
+                self._resume(turn)
+        if self.stopped is not None:
+            raise self.stopped
+
+
+_turn: contextvars.ContextVar = contextvars.ContextVar("container_turn", default=None)
+
+
+def _run_tenants(name, fn, revalidate, coordinate=True, **attrs):
+    """Run one pass of a job for every tenant (see tenants.py), one traced run each.
+
+    School lookups, NEIS fetches and rendered images are shared among the
+    tenants of the pass, and their media containers are created together in
+    one Graph batch (see _ContainerBatch). A failing tenant does not stop the
+    others; a Graph rate limit stops the pass so the whole job can be
+    deferred. Tenants configured by page_id get their IG accounts in one
+    Graph batch. With `coordinate`, each tenant's run holds a lease (see
+    run_lease.py).
+    """
+    all_tenants = tenants.load_tenants(_env_config())
+    tenants.resolve_accounts(all_tenants)
+
+    def run_tenant(tenant):
+        run_attrs = dict(attrs, tenant=tenant["name"]) if tenant["name"] else attrs
+        turn = _turn.get()
+        spent_before = neis_quota.spent()
+        try:
+            with tenants.active(tenant), tracing.run(name, **run_attrs) as run:
+                if coordinate:
+                    _run_leased(name, fn, run, revalidate)
+                else:
+                    fn(run, revalidate=revalidate)
+                run.attrs["neis_requests"] = turn.neis_spent() if turn else neis_quota.spent() - spent_before
+        except GraphRateLimited:
+            raise
+        except Exception as e:
+            if len(all_tenants) == 1:
+                raise
+            log.exception("%s failed for tenant %s: %s", name, tenant["name"], e)
+
+    with tenants.sharing() as work:
+        if len(all_tenants) == 1:
+            run_tenant(all_tenants[0])
+        else:
+            _ContainerBatch().run([lambda t=t: run_tenant(t) for t in all_tenants])
+    if len(all_tenants) > 1:
+        tracing.metrics.observe_shared(work.saved())
+        log.info("%s shared work across %d tenants: %s", name, len(all_tenants), work.summary())
+
+
+def _run_job(name, fn):
+    """Run a pipeline job, then re-run it once if background revalidation found newer data.
+
+    The correction pass reads the freshly revalidated cache without starting
+    another revalidation, and the normal hash comparison decides what to do.
+    """
+    try:
+        with mem_watchdog.job(name), neis_quota.priority("post"):
+            _run_tenants(name, fn, revalidate=True)
+            wait = float(os.getenv("REVALIDATE_WAIT_SEC", "120") or 0)
+            changed = wait_revalidation(wait)
+            if changed:
+                log.info("Live timetable differs from the cached copy (%s); re-running %s", ", ".join(changed), name)
+                _run_tenants(name, fn, revalidate=False, correction=True)
+    except GraphRateLimited as e:
+        if _scheduler is None:
+            log.error("%s stopped: %s", name, e)
+            return
+        run_at = now_kr() + dt.timedelta(seconds=e.retry_after + 5)
+        log.warning("%s deferred to %s: %s", name, run_at.strftime("%H:%M:%S"), e)
+        _scheduler.add_job(_run_job, "date", run_date=run_at, args=[name, fn])
     except Exception as e:
-        log.exception("Daily job failed: %s", e)
+        log.exception("%s failed: %s", name, e)
+    finally:
+        neis_quota.log_summary(name)
+
+
+def daily_job():
+    _run_job("daily_job", _daily_job)
+
+
+def _daily_job(run, revalidate=True):
+    cfg = _job_config()
+    ymd, date_str, tt, current_h = _fetch_today(run, cfg, revalidate)
+    journal = _open_journal(run, ymd)
+
+    if _already_posted(run, ymd, current_h, tt):
+        run.attrs["outcome"] = "unchanged"
+        log.info("No change detected for %s. Skipping post.", ymd)
+        journal.clear()
+        return
+
+    img_bytes, img_path, image_url = _render_and_upload(cfg, ymd, date_str, tt, journal)
+    caption = build_caption(date_str, tt, cfg["school_name"], cfg["grade"], cfg["class_nm"])
+
+    # create_container + publish spans are recorded inside post_instagram
+    creation_id = _create_container(journal, image_url, caption)
+    post_id = _publish(journal, creation_id, _caption_sha(caption), current_h, img_bytes, tt)
+    _finish(run, ymd, post_id, current_h, img_bytes, _img_desc(img_path, img_bytes), tt, journal)
+
+
+def stage_job():
+    """Phase 1 (lead time before the post): fetch, render, upload and create the container."""
+    _run_job("stage_job", _stage_job)
+
+
+def _stage_job(run, revalidate=True):
+    cfg = _job_config()
+    ymd, date_str, tt, current_h = _fetch_today(run, cfg, revalidate)
+    journal = _open_journal(run, ymd)
+    if _already_posted(run, ymd, current_h, tt):
+        run.attrs["outcome"] = "unchanged"
+        log.info("Already posted for %s. Nothing to stage.", ymd)
+        journal.clear()
+        return
+
+    img_bytes, img_path, image_url = _render_and_upload(cfg, ymd, date_str, tt, journal)
+    caption = build_caption(date_str, tt, cfg["school_name"], cfg["grade"], cfg["class_nm"])
+    creation_id = _create_container(journal, image_url, caption)
+    save_staged(
+        tenants.state_key(ymd),
+        {
+            "hash": current_h,
+            "creation_id": creation_id,
+            "caption_sha256": _caption_sha(caption),
+            "image_url": image_url,
+            "image_path": img_path,
+            "staged_at": int(time.time()),
+        },
+    )
+    run.attrs.update(outcome="staged", creation_id=str(creation_id))
+    log.info("Staged container for %s: creation_id=%s", ymd, creation_id)
+
+
+def publish_job():
+    """Phase 2 (target minute): re-verify the hash, then publish the staged container.
+
+    If nothing was staged, the container is too old, or the timetable changed
+    since staging, the full pipeline runs instead.
+    """
+    _run_job("publish_job", _publish_job)
+
+
+def _publish_job(run, revalidate=True):
+    cfg = _job_config()
+    ymd, date_str, tt, current_h = _fetch_today(run, cfg, revalidate)
+    journal = _open_journal(run, ymd)
+    if _already_posted(run, ymd, current_h, tt):
+        run.attrs["outcome"] = "unchanged"
+        log.info("No change detected for %s. Skipping post.", ymd)
+        clear_staged(tenants.state_key(ymd))
+        journal.clear()
+        return
+
+    staged = load_staged(tenants.state_key(ymd))
+    if staged and hash_matches(staged.get("hash"), current_h, ymd, tt) and time.time() - int(staged.get("staged_at", 0)) < _staged_max_age():
+        img_bytes = None
+        if staged.get("image_path") and os.path.exists(staged["image_path"]):
+            with open(staged["image_path"], "rb") as f:
+                img_bytes = f.read()
+        caption_sha = staged.get("caption_sha256") or _caption_sha(
+            build_caption(date_str, tt, cfg["school_name"], cfg["grade"], cfg["class_nm"])
+        )
+        post_id = _publish(journal, staged["creation_id"], caption_sha, current_h, img_bytes, tt)
+        run.attrs["staged"] = True
+        clear_staged(tenants.state_key(ymd))
+        with tracing.span("state_write"):
+            record_post(tenants.state_key(ymd), str(post_id), current_h, image=img_bytes, timetable=tt)
+        journal.clear()
+        run.attrs.update(outcome="posted", post_id=str(post_id))
+        log.info("Published staged container for %s: post_id=%s", ymd, post_id)
+        return
+
+    if staged:
+        log.info("Timetable changed since staging (or container expired) for %s; rebuilding", ymd)
+    else:
+        log.info("No staged container for %s; running full pipeline", ymd)
+    run.attrs["staged"] = False
+    clear_staged(tenants.state_key(ymd))
+    img_bytes, img_path, image_url = _render_and_upload(cfg, ymd, date_str, tt, journal)
+    caption = build_caption(date_str, tt, cfg["school_name"], cfg["grade"], cfg["class_nm"])
+    creation_id = _create_container(journal, image_url, caption)
+    post_id = _publish(journal, creation_id, _caption_sha(caption), current_h, img_bytes, tt)
+    _finish(run, ymd, post_id, current_h, img_bytes, _img_desc(img_path, img_bytes), tt, journal)
+
+
+def prefetch_job():
+    """Evening job: cache tomorrow's and the rest of the week's timetables."""
+    try:
+        with mem_watchdog.job("prefetch_job"), neis_quota.priority("update"):
+            _run_tenants("prefetch_job", _prefetch_job, revalidate=False, coordinate=False)
+    except Exception as e:
+        log.exception("Prefetch job failed: %s", e)
+    finally:
+        neis_quota.log_summary("prefetch_job")
+
+
+def _prefetch_job(run, revalidate=False):
+    cfg = _job_config()
+    with tracing.span("school_lookup"):
+        sc = tenants.shared("school", (cfg["school_name"],), lambda: find_school_codes_cached(cfg["school_name"]))
+    dates = prefetch_dates(now_kr().date())
+    with tracing.span("prefetch", days=len(dates)):
+        n = tenants.shared(
+            "prefetch",
+            (cfg["school_level"], sc["SD_SCHUL_CODE"], cfg["grade"], cfg["class_nm"], cfg["ay"], cfg["sem"]),
+            lambda: prefetch(
+                cfg["school_level"], sc["ATPT_OFCDC_SC_CODE"], sc["SD_SCHUL_CODE"], dates,
+                cfg["grade"], cfg["class_nm"], AY=cfg["ay"], SEM=cfg["sem"],
+            ),
+        )
+    run.attrs.update(prefetched=n, days=len(dates))
+
+
+def _publish_time():
+    """PUBLISH_AT=HH:MM (default 07:00) and PUBLISH_LEAD_MINUTES (default 10)."""
+    hh, mm = (os.getenv("PUBLISH_AT", "07:00") or "07:00").split(":")
+    target = dt.datetime(2000, 1, 1, int(hh), int(mm))
+    lead = int(os.getenv("PUBLISH_LEAD_MINUTES", "10") or 0)
+    return target, target - dt.timedelta(minutes=lead), lead
 
 
 def main():
     parser = argparse.ArgumentParser(description="Insta timetable daemon")
     parser.add_argument("--run-now", action="store_true", help="Run the daily job once and exit")
+    parser.add_argument("--stage", action="store_true", help="Stage today's media container and exit")
+    parser.add_argument("--publish", action="store_true", help="Publish the staged container (or run fully) and exit")
+    parser.add_argument("--prefetch", action="store_true", help="Cache tomorrow's and the rest of the week's timetables and exit")
     args = parser.parse_args()
 
     if args.run_now:
         log.info("Running daily job immediately (--run-now)")
         daily_job()
         return
+    if args.stage:
+        stage_job()
+        return
+    if args.publish:
+        publish_job()
+        return
+    if args.prefetch:
+        prefetch_job()
+        return
 
-    log.info("Starting scheduler (Asia/Seoul) with daily 07:00 job")
+    metrics_port = int(os.getenv("METRICS_PORT", "0") or 0)
+    if metrics_port:
+        tracing.start_metrics_server(metrics_port, os.getenv("METRICS_HOST", "127.0.0.1"))
+
+    global _scheduler
+    target, stage_at, lead = _publish_time()
     scheduler = BackgroundScheduler(timezone=TZ)
-    scheduler.add_job(daily_job, CronTrigger(hour=7, minute=0))
+    _scheduler = scheduler
+    if lead > 0:
+        log.info(
+            "Starting scheduler (Asia/Seoul): stage at %s, publish at %s",
+            stage_at.strftime("%H:%M"),
+            target.strftime("%H:%M"),
+        )
+        scheduler.add_job(stage_job, CronTrigger(hour=stage_at.hour, minute=stage_at.minute))
+        scheduler.add_job(publish_job, CronTrigger(hour=target.hour, minute=target.minute))
+    else:
+        log.info("Starting scheduler (Asia/Seoul) with daily %s job", target.strftime("%H:%M"))
+        scheduler.add_job(daily_job, CronTrigger(hour=target.hour, minute=target.minute))
+    ph, pm = (os.getenv("PREFETCH_AT", "20:00") or "20:00").split(":")
+    scheduler.add_job(prefetch_job, CronTrigger(hour=int(ph), minute=int(pm)))
     scheduler.start()
+    # systemd stops with SIGTERM; turn it into SystemExit so shutdown (and the log flush) runs
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    mem_watchdog.install(scheduler)
+    restart = False
     try:
-        # Keep foreground alive
-        while True:
+        # Keep foreground alive; wake early when the memory watchdog asks for a restart
+        scheduler.print_jobs()
+        while not mem_watchdog.restart_requested.wait(3600):
             scheduler.print_jobs()
-            # Sleep in long intervals
-            import time
-            time.sleep(3600)
+        restart = True
+        log.info("Recycling the daemon: waiting for running jobs, then restarting")
+        scheduler.shutdown(wait=True)
     except (KeyboardInterrupt, SystemExit):
         log.info("Shutting down scheduler...")
         scheduler.shutdown()
+    finally:
+        # The re-exec below skips exit hooks
+        flush_shared_atlas()
+        shutdown_logging()
+    if restart:
+        mem_watchdog.reexec()
 
 
 if __name__ == "__main__":
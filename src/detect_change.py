@@ -1,8 +1,10 @@
 import os
 import json
 import hashlib
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .config import get_logger
+from .file_lock import locked
+from .timetable_types import DIGEST_VERSION, Timetable, jsonable
 
 log = get_logger(__name__)
 
@@ -10,10 +12,31 @@ STATE_PATH = os.getenv("STATE_PATH", "state/posted.json")
 
 
 def calc_hash(obj: Any) -> str:
-    payload = json.dumps(obj, ensure_ascii=False, sort_keys=True)
+    payload = json.dumps(obj, ensure_ascii=False, sort_keys=True, default=jsonable)
     return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
+def timetable_hash(date_key: str, tt: Any) -> str:
+    """Change-detection hash for one day: the Timetable's incremental binary digest."""
+    return f"{DIGEST_VERSION}:{Timetable.from_rows(tt, date=date_key).digest()}"
+
+
+def hash_matches(stored: Optional[str], current: str, date_key: str, tt: Any) -> bool:
+    """Compare a stored hash with `timetable_hash` output.
+
+    Hashes written before the binary digest existed are legacy JSON SHA-256s;
+    those are checked against `calc_hash` so an upgrade does not look like a change;
+    a Timetable hashes there as its unstripped rows, as the legacy hash did.
+    """
+    if not stored:
+        return False
+    if stored == current:
+        return True
+    if ":" not in stored:
+        return stored == calc_hash({"date": date_key, "timetable": tt})
+    return False
+
+
 def _load_state() -> Dict[str, Any]:
     if os.path.exists(STATE_PATH):
         try:
@@ -25,16 +48,70 @@ def _load_state() -> Dict[str, Any]:
     return {}
 
 
+def _write_json(path: str, obj: Any) -> None:
+    """Replace `path` atomically, so a reader never sees a half-written file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
 def _save_state(state: Dict[str, Any]) -> None:
-    os.makedirs(os.path.dirname(STATE_PATH) or ".", exist_ok=True)
-    with open(STATE_PATH, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    _write_json(STATE_PATH, state)
 
 
-def record_post(date_key: str, post_id_or_marker: str, h: str) -> None:
-    st = _load_state()
-    st[date_key] = {"post_id": post_id_or_marker, "hash": h}
-    _save_state(st)
+def record_post(
+    date_key: str,
+    post_id_or_marker: str,
+    h: str,
+    image: Optional[bytes] = None,
+    timetable: Any = None,
+    image_meta: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Store the post for date_key. `image_meta` ({"image_sha256", "image_bytes"})
+    stands in for `image` when only the digest survived (journal recovery)."""
+    entry = {"post_id": post_id_or_marker, "hash": h}
+    if image is not None:
+        # Digest of the encoded image as posted; taken straight from the render buffer
+        entry["image_sha256"] = hashlib.sha256(image).hexdigest()
+        entry["image_bytes"] = len(image)
+    elif image_meta:
+        entry.update({k: image_meta[k] for k in ("image_sha256", "image_bytes") if image_meta.get(k) is not None})
+    if timetable is not None:
+        # Kept so the next change can be diffed per period instead of only detected
+        entry["timetable"] = Timetable.from_rows(timetable).to_dicts()
+    # Read-modify-write under the lock: the daemon, timers and scripts share posted.json
+    with locked(STATE_PATH + ".lock"):
+        st = _load_state()
+        st[date_key] = entry
+        _save_state(st)
+
+
+def update_posted(date_key: str, h: str, timetable: Any) -> None:
+    """Accept a new hash/timetable for an existing post without reposting (cosmetic changes)."""
+    rows = Timetable.from_rows(timetable).to_dicts()
+    with locked(STATE_PATH + ".lock"):
+        st = _load_state()
+        entry = st.get(date_key)
+        if not isinstance(entry, dict):
+            return
+        entry["hash"] = h
+        entry["timetable"] = rows
+        _save_state(st)
+
+
+def last_timetable(date_key: str) -> Optional[Timetable]:
+    """The timetable as last posted for date_key, if the state file recorded it."""
+    v = _load_state().get(date_key)
+    if isinstance(v, dict) and isinstance(v.get("timetable"), list):
+        return Timetable.from_rows(v["timetable"], date=date_key)
+    return None
+
+
+def last_post_id(date_key: str) -> str:
+    v = _load_state().get(date_key)
+    return v.get("post_id", "") if isinstance(v, dict) else ""
 
 
 def last_hash(date_key: str) -> str:
@@ -44,3 +121,49 @@ def last_hash(date_key: str) -> str:
         return v.get("hash")
     return ""
 
+
+
+STAGED_PATH = os.getenv("STAGED_PATH", os.path.join(os.path.dirname(STATE_PATH) or ".", "staged.json"))
+
+
+def _load_staged_all() -> Dict[str, Any]:
+    if not os.path.exists(STAGED_PATH):
+        return {}
+    try:
+        with open(STAGED_PATH, "r", encoding="utf-8") as f:
+            v = json.load(f)
+        return v if isinstance(v, dict) else {}
+    except Exception as e:
+        log.warning("Failed to load staged container: %s", e)
+        return {}
+
+
+def save_staged(date_key: str, entry: Dict[str, Any]) -> None:
+    """Remember a created-but-unpublished media container for date_key.
+
+    Only the newest date is kept per tenant; other tenants' entries stay.
+    """
+    prefix = date_key.rpartition(":")[0]
+    with locked(STAGED_PATH + ".lock"):
+        st = {k: v for k, v in _load_staged_all().items() if k.rpartition(":")[0] != prefix}
+        st[date_key] = entry
+        _write_json(STAGED_PATH, st)
+
+
+def load_staged(date_key: str) -> Optional[Dict[str, Any]]:
+    v = _load_staged_all().get(date_key)
+    return v if isinstance(v, dict) else None
+
+
+def clear_staged(date_key: Optional[str] = None) -> None:
+    """Forget the staged container for date_key (or every staged container)."""
+    with locked(STAGED_PATH + ".lock"):
+        st = _load_staged_all() if date_key else {}
+        st.pop(date_key, None)
+        if st:
+            _write_json(STAGED_PATH, st)
+            return
+        try:
+            os.remove(STAGED_PATH)
+        except FileNotFoundError:
+            pass
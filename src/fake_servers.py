@@ -0,0 +1,427 @@
+"""Local stand-ins for NEIS, the Graph API and the image host.
+
+Point the app at them through NEIS_HOST / GRAPH_HOST / TRANSFER_SH_HOST /
+CATBOX_HOST (see `FakeStack.env()`), and the whole `daily_job` pipeline runs
+offline in milliseconds. `Faults` injects latency, 5xx errors and rate
+limits. With `--record DIR` the NEIS and Graph fakes proxy to the live
+services once and save every response (secrets scrubbed) to a cassette;
+`--replay DIR` serves those responses back.
+
+    python -m src.fake_servers                 # print env exports, serve until Ctrl-C
+    python -m src.fake_servers --latency 0.2 --error-rate 0.1 --rate-limit 30
+    python -m src.fake_servers --record cassettes/live   # needs real NEIS_KEY / tokens
+    python -m src.fake_servers --replay cassettes/live
+"""
+import os
+import re
+import json
+import time
+import random
+import itertools
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from .config import get_logger
+
+log = get_logger(__name__)
+
+# Query/form parameters that carry credentials: forwarded upstream when
+# recording, but never part of a cassette key or written to disk
+SECRET_PARAMS = {"KEY", "access_token", "appsecret_proof", "client_secret", "fb_exchange_token", "input_token"}
+
+
+class Request:
+    __slots__ = ("method", "path", "params", "body", "headers")
+
+    def __init__(self, method: str, path: str, params: Dict[str, str], body: bytes, headers):
+        self.method = method
+        self.path = path
+        self.params = params
+        self.body = body
+        self.headers = headers
+
+
+# A route returns (status, body) or (status, body, headers). dict/list bodies
+# are sent as JSON, str as text, bytes as-is.
+Route = Callable[[Request], tuple]
+
+
+class Faults:
+    """Injected misbehaviour, applied before the route runs.
+
+    latency/jitter: seconds added to every request. error_rate: share of
+    requests answered with a 500. rate_limit: requests allowed per `window`
+    seconds before the service-specific rate-limit response.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: int = 0, window: float = 60.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.window = window
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._hits: List[float] = []
+
+    def apply(self) -> Optional[str]:
+        """Sleep for the configured latency; return "error"/"rate_limited" to fail the request."""
+        with self._lock:
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.error_rate and self._rng.random() < self.error_rate
+            limited = False
+            if self.rate_limit:
+                now = time.monotonic()
+                self._hits = [t for t in self._hits if now - t < self.window]
+                limited = len(self._hits) >= self.rate_limit
+                if not limited:
+                    self._hits.append(now)
+        if delay:
+            time.sleep(delay)
+        if limited:
+            return "rate_limited"
+        return "error" if fail else None
+
+
+def _handler(route: Route, faults: Optional[Faults], limited: Callable[[], tuple]):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, method):
+            u = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(u.query).items()}
+            n = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(n) if n else b""
+            if body and "application/x-www-form-urlencoded" in (self.headers.get("Content-Type") or ""):
+                params.update({k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()})
+            fault = faults.apply() if faults else None
+            if fault == "rate_limited":
+                res = limited()
+            elif fault == "error":
+                res = (500, {"error": {"message": "injected failure", "code": 2}})
+            else:
+                res = route(Request(method, u.path, params, body, self.headers))
+            status, payload = res[0], res[1]
+            headers = res[2] if len(res) > 2 else {}
+            if isinstance(payload, bytes):
+                data, ctype = payload, "application/octet-stream"
+            elif isinstance(payload, str):
+                data, ctype = payload.encode("utf-8"), "text/plain; charset=utf-8"
+            else:
+                data, ctype = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+            self.send_response(status)
+            self.send_header("Content-Type", headers.pop("Content-Type", ctype))
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._reply("GET")
+
+        def do_POST(self):
+            self._reply("POST")
+
+        def do_PUT(self):
+            self._reply("PUT")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_server(route: Route, faults: Optional[Faults] = None, limited: Optional[Callable[[], tuple]] = None,
+                 host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve `route` from a daemon thread; returns (server, base URL)."""
+    limited = limited or (lambda: (429, {"error": {"message": "rate limited", "code": 4}}))
+    srv = ThreadingHTTPServer((host, port), _handler(route, faults, limited))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True, name=f"fake-{srv.server_address[1]}").start()
+    return srv, f"http://{host}:{srv.server_address[1]}"
+
+
+# --- NEIS ---------------------------------------------------------------------
+
+
+def neis_route(rows: List[dict], classes: int = 12) -> Route:
+    """schoolInfo / classInfo / *Timetable answering with `rows` for every class and date."""
+    head = [{"head": [{"list_total_count": len(rows)}, {"RESULT": {"CODE": "INFO-000", "MESSAGE": "OK"}}]}]
+
+    def route(req: Request):
+        name = req.path.rsplit("/", 1)[-1]
+        q = req.params
+        if name == "schoolInfo":
+            row = {"ATPT_OFCDC_SC_CODE": "B10", "ATPT_OFCDC_SC_NM": "서울특별시교육청", "SD_SCHUL_CODE": "7010536",
+                   "SCHUL_NM": q.get("SCHUL_NM", ""), "SCHUL_KND_SC_NM": "고등학교"}
+            return 200, {name: head + [{"row": [row]}]}
+        if name == "classInfo":
+            out = [{"GRADE": q.get("GRADE", "3"), "CLASS_NM": str(c), "AY": q.get("AY", "")} for c in range(1, classes + 1)]
+            return 200, {name: head + [{"row": out}]}
+        if name.endswith("Timetable"):
+            out = [
+                {"PERIO": str(r["period"]), "ITRT_CNTNT": r["subject"], "CLRM_NM": r.get("room", ""),
+                 "CLASS_NM": q.get("CLASS_NM"), "ALL_TI_YMD": q.get("ALL_TI_YMD")}
+                for r in rows
+            ]
+            return 200, {name: head + [{"row": out}]}
+        return 200, {"RESULT": {"CODE": "INFO-200", "MESSAGE": "해당하는 데이터가 없습니다."}}
+
+    return route
+
+
+def neis_limited():
+    return 200, {"RESULT": {"CODE": "ERROR-337", "MESSAGE": "일별 트래픽 제한을 넘은 호출입니다."}}
+
+
+# --- Graph --------------------------------------------------------------------
+
+
+# Captions of the containers created so far, and the containers published, newest last
+# (status_code lookups and media listings)
+_containers: Dict[str, str] = {}
+_container_ids = itertools.count(1)
+_published: List[Tuple[str, float]] = []
+
+
+def _graph_op(method: str, path: str, q: Dict[str, str]) -> Tuple[int, Any]:
+    """Answer one Graph call; `path` has the version prefix stripped."""
+    if path.endswith("/media_publish"):
+        _published.append((q.get("creation_id", ""), time.time()))
+        return 200, {"id": "STUB_POST_" + q.get("creation_id", "")}
+    if path.endswith("/media"):
+        if method == "GET":
+            media = [
+                {"id": "STUB_POST_" + c, "caption": _containers.get(c, ""),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime(ts))}
+                for c, ts in reversed(_published)
+            ]
+            return 200, {"data": media[: int(q.get("limit", 25))]}
+        creation_id = f"STUB_CONTAINER_{next(_container_ids)}"
+        _containers[creation_id] = q.get("caption", "")
+        return 200, {"id": creation_id}
+    if method == "GET" and "status_code" in q.get("fields", ""):
+        node = path.strip("/")
+        return 200, {"id": node, "status_code": "PUBLISHED" if any(c == node for c, _ in _published) else "FINISHED"}
+    if path == "/debug_token":
+        return 200, {"data": {"is_valid": True, "expires_at": int(time.time()) + 60 * 86400}}
+    if path == "/oauth/access_token":
+        return 200, {"access_token": "STUB_LONG_LIVED_TOKEN", "token_type": "bearer", "expires_in": 60 * 86400}
+    node = path.strip("/")
+    if method == "GET" and node.isdigit():
+        body = {"id": node, "instagram_business_account": {"id": "IG_" + node}}
+        if "access_token" in q.get("fields", ""):
+            body["access_token"] = "PAGE_TOKEN_" + node
+        return 200, body
+    if method == "POST" and node and "caption" in q:
+        return 200, {"success": True}  # caption edit on a media id
+    return 404, {"error": {"message": f"unknown path {path}", "code": 803}}
+
+
+def graph_route(req: Request):
+    """Graph media/publish/debug_token/oauth/page lookups plus the batch endpoint."""
+    parts = req.path.split("/", 2)  # ['', 'v21.0', rest]
+    rest = "/" + (parts[2] if len(parts) > 2 else "")
+    usage = {"X-App-Usage": json.dumps({"call_count": 1, "total_time": 1, "total_cputime": 1})}
+    if req.method == "POST" and rest == "/" and "batch" in req.params:
+        out = []
+        for o in json.loads(req.params["batch"]):
+            u = urlparse("/" + o["relative_url"])
+            oq = {k: v[0] for k, v in parse_qs(u.query).items()}
+            oq.update({k: v[0] for k, v in parse_qs(o.get("body", "")).items()})
+            code, body = _graph_op(o["method"], u.path, oq)
+            out.append({"code": code, "body": json.dumps(body)})
+        return 200, out, usage
+    code, body = _graph_op(req.method, rest, req.params)
+    return code, body, usage
+
+
+def graph_limited():
+    headers = {"X-App-Usage": json.dumps({"call_count": 100, "total_time": 100, "total_cputime": 100})}
+    return 400, {"error": {"message": "(#4) Application request limit reached", "code": 4}}, headers
+
+
+# --- Image host (transfer.sh / catbox protocols) --------------------------------
+
+
+def image_host_route(base_url: Callable[[], str]) -> Route:
+    """PUT /<name> (transfer.sh) or POST /user/api.php (catbox) store the bytes; GET /files/<id> serves them."""
+    files: Dict[str, bytes] = {}
+    lock = threading.Lock()
+
+    def route(req: Request):
+        if req.method == "PUT":
+            name = req.path.strip("/").replace("/", "_") or "upload.jpg"
+        elif req.method == "POST" and req.path == "/user/api.php":
+            name = f"{len(files)}.jpg"
+        elif req.method == "GET" and req.path.startswith("/files/"):
+            data = files.get(req.path[len("/files/"):])
+            return (200, data, {"Content-Type": "image/jpeg"}) if data is not None else (404, "not found")
+        else:
+            return 404, "not found"
+        with lock:
+            files[name] = req.body
+        return 200, f"{base_url()}/files/{name}"
+
+    return route
+
+
+# --- Record / replay ------------------------------------------------------------
+
+
+_SECRET_ALT = "|".join(sorted(SECRET_PARAMS))
+# Secrets embedded in strings: form/query encoded (batch ops) or JSON encoded (batch bodies)
+_SECRET_IN_QUERY = re.compile(rf"\b({_SECRET_ALT})=[^&\"]*")
+_SECRET_IN_JSON = re.compile(rf'("(?:{_SECRET_ALT})"\s*:\s*")[^"]*(")')
+
+
+def _scrub_str(s: str) -> str:
+    return _SECRET_IN_JSON.sub(r"\1REDACTED\2", _SECRET_IN_QUERY.sub(r"\1=REDACTED", s))
+
+
+def _cassette_key(method: str, path: str, params: Dict[str, str]) -> str:
+    kept = sorted((k, _scrub_str(v)) for k, v in params.items() if k not in SECRET_PARAMS)
+    return json.dumps([method, path, kept], ensure_ascii=False)
+
+
+def _scrub(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {k: ("REDACTED" if k in SECRET_PARAMS else _scrub(v)) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_scrub(v) for v in obj]
+    if isinstance(obj, str):
+        return _scrub_str(obj)
+    return obj
+
+
+class Cassette:
+    """Recorded responses for one service, stored as <dir>/<name>.json."""
+
+    def __init__(self, directory: str, name: str):
+        self.path = os.path.join(directory, f"{name}.json")
+        self._lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def put(self, key: str, status: int, body: Any) -> None:
+        with self._lock:
+            self.entries[key] = {"status": status, "body": body}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+
+def recording_route(upstream: str, cassette: Cassette) -> Route:
+    """Forward to the live `upstream` base URL and save each response to the cassette."""
+    upstream = upstream.rstrip("/")
+
+    def route(req: Request):
+        url = upstream + req.path
+        if req.method == "GET":
+            r = requests.get(url, params=req.params, timeout=60)
+        else:
+            r = requests.request(req.method, url, data=req.params or req.body, timeout=60)
+        try:
+            body = _scrub(r.json())
+        except ValueError:
+            body = r.text
+        cassette.put(_cassette_key(req.method, req.path, req.params), r.status_code, body)
+        log.info("Recorded %s %s -> %s", req.method, req.path, r.status_code)
+        return r.status_code, body
+
+    return route
+
+
+def replay_route(cassette: Cassette, fallback: Optional[Route] = None) -> Route:
+    """Serve recorded responses; unknown requests go to `fallback` (or 404)."""
+
+    def route(req: Request):
+        hit = cassette.entries.get(_cassette_key(req.method, req.path, req.params))
+        if hit is not None:
+            return hit["status"], hit["body"]
+        if fallback:
+            return fallback(req)
+        log.warning("No recorded response for %s %s", req.method, req.path)
+        return 404, {"error": {"message": "not in cassette", "code": 803}}
+
+    return route
+
+
+# --- The whole stack --------------------------------------------------------------
+
+
+class FakeStack:
+    """NEIS + Graph + image host fakes started together."""
+
+    def __init__(self, rows: Optional[List[dict]] = None, faults: Optional[Faults] = None,
+                 record: Optional[str] = None, replay: Optional[str] = None):
+        rows = rows if rows is not None else load_rows()
+        neis, graph = neis_route(rows), graph_route
+        if record:
+            neis = recording_route(os.getenv("NEIS_UPSTREAM", "https://open.neis.go.kr"), Cassette(record, "neis"))
+            graph = recording_route(os.getenv("GRAPH_UPSTREAM", "https://graph.facebook.com"), Cassette(record, "graph"))
+        elif replay:
+            neis = replay_route(Cassette(replay, "neis"), neis)
+            graph = replay_route(Cassette(replay, "graph"), graph)
+        self.neis, self.neis_url = start_server(neis, faults, neis_limited)
+        self.graph, self.graph_url = start_server(graph, faults, graph_limited)
+        self.images, self.images_url = start_server(image_host_route(lambda: self.images_url), faults)
+
+    def env(self) -> Dict[str, str]:
+        return {
+            "NEIS_HOST": self.neis_url + "/hub",
+            "GRAPH_HOST": self.graph_url,
+            "TRANSFER_SH_HOST": self.images_url,
+            "CATBOX_HOST": self.images_url,
+            "UPLOAD_PROVIDER": "transfersh",
+        }
+
+    def shutdown(self) -> None:
+        for srv in (self.neis, self.graph, self.images):
+            srv.shutdown()
+            srv.server_close()
+
+
+def load_rows(path: str = os.path.join("data", "sample_timetable.csv")) -> List[dict]:
+    import csv
+
+    with open(path, "r", encoding="utf-8") as f:
+        return [{"period": int(r["period"]), "subject": r["subject"], "room": r.get("room", "")} for r in csv.DictReader(f)]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Run local fake NEIS / Graph / image-host servers")
+    p.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    p.add_argument("--jitter", type=float, default=0.0, help="Extra random latency, 0..JITTER seconds")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    p.add_argument("--rate-limit", type=int, default=0, help="Requests per minute before rate-limit responses")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--record", metavar="DIR", help="Proxy NEIS/Graph to the live services and save responses")
+    g.add_argument("--replay", metavar="DIR", help="Serve responses recorded with --record")
+    args = p.parse_args()
+
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.rate_limit)
+    stack = FakeStack(faults=faults, record=args.record, replay=args.replay)
+    for k, v in stack.env().items():
+        print(f"export {k}={v}")
+    print("# e.g. POST_TEST_MODE=false IG_PAGE_ACCESS_TOKEN=x IG_BUSINESS_ID=1 python -m src.daemon --run-now", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stack.shutdown()
+
+
+if __name__ == "__main__":
+    main()
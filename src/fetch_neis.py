@@ -5,10 +5,14 @@ from typing import Dict, List, Optional
 import requests
 
 from .config import get_logger
+from . import tracing
+from . import neis_quota
+from .timetable_archive import shared_archive
+from .timetable_types import Timetable
 
 log = get_logger(__name__)
 
-NEIS_HOST = "https://open.neis.go.kr/hub"
+NEIS_HOST = os.getenv("NEIS_HOST", "https://open.neis.go.kr/hub")
 DEFAULT_TYPE = "json"
 
 
@@ -39,8 +43,11 @@ def _request(path: str, params: dict, *, attempts: int = 3, timeout: int = 15) -
     url = f"{NEIS_HOST}/{path}"
     last_err = None
     for i in range(attempts):
+        # Every attempt spends shared quota; QuotaExceeded propagates without retrying
+        neis_quota.acquire()
         try:
             r = session.get(url, params=q, timeout=timeout)
+            tracing.incr("bytes", len(r.content))
             r.raise_for_status()
             data = r.json()
             _check_head_ok(data)
@@ -50,6 +57,7 @@ def _request(path: str, params: dict, *, attempts: int = 3, timeout: int = 15) -
             backoff = 2 ** i
             log.warning("NEIS request failed (attempt %s/%s): %s", i + 1, attempts, e)
             if i < attempts - 1:
+                tracing.incr("retries")
                 time.sleep(backoff)
     # After all attempts
     raise RuntimeError(f"NEIS request failed after {attempts} attempts: {last_err}")
@@ -141,6 +149,24 @@ def get_timetable(
     AY: Optional[str] = None,
     SEM: Optional[str] = None,
 ) -> List[dict]:
+    """The day's rows as plain {"period", "subject", "room"} dicts (JSON-ready, mutable), unstripped as before.
+
+    `get_timetable_typed` returns the same rows as a Timetable (compact rows,
+    incremental digest) for callers that hash or keep many days.
+    """
+    return get_timetable_typed(school_level, ATPT, SD_SCHUL_CODE, yyyymmdd, grade, class_nm, AY=AY, SEM=SEM).legacy_rows()
+
+
+def get_timetable_typed(
+    school_level: str,
+    ATPT: str,
+    SD_SCHUL_CODE: str,
+    yyyymmdd: str,
+    grade: int,
+    class_nm: str,
+    AY: Optional[str] = None,
+    SEM: Optional[str] = None,
+) -> Timetable:
     endpoint = {"els": "elsTimetable", "mis": "misTimetable", "his": "hisTimetable"}[school_level]
     params = {
         "ATPT_OFCDC_SC_CODE": ATPT,
@@ -153,12 +179,30 @@ def get_timetable(
         params["AY"] = str(AY)
     if SEM:
         params["SEM"] = str(SEM)
-    data = _request(endpoint, params)
+    with tracing.span("fetch", endpoint=endpoint, date=yyyymmdd):
+        data = _request(endpoint, params)
     rows = data.get(endpoint, [None, {"row": []}])[1]["row"]
     rows.sort(key=lambda r: int(r.get("PERIO", 0)))
 
-    # Build simplified rows
-    result = []
+    with tracing.span("normalize", rows=len(rows)):
+        result = _simplify_rows(rows, class_nm, date=yyyymmdd)
+    _archive(ATPT, SD_SCHUL_CODE, grade, class_nm, yyyymmdd, result)
+    return result
+
+
+def _archive(ATPT, SD_SCHUL_CODE, grade, class_nm, yyyymmdd, tt):
+    # Keep every fetched version for history/analytics; never fail a fetch over it
+    try:
+        arch = shared_archive()
+        if arch is not None:
+            arch.append(ATPT, SD_SCHUL_CODE, grade, class_nm, yyyymmdd, tt)
+    except Exception as e:
+        log.warning("Timetable archive append failed for %s: %s", yyyymmdd, e)
+
+
+def _simplify_rows(rows: List[dict], class_nm, date: Optional[str] = None) -> Timetable:
+    # Build simplified rows; the digest is folded in row by row as they are added
+    result = Timetable(date=date)
     for r in rows:
         subject = _normalize_subject(r.get("ITRT_CNTNT", "-"))
         # Try room from multiple possible keys
@@ -176,11 +220,6 @@ def get_timetable(
         if room_val and digits(room_val) and digits(room_val) == digits(cls):
             room_val = ""
 
-        result.append(
-            {
-                "period": int(r.get("PERIO", 0)),
-                "subject": subject,
-                "room": room_val,
-            }
-        )
+        # A dict, not a Period: the Timetable keeps the unstripped values for legacy hashes
+        result.append({"period": int(r.get("PERIO", 0)), "subject": subject, "room": room_val})
     return result
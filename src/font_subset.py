@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import glob
+import logging
+import string
+import argparse
+import subprocess
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from .config import get_logger
+from .render_assets import collect_subjects, font_file_hash
+
+log = get_logger(__name__)
+
+# Empty disables subsets; the renderer then always loads the full fonts
+FONT_SUBSET_DIR = os.getenv("FONT_SUBSET_DIR", "cache/fonts")
+
+# Everything the renderer draws besides subject names: dates ("2025년09월04일 목요일"),
+# period labels, the lunch row, placeholders and the ellipsis of fitted subjects
+FIXED_TEXT = "0123456789년월일요월화수목금토일교시점심시간수업시간표-…" + string.printable.strip() + " "
+# Sizes the renderer loads (title, date, label, subject)
+SIZES = (64, 32, 60, 48)
+
+# (font path, subset dir) -> (meta/font file stamps, result); a rebuilt subset or font changes the stamps
+_subsets: Dict[Tuple[str, str], Tuple[tuple, Optional[Tuple[str, FrozenSet[str]]]]] = {}
+
+
+def _stamp(path: str) -> Optional[Tuple[float, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+def _meta_path(subset_path: str) -> str:
+    return subset_path + ".json"
+
+
+def subset_for(path: str, subset_dir: Optional[str] = None) -> Optional[Tuple[str, FrozenSet[str]]]:
+    """(subset font path, covered characters) for the full font at `path`, if built.
+
+    A subset built from a different font file (same name, other contents) is ignored.
+    """
+    subset_dir = FONT_SUBSET_DIR if subset_dir is None else subset_dir
+    if not subset_dir or not os.path.exists(path):
+        return None
+    k = (path, subset_dir)
+    sp = os.path.join(subset_dir, os.path.basename(path))
+    stamp = (_stamp(_meta_path(sp)), _stamp(path))
+    hit = _subsets.get(k)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    found = None
+    try:
+        with open(_meta_path(sp), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if os.path.exists(sp) and meta.get("source_sha") == font_file_hash(path):
+            found = (sp, frozenset(meta["chars"]))
+        else:
+            log.info("Font subset %s is out of date for %s; using the full font", sp, path)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as e:
+        log.warning("Font subset metadata for %s unreadable: %s", sp, e)
+    _subsets[k] = (stamp, found)
+    return found
+
+
+def _cached_subjects(cache_dir: str) -> List[str]:
+    out = []
+    for p in glob.glob(os.path.join(cache_dir, "*.json")):
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(data, dict):
+            out.extend(r.get("subject") or "" for r in data.get("timetable") or [] if isinstance(r, dict))
+    return out
+
+
+def collect_text(sources: List[str]) -> str:
+    """Every character the renderer can be asked to draw, from the fixed labels and all known subjects.
+
+    Subjects come from alias JSON / timetable CSV files, SUBJECT_ALIASES, the
+    NEIS response cache and the timetable archive's subject dictionary.
+    """
+    from . import timetable_archive, timetable_cache
+
+    subjects = list(collect_subjects(sources))
+    inline = os.getenv("SUBJECT_ALIASES")
+    if inline:
+        try:
+            subjects.extend(v for v in json.loads(inline).values() if isinstance(v, str))
+        except ValueError:
+            pass
+    subjects.extend(_cached_subjects(timetable_cache.CACHE_DIR))
+    if timetable_archive.ARCHIVE_DIR:
+        try:
+            with open(os.path.join(timetable_archive.ARCHIVE_DIR, "subjects.txt"), "r", encoding="utf-8") as f:
+                subjects.extend(f.read().split("\n"))
+        except FileNotFoundError:
+            pass
+    chars = set(FIXED_TEXT)
+    for s in subjects:
+        chars.update(s)
+    return "".join(sorted(c for c in chars if c.isprintable()))
+
+
+def subset_font(src: str, dst: str, text: str) -> None:
+    """Write the glyphs for `text` from `src` to `dst`, keeping hinting and layout features."""
+    try:
+        from fontTools import subset
+    except ImportError:
+        raise RuntimeError("Font subsetting needs fontTools: pip install fonttools") from None
+
+    # fontTools logs every pruned table at INFO
+    logging.getLogger("fontTools").setLevel(logging.WARNING)
+    options = subset.Options()
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    font = subset.load_font(src, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=text)
+    subsetter.subset(font)
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    subset.save_font(font, tmp, options)
+    cmap = font.getBestCmap() or {}
+    font.close()
+    os.replace(tmp, dst)
+    # Characters the source font lacks stay uncovered, so they are still looked up in the full font
+    covered = "".join(c for c in text if ord(c) in cmap)
+    with open(_meta_path(dst) + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"source": src, "source_sha": font_file_hash(src), "chars": covered}, f, ensure_ascii=False)
+    os.replace(_meta_path(dst) + ".tmp", _meta_path(dst))
+
+
+_PROBE = """
+import sys, time
+from PIL import Image, ImageDraw, ImageFont
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096
+base = rss(); t0 = time.perf_counter()
+fonts = [ImageFont.truetype(sys.argv[1], int(s)) for s in sys.argv[2:]]
+d = ImageDraw.Draw(Image.new("L", (1, 1)))
+for f in fonts:
+    d.textbbox((0, 0), "2025년09월04일 목요일 1교시 국어", font=f)
+print((time.perf_counter() - t0) * 1000, rss() - base)
+"""
+
+
+def probe(path: str, sizes=SIZES) -> Tuple[float, int]:
+    """(load ms, RSS bytes added) for loading `path` at the renderer's sizes, in a fresh interpreter."""
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE, path, *map(str, sizes)], capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(out[0]), int(out[1])
+
+
+def build(sources: List[str], subset_dir: str = FONT_SUBSET_DIR, measure: bool = True) -> List[dict]:
+    """Subset the fonts the renderer picks (bold and regular) to the collected text."""
+    from .render_image import _font_path
+
+    if not subset_dir:
+        raise ValueError("FONT_SUBSET_DIR is empty (subsets disabled)")
+    text = collect_text(sources)
+    reports = []
+    for kind in ("bold", "regular"):
+        src = _font_path(kind)
+        if not src or any(r["source"] == src for r in reports):
+            continue
+        dst = os.path.join(subset_dir, os.path.basename(src))
+        subset_font(src, dst, text)
+        _subsets.clear()
+        r = {"kind": kind, "source": src, "subset": dst, "chars": len(text),
+             "bytes": (os.path.getsize(src), os.path.getsize(dst))}
+        if measure and sys.platform.startswith("linux"):
+            full, sub = probe(src), probe(dst)
+            r["load_ms"], r["rss"] = (full[0], sub[0]), (full[1], sub[1])
+        reports.append(r)
+    return reports
+
+
+def main():
+    p = argparse.ArgumentParser(description="Subset the render fonts to the characters actually drawn")
+    p.add_argument("--dir", default=FONT_SUBSET_DIR or "cache/fonts", help="Output directory (default: %(default)s)")
+    p.add_argument("--no-measure", action="store_true", help="Skip the load time / memory comparison")
+    p.add_argument(
+        "sources",
+        nargs="*",
+        default=["data/subject_aliases.json", "data/sample_timetable.csv"],
+        help="Alias JSON / timetable CSV files to collect subject names from",
+    )
+    args = p.parse_args()
+    for r in build(args.sources, args.dir, measure=not args.no_measure):
+        full, sub = r["bytes"]
+        print(f"{r['kind']:<8} {r['source']} -> {r['subset']}: {r['chars']} chars, {full / 1024:.0f} KB -> {sub / 1024:.0f} KB")
+        if "load_ms" in r:
+            (t_full, t_sub), (m_full, m_sub) = r["load_ms"], r["rss"]
+            print(f"         load x{len(SIZES)} sizes {t_full:.1f} ms -> {t_sub:.1f} ms, "
+                  f"RSS +{m_full / 1024:.0f} KB -> +{m_sub / 1024:.0f} KB (saved {(m_full - m_sub) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import json
+import time
+from typing import Any, List, Optional
+from urllib.parse import urlencode
+
+import requests
+
+from .config import get_logger
+from . import tracing
+from .graph_throttle import throttle, is_rate_limit_error
+
+log = get_logger(__name__)
+
+# Graph accepts at most 50 operations per batch request
+MAX_BATCH = 50
+
+
+class GraphBatchError(RuntimeError):
+    """One operation inside a batch failed; carries its HTTP code and Graph error body."""
+
+    def __init__(self, code: Optional[int], body: Any):
+        self.code = code
+        self.body = body
+        err = body.get("error") if isinstance(body, dict) else None
+        msg = (err or {}).get("message") if isinstance(err, dict) else body
+        super().__init__(f"Graph batch item failed (code={code}): {msg}")
+
+
+def op(method: str, relative_url: str, params: Optional[dict] = None, body: Optional[dict] = None) -> dict:
+    """Build one batch operation. `params` go in the query string, `body` is form-encoded."""
+    url = relative_url.lstrip("/")
+    if params:
+        url += ("&" if "?" in url else "?") + urlencode(params)
+    o = {"method": method.upper(), "relative_url": url}
+    if body:
+        o["body"] = urlencode(body)
+    return o
+
+
+def _demux(resp: Any) -> Any:
+    if resp is None:
+        # Graph returns null for operations it did not get to (e.g. timeouts)
+        return GraphBatchError(None, "no response")
+    code = resp.get("code")
+    try:
+        body = json.loads(resp.get("body") or "null")
+    except ValueError:
+        body = resp.get("body")
+    # Per-op usage headers feed the throttle just like top-level responses
+    headers = {h.get("name"): h.get("value") for h in resp.get("headers") or [] if isinstance(h, dict)}
+    throttle.observe(headers, body if not (code and 200 <= int(code) < 300) else None)
+    if code and 200 <= int(code) < 300:
+        return body
+    return GraphBatchError(code, body)
+
+
+def _retryable(result: Any) -> bool:
+    """A per-op failure worth another attempt: not run, failed server-side, or rate limited."""
+    if not isinstance(result, GraphBatchError):
+        return False
+    try:
+        return result.code is None or int(result.code) >= 500 or is_rate_limit_error(result.body)
+    except (TypeError, ValueError):
+        return False
+
+
+def _send(graph: str, chunk: List[dict], access_token: str, timeout: int) -> List[Any]:
+    data = {"batch": json.dumps(chunk), "access_token": access_token, "include_headers": "true"}
+    throttle.wait()
+    r = requests.post(graph.rstrip("/") + "/", data=data, timeout=timeout)
+    tracing.incr("bytes", len(r.content))
+    throttle.observe(r.headers)
+    r.raise_for_status()
+    payload = r.json()
+    if not isinstance(payload, list) or len(payload) != len(chunk):
+        raise RuntimeError(f"Unexpected batch response: {str(payload)[:200]}")
+    return [_demux(x) for x in payload]
+
+
+def batch(graph: str, ops: List[dict], access_token: str, *, attempts: int = 3, timeout: int = 60) -> List[Any]:
+    """Send operations through the Graph batch endpoint, one HTTP round trip per 50 ops.
+
+    Returns one entry per op in order: the decoded JSON body on success, or a
+    GraphBatchError instance for that op. Per-op access tokens may be put in
+    each op's params; `access_token` is the fallback for ops without one.
+
+    Retries resend only the ops that failed transiently (no response, 5xx,
+    rate limit), so ops that went through are never repeated. A failed round
+    trip is retried only when Graph cannot have run it (an HTTP error status
+    or a connect timeout) or when every op is a GET; otherwise a POST such as
+    a container create may already have happened, and this raises instead.
+    """
+    results: List[Any] = [None] * len(ops)
+    for i in range(0, len(ops), MAX_BATCH):
+        pending = list(range(i, min(i + MAX_BATCH, len(ops))))
+        last_err = None
+        for a in range(attempts):
+            if a:
+                tracing.incr("retries")
+                time.sleep(2 ** (a - 1))
+            try:
+                res = _send(graph, [ops[k] for k in pending], access_token, timeout)
+            except (requests.exceptions.RequestException, RuntimeError, ValueError) as e:
+                last_err = e
+                log.warning("Graph batch request failed (attempt %s/%s): %s", a + 1, attempts, e)
+                safe = isinstance(e, (requests.exceptions.HTTPError, requests.exceptions.ConnectTimeout))
+                if not safe and any(ops[k]["method"] != "GET" for k in pending):
+                    raise RuntimeError(f"Graph batch request failed and was not retried (it may have been applied): {e}") from e
+                continue
+            for k, r in zip(pending, res):
+                results[k] = r
+            pending = [k for k in pending if _retryable(results[k])]
+            if not pending:
+                break
+            last_err = None
+            log.warning("Graph batch: %d op(s) failed transiently (attempt %s/%s)", len(pending), a + 1, attempts)
+        if last_err is not None:
+            raise RuntimeError(f"Graph batch request failed after {attempts} attempts: {last_err}")
+    return results
+
+
+def raise_for_item(result: Any) -> Any:
+    if isinstance(result, Exception):
+        raise result
+    return result
@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import threading
+from contextlib import nullcontext
+from typing import Dict, Optional
+
+from .config import get_logger
+from .file_lock import locked
+
+log = get_logger(__name__)
+
+STATE_DIR = os.getenv("STATE_DIR", "state")
+USAGE_PATH = os.path.join(STATE_DIR, "graph_usage.json")
+
+# Start slowing down at SOFT %, stop calling at HARD % until usage decays
+SOFT_PCT = float(os.getenv("GRAPH_THROTTLE_SOFT_PCT", "75") or 75)
+HARD_PCT = float(os.getenv("GRAPH_THROTTLE_HARD_PCT", "95") or 95)
+# Delay at the top of the soft band; usage windows roll over one hour
+MAX_SOFT_DELAY = float(os.getenv("GRAPH_THROTTLE_MAX_SOFT_DELAY_SEC", "30") or 30)
+# Longer waits raise GraphRateLimited so callers can defer instead of blocking
+MAX_WAIT = float(os.getenv("GRAPH_THROTTLE_MAX_WAIT_SEC", "300") or 300)
+WINDOW_SEC = 3600.0
+
+# Graph throttling error codes (app, user, page, API-specific, business use case)
+RATE_LIMIT_CODES = {4, 17, 32, 613}
+
+
+class GraphRateLimited(RuntimeError):
+    """The remaining Graph budget will not recover within GRAPH_THROTTLE_MAX_WAIT_SEC."""
+
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"Graph rate limit for {scope}; retry in {retry_after:.0f}s")
+
+
+def is_rate_limit_error(body) -> bool:
+    err = body.get("error") if isinstance(body, dict) else None
+    if not isinstance(err, dict):
+        return False
+    code = err.get("code")
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        return False
+    return code in RATE_LIMIT_CODES or 80000 <= code < 80100
+
+
+def _pct(d: dict) -> float:
+    vals = []
+    for k in ("call_count", "total_time", "total_cputime", "acc_id_util_pct"):
+        try:
+            vals.append(float(d.get(k) or 0))
+        except (TypeError, ValueError):
+            pass
+    return max(vals) if vals else 0.0
+
+
+class Throttle:
+    """Tracks Graph budget per scope ("app" and each business/IG account id).
+
+    Usage comes from the X-App-Usage and X-Business-Use-Case-Usage headers
+    returned on every call. Usage percentages are treated as decaying
+    linearly over Graph's one-hour window since they were observed; an
+    `estimated_time_to_regain_access` blocks the scope until it elapses.
+    The state file is shared by every process on the host: it is re-read
+    under its file lock before each decision and each update.
+    """
+
+    def __init__(self, path: Optional[str] = USAGE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.scopes: Dict[str, dict] = {}
+        self._stamp = None
+        with self._file_lock():
+            self._load()
+
+    def _file_lock(self):
+        return locked(self.path + ".lock") if self.path else nullcontext()
+
+    def _load(self):
+        """Pick up what other processes observed; skips the parse when the file is unchanged (every save replaces the inode)."""
+        if not (self.path and os.path.exists(self.path)):
+            return
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        if (st.st_ino, st.st_mtime_ns, st.st_size) == self._stamp:
+            return
+        self._stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.scopes = json.load(f)
+        except Exception as e:
+            log.warning("Failed to load Graph usage state: %s", e)
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.scopes, f)
+            os.replace(tmp, self.path)
+            st = os.stat(self.path)
+            self._stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except Exception as e:
+            log.debug("Failed to save Graph usage state: %s", e)
+
+    def _set(self, scope: str, pct: float, regain_at: float = 0.0):
+        now = time.time()
+        cur = self.scopes.get(scope, {})
+        self.scopes[scope] = {
+            "pct": pct,
+            "at": now,
+            "regain_at": max(regain_at, cur.get("regain_at", 0.0) if cur.get("regain_at", 0.0) > now else 0.0),
+        }
+
+    def observe(self, headers, body=None, account: Optional[str] = None) -> None:
+        """Record budget from a Graph response's headers (and error body, if any)."""
+        now = time.time()
+        with self._lock, self._file_lock():
+            self._load()
+            app = headers.get("X-App-Usage") if headers is not None else None
+            if app:
+                try:
+                    self._set("app", _pct(json.loads(app)))
+                except ValueError:
+                    pass
+            buc = headers.get("X-Business-Use-Case-Usage") if headers is not None else None
+            if buc:
+                try:
+                    for biz_id, entries in json.loads(buc).items():
+                        pct, regain = 0.0, 0.0
+                        for e in entries or []:
+                            pct = max(pct, _pct(e))
+                            mins = float(e.get("estimated_time_to_regain_access") or 0)
+                            if mins:
+                                regain = max(regain, now + mins * 60)
+                        self._set(str(biz_id), pct, regain)
+                except (ValueError, AttributeError):
+                    pass
+            if body is not None and is_rate_limit_error(body):
+                # Throttled without a usable estimate: hold the scope for a cautious minute
+                scope = str(account) if account else "app"
+                cur = self.scopes.get(scope, {})
+                regain = cur.get("regain_at", 0.0)
+                if regain <= now:
+                    regain = now + 60
+                self._set(scope, 100.0, regain)
+            self._save()
+
+    def delay_for(self, account: Optional[str] = None) -> float:
+        """Seconds to wait before the next call for this account (0 when there is headroom)."""
+        now = time.time()
+        delay = 0.0
+        with self._lock, self._file_lock():
+            self._load()
+            for scope in ("app", str(account) if account else None):
+                s = self.scopes.get(scope) if scope else None
+                if not s:
+                    continue
+                if s.get("regain_at", 0) > now:
+                    delay = max(delay, s["regain_at"] - now)
+                    continue
+                pct = s["pct"] * max(0.0, 1 - (now - s["at"]) / WINDOW_SEC)
+                if pct >= HARD_PCT:
+                    # Time until the decayed usage drops back under the hard limit
+                    delay = max(delay, (1 - HARD_PCT / s["pct"]) * WINDOW_SEC - (now - s["at"]))
+                elif pct >= SOFT_PCT:
+                    delay = max(delay, (pct - SOFT_PCT) / (HARD_PCT - SOFT_PCT) * MAX_SOFT_DELAY)
+        return max(0.0, delay)
+
+    def wait(self, account: Optional[str] = None) -> float:
+        """Sleep until the account has budget; raise GraphRateLimited if that is too long."""
+        d = self.delay_for(account)
+        if d <= 0:
+            return 0.0
+        if d > MAX_WAIT:
+            raise GraphRateLimited(str(account or "app"), d)
+        log.info("Graph budget low (account=%s); waiting %.1fs", account or "app", d)
+        time.sleep(d)
+        return d
+
+
+throttle = Throttle()
@@ -0,0 +1,178 @@
+import os
+import re
+import sys
+import json
+import time
+import html
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Allow `python src/http_preview.py` (the systemd unit) as well as `python -m src.http_preview`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.config import get_logger  # noqa: E402
+from src.render_image import _render, _shared_context, encode_jpeg, layout  # noqa: E402
+from src.daemon import format_date_kr, now_kr  # noqa: E402
+
+log = get_logger(__name__)
+
+PREVIEW_HOST = os.getenv("PREVIEW_HOST", "127.0.0.1")
+PREVIEW_PORT = int(os.getenv("PREVIEW_PORT", "8080") or 8080)
+# Rendered images served at /<basename> (what IMAGE_URL_TEMPLATE points at)
+SERVE_DIR = os.getenv("RENDER_SAVE_DIR", "out").strip() or "out"
+
+# Layout keys the form may override; fonts and templates stay as configured on disk
+_ALLOWED = re.compile(r"^(DATE|SUBJECT|LUNCH)_[A-Z0-9_]+$")
+FIELDS = [
+    "DATE_ANCHOR_XY", "DATE_ANCHOR_MODE", "DATE_ALIGN", "DATE_ALIGN_X1", "DATE_BOX_6TIME", "DATE_BOX_7TIME",
+    "DATE_BOX_OFFSET_Y", "SUBJECT_ANCHOR_XY", "SUBJECT_ANCHOR_MODE", "SUBJECT_ROW_DY", "SUBJECT_ROW_DY_7TIME",
+    "SUBJECT_ALIGN", "SUBJECT_ALIGN_X1", "SUBJECT_ANCHOR_AFTER_LUNCH_XY", "SUBJECT_ANCHOR_AFTER_LUNCH_XY_7TIME",
+    "SUBJECT_ROW_DY_AFTER_LUNCH", "LUNCH_AFTER_PERIOD",
+]
+SAMPLE_SUBJECTS = ["국어", "수학", "영어", "체육", "과학", "음악", "미술", "정보"]
+_CACHE_SIZE = 64
+
+_render_lock = threading.Lock()
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+
+def _sample(periods: int):
+    return [{"period": i, "subject": s, "room": ""} for i, s in enumerate(SAMPLE_SUBJECTS[:periods], start=1)]
+
+
+def render_preview(overrides: dict, periods: int = 6, debug: bool = True, date_str: str = ""):
+    """JPEG bytes and render milliseconds for the sample timetable under `overrides`.
+
+    Templates, fonts and text tiles stay loaded in the shared render context,
+    so a changed parameter costs one composition; recent results are memoized.
+    """
+    date_str = date_str or format_date_kr(now_kr())
+    overrides = {k: v for k, v in overrides.items() if _ALLOWED.match(k) and v != ""}
+    if debug:
+        overrides["RENDER_DEBUG_BOXES"] = "true"
+    key = (tuple(sorted(overrides.items())), periods, date_str)
+    with _render_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit[0], 0.0
+        t0 = time.perf_counter()
+        with layout(overrides):
+            img, _ = _render(date_str, _sample(periods), os.getenv("BRAND_COLOR_HEX", "#2A6CF0"), ctx=_shared_context())
+        data = encode_jpeg(img, quality=85)
+        ms = (time.perf_counter() - t0) * 1000
+        _cache[key] = (data,)
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return data, ms
+
+
+_PAGE = """<!doctype html>
+<html lang="ko"><head><meta charset="utf-8"><title>Timetable layout preview</title>
+<style>
+body{{font-family:sans-serif;display:flex;gap:16px;margin:16px}}
+form{{min-width:340px}} label{{display:block;font-size:12px;margin-top:6px}}
+input,select{{width:100%;box-sizing:border-box}} img{{max-height:95vh;border:1px solid #ccc}}
+pre{{background:#f4f4f4;padding:8px;font-size:12px;white-space:pre-wrap}}
+</style></head><body>
+<form id="f">
+<label>periods <select name="periods"><option>6</option><option>7</option><option>8</option></select></label>
+<label><input type="checkbox" name="debug" checked style="width:auto"> debug boxes</label>
+{fields}
+<p id="ms"></p><pre id="env"></pre>
+</form>
+<img id="img" src="/render.jpg">
+<script>
+const f = document.getElementById('f'), img = document.getElementById('img');
+let timer = null, pending = false, busy = false;
+function query() {{
+  const q = new URLSearchParams();
+  for (const el of f.elements) {{
+    if (!el.name) continue;
+    if (el.type === 'checkbox') q.set(el.name, el.checked ? '1' : '0');
+    else if (el.value !== '') q.set(el.name, el.value);
+  }}
+  return q;
+}}
+function refresh() {{
+  if (busy) {{ pending = true; return; }}
+  busy = true;
+  const q = query(), t0 = performance.now();
+  fetch('/render.jpg?' + q).then(r => {{
+    document.getElementById('ms').textContent =
+      'render ' + r.headers.get('X-Render-Ms') + ' ms, round trip ' + Math.round(performance.now() - t0) + ' ms';
+    return r.blob();
+  }}).then(b => {{
+    URL.revokeObjectURL(img.src); img.src = URL.createObjectURL(b);
+    document.getElementById('env').textContent =
+      [...q].filter(([k]) => k.toUpperCase() === k).map(([k, v]) => k + '=' + v).join('\\n');
+  }}).finally(() => {{ busy = false; if (pending) {{ pending = false; refresh(); }} }});
+}}
+f.addEventListener('input', () => {{ clearTimeout(timer); timer = setTimeout(refresh, 30); }});
+refresh();
+</script></body></html>"""
+
+
+def _page() -> bytes:
+    fields = "\n".join(
+        f'<label>{k} <input name="{k}" value="{html.escape(os.getenv(k, ""))}"></label>' for k in FIELDS
+    )
+    return _PAGE.format(fields=fields).encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _send(self, code, body: bytes, ctype: str, headers=None):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        q = {k: v[-1] for k, v in parse_qs(u.query).items()}
+        if u.path == "/":
+            return self._send(200, _page(), "text/html; charset=utf-8")
+        if u.path == "/render.jpg":
+            try:
+                periods = min(max(int(q.pop("periods", "6")), 1), len(SAMPLE_SUBJECTS))
+                debug = q.pop("debug", "1") == "1"
+                date_str = q.pop("date", "")
+                data, ms = render_preview(q, periods, debug, date_str)
+            except Exception as e:
+                log.exception("Preview render failed")
+                return self._send(400, json.dumps({"error": str(e)}).encode("utf-8"), "application/json")
+            return self._send(200, data, "image/jpeg", {"X-Render-Ms": f"{ms:.1f}"})
+        # Rendered posts, for IMAGE_URL_TEMPLATE=http://host:port/{basename}
+        name = u.path.lstrip("/")
+        if re.fullmatch(r"[A-Za-z0-9_.-]+\.jpe?g", name):
+            path = os.path.join(SERVE_DIR, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    return self._send(200, f.read(), "image/jpeg")
+        self._send(404, b"not found", "text/plain")
+
+    def log_message(self, fmt, *args):
+        log.debug("preview: " + fmt, *args)
+
+
+def main():
+    # Warm templates, fonts and sprite tiles before the first request
+    for n in (6, 7):
+        render_preview({}, n, debug=False)
+    srv = ThreadingHTTPServer((PREVIEW_HOST, PREVIEW_PORT), _Handler)
+    log.info("Layout preview on http://%s:%d/ (serving %s/*.jpg)", PREVIEW_HOST, PREVIEW_PORT, SERVE_DIR)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
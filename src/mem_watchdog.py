@@ -0,0 +1,254 @@
+import gc
+import os
+import sys
+import time
+import signal
+import threading
+import tracemalloc
+import datetime as dt
+from contextlib import contextmanager
+from typing import Optional
+
+from .config import get_logger, LOG_DIR
+from . import tracing
+
+log = get_logger(__name__)
+
+# RSS above the soft limit after a job drops the render/archive caches; above the hard
+# limit the daemon re-executes itself. 0 disables either. Both act only between jobs.
+MEM_SOFT_LIMIT_MB = float(os.getenv("MEM_SOFT_LIMIT_MB", "0") or 0)
+MEM_HARD_LIMIT_MB = float(os.getenv("MEM_HARD_LIMIT_MB", "0") or 0)
+# A restart is postponed when the next scheduled job is closer than this
+MEM_RESTART_GUARD_SEC = float(os.getenv("MEM_RESTART_GUARD_SEC", "120") or 0)
+# Stack depth kept by tracemalloc once SIGUSR1 (or MEM_TRACEMALLOC=1) turns it on
+MEM_TRACE_FRAMES = int(os.getenv("MEM_TRACE_FRAMES", "10") or 10)
+MEM_SNAPSHOT_DIR = os.getenv("MEM_SNAPSHOT_DIR", LOG_DIR)
+
+_lock = threading.Lock()
+_active = 0
+_last: Optional[dict] = None
+_prev_snapshot: Optional[tracemalloc.Snapshot] = None
+_scheduler = None
+# A check found RSS over a limit but had to wait for background revalidations
+_recheck = False
+# Set when the whole process should be recycled; main() waits on it
+restart_requested = threading.Event()
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def sample() -> dict:
+    s = {"rss": rss_bytes(), "objects": len(gc.get_objects())}
+    if tracemalloc.is_tracing():
+        s["traced"] = tracemalloc.get_traced_memory()[0]
+    return s
+
+
+def _mb(n: float) -> float:
+    return n / (1024 * 1024)
+
+
+def _trim() -> None:
+    """Return freed heap pages to the OS (glibc only); Python's frees alone rarely shrink RSS."""
+    try:
+        import ctypes
+
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def release_caches() -> None:
+    """Soft recycle: drop the render context (templates, fonts, tiles) and the archive maps.
+
+    Both are rebuilt on next use; tiles come back from the sprite cache on disk.
+    """
+    from .render_image import release_shared_context
+    from .timetable_archive import release_shared_archive
+
+    release_shared_context()
+    release_shared_archive()
+    gc.collect()
+    _trim()
+
+
+def _next_job_in() -> Optional[float]:
+    if _scheduler is None:
+        return None
+    times = [j.next_run_time for j in _scheduler.get_jobs() if j.next_run_time]
+    if not times:
+        return None
+    return (min(times) - dt.datetime.now(min(times).tzinfo)).total_seconds()
+
+
+def _deferred_jobs() -> int:
+    """One-off jobs (rate-limit deferrals) that only live in this process's scheduler."""
+    from apscheduler.triggers.date import DateTrigger
+
+    return sum(1 for j in _scheduler.get_jobs() if isinstance(j.trigger, DateTrigger))
+
+
+def _check(name: str) -> None:
+    global _last, _recheck
+    from .timetable_cache import revalidating
+
+    s = sample()
+    prev = _last or s
+    _last = s
+    tracing.metrics.observe_memory(s["rss"], s["objects"])
+    log.info(
+        "Memory after %s: RSS %.1f MB (%+.1f), %d objects (%+d)%s",
+        name, _mb(s["rss"]), _mb(s["rss"] - prev["rss"]), s["objects"], s["objects"] - prev["objects"],
+        f", traced {_mb(s['traced']):.1f} MB" if "traced" in s else "",
+    )
+    hard = MEM_HARD_LIMIT_MB and _mb(s["rss"]) > MEM_HARD_LIMIT_MB
+    soft = MEM_SOFT_LIMIT_MB and _mb(s["rss"]) > MEM_SOFT_LIMIT_MB
+    if not (hard or soft):
+        _recheck = False
+        return
+    with _lock:
+        busy = _active
+        revalidations = revalidating()
+        # Jobs check again as they finish; revalidations are rechecked through _after_revalidation
+        _recheck = bool(revalidations)
+    busy += revalidations
+    if busy:
+        log.info("RSS over the limit; recycling after the %d job(s) still running", busy)
+        return
+
+    if hard and _scheduler is not None:
+        if _deferred_jobs():
+            log.warning("RSS %.1f MB over MEM_HARD_LIMIT_MB; a deferred job is queued, restarting after it", _mb(s["rss"]))
+            return
+        soon = _next_job_in()
+        if soon is not None and soon < MEM_RESTART_GUARD_SEC:
+            log.warning("RSS %.1f MB over MEM_HARD_LIMIT_MB; next job in %.0fs, restarting after it", _mb(s["rss"]), soon)
+            return
+        log.warning("RSS %.1f MB over MEM_HARD_LIMIT_MB=%.0f; restarting the daemon", _mb(s["rss"]), MEM_HARD_LIMIT_MB)
+        tracing.metrics.observe_recycle("restart")
+        restart_requested.set()
+        return
+
+    t0 = time.perf_counter()
+    release_caches()
+    after = sample()
+    _last = after
+    tracing.metrics.observe_recycle("caches")
+    tracing.metrics.observe_memory(after["rss"], after["objects"])
+    log.warning(
+        "RSS %.1f MB over the limit; released render/archive caches in %.0f ms: RSS %.1f MB, %d objects",
+        _mb(s["rss"]), (time.perf_counter() - t0) * 1000, _mb(after["rss"]), after["objects"],
+    )
+
+
+@contextmanager
+def job(name: str):
+    """Mark a scheduler job as running; memory is sampled (and recycled if needed) once none are."""
+    global _active
+    with _lock:
+        _active += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _active -= 1
+        try:
+            _check(name)
+        except Exception as e:
+            log.warning("Memory check after %s failed: %s", name, e)
+
+
+def _after_revalidation() -> None:
+    with _lock:
+        due = _recheck and not _active
+    if due:
+        try:
+            _check("revalidation")
+        except Exception as e:
+            log.warning("Memory check after revalidation failed: %s", e)
+
+
+def write_snapshot() -> str:
+    """Dump the top allocation sites (and growth since the previous dump) under MEM_SNAPSHOT_DIR."""
+    global _prev_snapshot
+    snap = tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+    )
+    os.makedirs(MEM_SNAPSHOT_DIR or ".", exist_ok=True)
+    path = os.path.join(MEM_SNAPSHOT_DIR or ".", time.strftime("tracemalloc-%Y%m%d-%H%M%S.txt"))
+    current, peak = tracemalloc.get_traced_memory()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"RSS {_mb(rss_bytes()):.1f} MB, traced {_mb(current):.1f} MB (peak {_mb(peak):.1f} MB)\n\n")
+        f.write("Top allocation sites:\n")
+        for st in snap.statistics("lineno")[:30]:
+            f.write(f"{st}\n")
+        if _prev_snapshot is not None:
+            f.write("\nGrowth since the previous snapshot:\n")
+            for st in snap.compare_to(_prev_snapshot, "lineno")[:30]:
+                f.write(f"{st}\n")
+        f.write("\nLargest site, full stack:\n")
+        top = snap.statistics("traceback")[:1]
+        for st in top:
+            f.write("\n".join(st.traceback.format()) + "\n")
+    _prev_snapshot = snap
+    return path
+
+
+def _on_sigusr1(*_):
+    try:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEM_TRACE_FRAMES)
+            log.info("tracemalloc started (%d frames); send SIGUSR1 again for a snapshot", MEM_TRACE_FRAMES)
+            return
+        log.info("tracemalloc snapshot written to %s", write_snapshot())
+    except Exception as e:
+        log.warning("tracemalloc snapshot failed: %s", e)
+
+
+def _on_sigusr2(*_):
+    global _prev_snapshot
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        _prev_snapshot = None
+        log.info("tracemalloc stopped")
+
+
+def install(scheduler=None) -> None:
+    """Hook the watchdog into the resident daemon (call from the main thread).
+
+    SIGUSR1 starts tracemalloc, then writes a snapshot on each further signal;
+    SIGUSR2 stops it. With `scheduler`, a hard-limit restart waits for its next job.
+    """
+    global _scheduler, _last
+    from .timetable_cache import on_revalidated
+
+    _scheduler = scheduler
+    _last = sample()
+    # A recycle deferred for background revalidations happens once the last of them ends
+    on_revalidated(_after_revalidation)
+    if os.getenv("MEM_TRACEMALLOC", "").lower() in ("1", "true"):
+        tracemalloc.start(MEM_TRACE_FRAMES)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, _on_sigusr1)
+        signal.signal(signal.SIGUSR2, _on_sigusr2)
+    log.info(
+        "Memory watchdog: RSS %.1f MB, soft limit %s, hard limit %s",
+        _mb(_last["rss"]),
+        f"{MEM_SOFT_LIMIT_MB:.0f} MB" if MEM_SOFT_LIMIT_MB else "off",
+        f"{MEM_HARD_LIMIT_MB:.0f} MB" if MEM_HARD_LIMIT_MB else "off",
+    )
+
+
+def reexec() -> None:
+    """Replace this process with a fresh daemon (same pid, so systemd keeps tracking it)."""
+    os.execv(sys.executable, [sys.executable, "-m", "src.daemon", *sys.argv[1:]])
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import datetime as dt
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict
+
+from .config import get_logger, TZ
+from .file_lock import locked
+
+log = get_logger(__name__)
+
+STATE_DIR = os.getenv("STATE_DIR", "state")
+QUOTA_PATH = os.getenv("NEIS_QUOTA_PATH", os.path.join(STATE_DIR, "neis_quota.json"))
+LOCK_PATH = QUOTA_PATH + ".lock"
+
+PER_MIN = float(os.getenv("NEIS_QUOTA_PER_MIN", "60") or 60)
+PER_DAY = int(os.getenv("NEIS_QUOTA_PER_DAY", "1000") or 1000)
+MAX_WAIT = float(os.getenv("NEIS_QUOTA_MAX_WAIT_SEC", "120") or 120)
+# How long a "post" request keeps lower classes paused after it ran
+PREEMPT_SEC = float(os.getenv("NEIS_QUOTA_PREEMPT_SEC", "90") or 90)
+
+# Share of each budget a class must leave untouched for higher classes.
+# "post" is the 07:00 pipeline, "update" the correction checks and
+# prefetch, "bulk" week/month generation.
+PRIORITIES: Dict[str, float] = {"post": 0.0, "update": 0.2, "bulk": 0.5}
+
+_priority: contextvars.ContextVar = contextvars.ContextVar(
+    "neis_priority", default=os.getenv("NEIS_PRIORITY", "update")
+)
+_spent_lock = threading.Lock()
+_spent: Dict[str, int] = {}
+_waited = [0.0]
+
+
+class QuotaExceeded(RuntimeError):
+    pass
+
+
+@contextmanager
+def priority(cls: str):
+    """Run NEIS calls made inside the block under the given priority class."""
+    if cls not in PRIORITIES:
+        raise ValueError(f"Unknown NEIS priority class: {cls}")
+    token = _priority.set(cls)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _load() -> dict:
+    try:
+        with open(QUOTA_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save(st: dict) -> None:
+    tmp = f"{QUOTA_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(st, f)
+    os.replace(tmp, QUOTA_PATH)
+
+
+def _try_take(cls: str, now: float):
+    """Under the lock: take one token if the class may; otherwise return seconds to wait."""
+    st = _load()
+    today = dt.datetime.now(TZ).strftime("%Y%m%d")
+    if st.get("day") != today:
+        st["day"], st["day_used"] = today, 0
+    tokens = min(PER_MIN, float(st.get("tokens", PER_MIN)) + (now - float(st.get("ts", now))) * PER_MIN / 60)
+    st["tokens"], st["ts"] = tokens, now
+
+    reserve = PRIORITIES[cls]
+    if st["day_used"] >= PER_DAY * (1 - reserve):
+        _save(st)
+        raise QuotaExceeded(f"NEIS daily budget for '{cls}' exhausted ({st['day_used']}/{PER_DAY})")
+    if cls != "post" and float(st.get("post_active_until", 0)) > now:
+        _save(st)
+        return float(st["post_active_until"]) - now
+    floor = PER_MIN * reserve
+    if tokens - 1 < floor:
+        _save(st)
+        return (floor + 1 - tokens) * 60 / PER_MIN
+
+    st["tokens"] = tokens - 1
+    st["day_used"] += 1
+    by_class = st.setdefault("day_by_class", {})
+    if st.get("by_class_day") != today:
+        by_class.clear()
+        st["by_class_day"] = today
+    by_class[cls] = by_class.get(cls, 0) + 1
+    if cls == "post":
+        st["post_active_until"] = now + PREEMPT_SEC
+    _save(st)
+    return 0.0
+
+
+def acquire() -> None:
+    """Block until one NEIS request is allowed for the current priority class.
+
+    Budgets (NEIS_QUOTA_PER_MIN token bucket, NEIS_QUOTA_PER_DAY counter) live
+    in a locked state file, so every process on the host draws from the same
+    bucket. Raises QuotaExceeded when the daily budget is gone or the wait
+    would exceed NEIS_QUOTA_MAX_WAIT_SEC.
+    """
+    cls = _priority.get()
+    if cls not in PRIORITIES:
+        cls = "update"
+    started = time.monotonic()
+    while True:
+        with locked(LOCK_PATH):
+            wait = _try_take(cls, time.time())
+        if wait <= 0:
+            with _spent_lock:
+                _spent[cls] = _spent.get(cls, 0) + 1
+                _waited[0] += time.monotonic() - started
+            return
+        if time.monotonic() - started + wait > MAX_WAIT:
+            raise QuotaExceeded(f"NEIS per-minute budget for '{cls}' unavailable within {MAX_WAIT:.0f}s")
+        time.sleep(min(wait, 5.0))
+
+
+def spent() -> int:
+    """Requests this process has drawn from the quota so far."""
+    with _spent_lock:
+        return sum(_spent.values())
+
+
+def summary() -> dict:
+    """Quota spent by this process plus the shared daily totals."""
+    with locked(LOCK_PATH):
+        st = _load()
+    with _spent_lock:
+        spent = dict(_spent)
+        waited = _waited[0]
+    return {
+        "spent": sum(spent.values()),
+        "spent_by_class": spent,
+        "waited_s": round(waited, 3),
+        "day_used": st.get("day_used", 0),
+        "day_limit": PER_DAY,
+        "day_by_class": st.get("day_by_class", {}),
+    }
+
+
+def log_summary(label: str = "run") -> dict:
+    s = summary()
+    log.info(
+        "NEIS quota (%s): spent %d %s, waited %.1fs; today %d/%d %s",
+        label,
+        s["spent"],
+        s["spent_by_class"],
+        s["waited_s"],
+        s["day_used"],
+        s["day_limit"],
+        s["day_by_class"],
+    )
+    return s
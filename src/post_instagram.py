@@ -2,26 +2,50 @@ import os
 import time
 import hmac
 import hashlib
+from datetime import datetime
+from typing import Any, List, Optional
+
 import requests
 from .config import get_logger
+from . import tracing
 from .token_manager import get_creds
+from . import graph_batch
+from .graph_throttle import throttle, is_rate_limit_error
 
 log = get_logger(__name__)
 
 TEST_MODE = os.getenv("POST_TEST_MODE", "true").lower() == "true"
+GRAPH = os.getenv("GRAPH_HOST", "https://graph.facebook.com").rstrip("/") + "/v21.0"
+# Instagram accepts 2-10 children per carousel post
+CAROUSEL_MIN, CAROUSEL_MAX = 2, 10
+# Recovering an interrupted publish: how many recent media are searched for the post,
+# and how far Graph's timestamps may run behind our clock
+RECOVERY_MEDIA_LIMIT = 25
+CLOCK_SKEW_SEC = 120
 
 
 def _ensure_creds():
     token, biz_id = get_creds()
     if not token or not biz_id:
         raise RuntimeError("Missing Instagram credentials")
+    return token, biz_id
+
 
+def _post_with_retry(url: str, data: dict, attempts: int = 3, timeout: int = 30, account: str = None) -> dict:
+    """POST to Graph with retries, pacing calls by the reported usage budget.
 
-def _post_with_retry(url: str, data: dict, attempts: int = 3, timeout: int = 30) -> dict:
+    Before every attempt the throttle waits for budget on the app and
+    ``account`` scopes (raising GraphRateLimited if that would take too long).
+    Rate-limit errors skip the fixed backoff; the throttle's wait, derived from
+    the usage headers and ``estimated_time_to_regain_access``, applies instead.
+    """
     last_err = None
     for i in range(attempts):
+        throttle.wait(account)
         try:
             r = requests.post(url, data=data, timeout=timeout)
+            tracing.incr("bytes", len(r.content))
+            throttle.observe(r.headers, account=account)
             r.raise_for_status()
             return r.json()
         except requests.exceptions.RequestException as e:
@@ -39,6 +63,10 @@ def _post_with_retry(url: str, data: dict, attempts: int = 3, timeout: int = 30)
                     body = e.response.text[:500] if e.response is not None else None
                 except Exception:
                     body = None
+            rate_limited = status == 429 or is_rate_limit_error(body)
+            if rate_limited:
+                throttle.observe({}, body, account=account)
+                tracing.incr("throttled")
             log.warning(
                 "Graph API request failed (attempt %s/%s, status=%s): %s | details=%s",
                 i + 1,
@@ -48,10 +76,20 @@ def _post_with_retry(url: str, data: dict, attempts: int = 3, timeout: int = 30)
                 body,
             )
             if i < attempts - 1:
-                time.sleep(backoff)
+                tracing.incr("retries")
+                if not rate_limited:
+                    time.sleep(backoff)
     raise RuntimeError(f"Graph API request failed after {attempts} attempts: {last_err}")
 
 
+def _get(url: str, params: dict, token: str, account: str = None, timeout: int = 30) -> dict:
+    throttle.wait(account)
+    r = requests.get(url, params=_append_appsecret_proof(dict(params, access_token=token), token), timeout=timeout)
+    throttle.observe(r.headers, account=account)
+    r.raise_for_status()
+    return r.json() or {}
+
+
 def _append_appsecret_proof(params: dict, token: str) -> dict:
     """Append appsecret_proof when FB_APP_SECRET is provided."""
     app_secret = os.getenv("FB_APP_SECRET")
@@ -65,28 +103,146 @@ def _append_appsecret_proof(params: dict, token: str) -> dict:
     return params
 
 
-def upload_image_via_url(image_url: str, caption: str) -> str:
+def create_media_container(image_url: str, caption: str) -> str:
+    """Create (but do not publish) an image media container; returns its creation id."""
     if TEST_MODE:
-        log.info("[TEST_MODE] Skipping upload. Caption preview:\n%s", caption)
-        return "TEST_POST_ID"
-    _ensure_creds()
-    token, ig_user_id = get_creds()
-    create_url = f"https://graph.facebook.com/v21.0/{ig_user_id}/media"
+        log.info("[TEST_MODE] Skipping container create. Caption preview:\n%s", caption)
+        return "TEST_CONTAINER_ID"
+    token, ig_user_id = _ensure_creds()
+    create_url = f"{GRAPH}/{ig_user_id}/media"
     data = {"image_url": image_url, "caption": caption, "access_token": token}
     data = _append_appsecret_proof(data, token)
-    j = _post_with_retry(create_url, data)
-    creation_id = j.get("id")
-    pub_url = f"https://graph.facebook.com/v21.0/{ig_user_id}/media_publish"
-    j2 = _post_with_retry(pub_url, _append_appsecret_proof({"creation_id": creation_id, "access_token": token}, token))
+    with tracing.span("create_container"):
+        j = _post_with_retry(create_url, data, account=ig_user_id)
+    return j.get("id")
+
+
+def container_request(image_url: str, caption: str) -> dict:
+    """One item for `create_media_containers`, posting as the current account."""
+    token, ig_user_id = _ensure_creds()
+    return {"token": token, "ig_user_id": ig_user_id, "image_url": image_url, "caption": caption}
+
+
+def create_media_containers(items: List[dict]) -> List[Any]:
+    """Create image containers for several accounts in one Graph batch round trip.
+
+    Each item is a dict with ``token``, ``ig_user_id``, ``image_url`` and
+    ``caption`` (see `container_request`). Returns one entry per item, in
+    order: its creation id, or the GraphBatchError for that item. Items that
+    fail transiently are retried on their own, so no container is created twice.
+    """
+    if TEST_MODE:
+        log.info("[TEST_MODE] Skipping %d container creates", len(items))
+        return [f"TEST_CONTAINER_ID_{i}" for i in range(len(items))]
+    ops = []
+    for it in items:
+        body = {"image_url": it["image_url"], "caption": it["caption"], "access_token": it["token"]}
+        ops.append(graph_batch.op("POST", f"{it['ig_user_id']}/media", body=_append_appsecret_proof(body, it["token"])))
+    with tracing.span("create_container", accounts=len(items)):
+        res = graph_batch.batch(GRAPH, ops, items[0]["token"])
+    out = []
+    for it, r in zip(items, res):
+        if isinstance(r, Exception):
+            log.warning("Container create failed for account %s: %s", it["ig_user_id"], r)
+            out.append(r)
+        else:
+            out.append((r or {}).get("id"))
+    return out
+
+
+def publish_container(creation_id: str) -> str:
+    """Publish a previously created media container; returns the media id."""
+    if TEST_MODE:
+        log.info("[TEST_MODE] Skipping publish. creation_id=%s", creation_id)
+        return "TEST_POST_ID"
+    token, ig_user_id = _ensure_creds()
+    pub_url = f"{GRAPH}/{ig_user_id}/media_publish"
+    with tracing.span("publish"):
+        j2 = _post_with_retry(
+            pub_url,
+            _append_appsecret_proof({"creation_id": creation_id, "access_token": token}, token),
+            account=ig_user_id,
+        )
     return j2.get("id")
 
 
+def published_media_id(creation_id: str, caption_sha256: str, since: float) -> Optional[str]:
+    """Media id for a container that was already published, else None.
+
+    For runs that crashed between media_publish and recording the post: the
+    container's status_code says whether it went out, and the post is then
+    found among the account's recent media by its caption digest and a
+    timestamp no earlier than `since` (the journaled publish intent). A
+    published container with no such media raises instead of guessing.
+    """
+    if TEST_MODE:
+        return None
+    token, ig_user_id = _ensure_creds()
+    with tracing.span("publish_check"):
+        status = _get(f"{GRAPH}/{creation_id}", {"fields": "status_code"}, token, account=ig_user_id).get("status_code")
+        tracing.annotate(status=status)
+        if status != "PUBLISHED":
+            return None
+        params = {"fields": "id,caption,timestamp", "limit": RECOVERY_MEDIA_LIMIT}
+        media = _get(f"{GRAPH}/{ig_user_id}/media", params, token, account=ig_user_id).get("data") or []
+    for m in media:
+        try:
+            ts = datetime.strptime(m.get("timestamp") or "", "%Y-%m-%dT%H:%M:%S%z").timestamp()
+        except ValueError:
+            continue
+        digest = hashlib.sha256((m.get("caption") or "").encode("utf-8")).hexdigest()
+        # Graph's clock and ours may disagree by a little
+        if digest == caption_sha256 and ts >= since - CLOCK_SKEW_SEC:
+            return m.get("id")
+    raise RuntimeError(
+        f"Container {creation_id} is PUBLISHED but none of the {len(media)} recent media match its caption "
+        f"and publish time; record the post id by hand"
+    )
+
+
+def create_carousel_container(image_urls: List[str], caption: str) -> str:
+    """Create an (unpublished) carousel container; returns its creation id.
+
+    All child containers are created in a single Graph batch round trip
+    (Graph runs the operations in parallel), then one more call creates
+    the carousel container that references them.
+    """
+    if not CAROUSEL_MIN <= len(image_urls) <= CAROUSEL_MAX:
+        raise ValueError(f"A carousel needs {CAROUSEL_MIN}-{CAROUSEL_MAX} images, got {len(image_urls)}")
+    if TEST_MODE:
+        log.info("[TEST_MODE] Skipping carousel create (%d images). Caption preview:\n%s", len(image_urls), caption)
+        return "TEST_CAROUSEL_ID"
+    token, ig_user_id = _ensure_creds()
+    ops = []
+    for u in image_urls:
+        body = {"image_url": u, "is_carousel_item": "true", "access_token": token}
+        ops.append(graph_batch.op("POST", f"{ig_user_id}/media", body=_append_appsecret_proof(body, token)))
+    with tracing.span("create_container", children=len(ops)):
+        res = graph_batch.batch(GRAPH, ops, token)
+        children = [(graph_batch.raise_for_item(r) or {}).get("id") for r in res]
+        data = {"media_type": "CAROUSEL", "children": ",".join(children), "caption": caption, "access_token": token}
+        j = _post_with_retry(f"{GRAPH}/{ig_user_id}/media", _append_appsecret_proof(data, token), account=ig_user_id)
+    return j.get("id")
+
+
+def upload_carousel_via_urls(image_urls: List[str], caption: str) -> str:
+    """Post several images as one carousel: one batch for the children, one container, one publish."""
+    return publish_container(create_carousel_container(image_urls, caption))
+
+
+def upload_image_via_url(image_url: str, caption: str) -> str:
+    if TEST_MODE:
+        log.info("[TEST_MODE] Skipping upload. Caption preview:\n%s", caption)
+        return "TEST_POST_ID"
+    creation_id = create_media_container(image_url, caption)
+    return publish_container(creation_id)
+
+
 def edit_caption(media_id: str, new_caption: str) -> bool:
     if TEST_MODE:
         log.info("[TEST_MODE] Skipping caption edit. media_id=%s\nNew caption:\n%s", media_id, new_caption)
         return True
-    _ensure_creds()
-    token, _ = get_creds()
-    url = f"https://graph.facebook.com/v21.0/{media_id}"
-    _post_with_retry(url, _append_appsecret_proof({"caption": new_caption, "access_token": token}, token))
+    token, ig_user_id = _ensure_creds()
+    url = f"{GRAPH}/{media_id}"
+    _post_with_retry(url, _append_appsecret_proof({"caption": new_caption, "access_token": token}, token), account=ig_user_id)
     return True
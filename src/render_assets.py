@@ -0,0 +1,41 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Tuple
+
+# (path, mtime, size) -> digest, so an unchanged font file is hashed once per process
+_font_hashes: Dict[Tuple[str, float, int], str] = {}
+
+
+def font_file_hash(path: str) -> str:
+    """Short content digest of a font file; identifies it in sprite and subset caches."""
+    st = os.stat(path)
+    k = (path, st.st_mtime, st.st_size)
+    h = _font_hashes.get(k)
+    if h is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        h = sha.hexdigest()[:16]
+        _font_hashes[k] = h
+    return h
+
+
+def collect_subjects(paths) -> List[str]:
+    """Subject names the renderer draws, from alias JSON (targets) and timetable CSV files."""
+    subjects = set()
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        if p.endswith(".json"):
+            with open(p, "r", encoding="utf-8") as f:
+                aliases = json.load(f)
+            # Raw names never reach the renderer once aliased; only targets are drawn
+            subjects.update(v for v in aliases.values() if isinstance(v, str))
+        elif p.endswith(".csv"):
+            import csv
+
+            with open(p, "r", encoding="utf-8") as f:
+                subjects.update(r["subject"] for r in csv.DictReader(f) if r.get("subject"))
+    return sorted(s.strip() for s in subjects if s.strip())
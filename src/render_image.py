@@ -1,9 +1,39 @@
 from PIL import Image, ImageDraw, ImageFont
+import io
 import os
+import contextvars
+from contextlib import contextmanager
 from .config import get_logger
+from .font_subset import subset_for
+from .sprite_atlas import SpriteAtlas, release_shared_atlas, shared_atlas
+from .timetable_types import Timetable
 
 log = get_logger(__name__)
 
+# Layout overrides (env-style keys) for the current tenant, layered over os.environ
+_layout: contextvars.ContextVar[dict] = contextvars.ContextVar("render_layout", default={})
+
+
+def _getenv(key, default=None):
+    v = _layout.get().get(key)
+    return v if v is not None else os.getenv(key, default)
+
+
+@contextmanager
+def layout(overrides):
+    """Render with these env-style layout keys (DATE_*, SUBJECT_*, FONT_*, TEMPLATE_*, ...) overridden."""
+    merged = {**_layout.get(), **{k: str(v) for k, v in (overrides or {}).items()}}
+    token = _layout.set(merged)
+    try:
+        yield
+    finally:
+        _layout.reset(token)
+
+
+def layout_key() -> str:
+    """Stable description of the active overrides, for caching rendered output."""
+    return ";".join(f"{k}={v}" for k, v in sorted(_layout.get().items()))
+
 
 def _try_truetype(path, size):
     try:
@@ -14,45 +44,56 @@ def _try_truetype(path, size):
     return None
 
 
-def _pick_font(size, kind="regular"):
-    """Pick a font with this priority:
+def _font_candidates(kind="regular"):
+    """Font files in priority order:
     1) Env override (FONT_BOLD_PATH / FONT_REGULAR_PATH)
     2) Wanted Sans in assets (WantedSans-*.ttf/.otf)
     3) NotoSansKR in assets
-    4) Default PIL font
     """
-    env_key = "FONT_BOLD_PATH" if kind == "bold" else "FONT_REGULAR_PATH"
-    env_path = os.getenv(env_key)
+    env_path = _getenv("FONT_BOLD_PATH" if kind == "bold" else "FONT_REGULAR_PATH")
     if env_path:
-        f = _try_truetype(env_path, size)
-        if f:
-            return f
-
-    wanted_candidates = [
+        yield env_path
+    yield from [
         "assets/WantedSans-Bold.ttf" if kind == "bold" else "assets/WantedSans-Regular.ttf",
         "assets/WantedSans-Bold.otf" if kind == "bold" else "assets/WantedSans-Regular.otf",
         # Some distributions use space in name
         "assets/Wanted Sans Bold.ttf" if kind == "bold" else "assets/Wanted Sans Regular.ttf",
         "assets/Wanted Sans Bold.otf" if kind == "bold" else "assets/Wanted Sans Regular.otf",
     ]
-    for p in wanted_candidates:
-        f = _try_truetype(p, size)
-        if f:
-            return f
-
-    noto_candidates = [
+    yield from [
         "assets/NotoSansKR-Bold.ttf" if kind == "bold" else "assets/NotoSansKR-Regular.ttf",
         "assets/NotoSansKR-Black.ttf" if kind == "bold" else "assets/NotoSansKR-Medium.ttf",
     ]
-    for p in noto_candidates:
+
+
+def _font_path(kind="regular"):
+    """The full font file `_pick_font` loads for `kind`, or None for the PIL default."""
+    for p in _font_candidates(kind):
+        if _try_truetype(p, 12):
+            return p
+    return None
+
+
+def _pick_font(size, kind="regular", subset=True):
+    """Load the first usable candidate font (default PIL font as a last resort).
+
+    With `subset`, a glyph subset built by ``font_subset`` is preferred over the
+    full file; returns (font, covered characters or None for a full font).
+    """
+    for p in _font_candidates(kind):
+        if subset:
+            found = subset_for(p)
+            if found:
+                f = _try_truetype(found[0], size)
+                if f:
+                    return f, found[1]
         f = _try_truetype(p, size)
         if f:
-            return f
+            return f, None
+    return ImageFont.load_default(), None
 
-    return ImageFont.load_default()
 
-
-def _draw_centered_text(draw: ImageDraw.ImageDraw, box, text, font, fill="black"):
+def _draw_centered_text(draw: ImageDraw.ImageDraw, box, text, font, fill="black", painter=None, persist=True):
     # box: (x0, y0, x1, y1)
     x0, y0, x1, y1 = box
     # Handle multiline
@@ -61,7 +102,7 @@ def _draw_centered_text(draw: ImageDraw.ImageDraw, box, text, font, fill="black"
     line_widths = []
     total_h = 0
     for ln in lines:
-        bbox = draw.textbbox((0, 0), ln, font=font)
+        bbox = painter.bbox(ln, font, persist=persist) if painter else draw.textbbox((0, 0), ln, font=font)
         w = bbox[2] - bbox[0]
         h = bbox[3] - bbox[1]
         line_widths.append(w)
@@ -74,24 +115,198 @@ def _draw_centered_text(draw: ImageDraw.ImageDraw, box, text, font, fill="black"
         w = line_widths[i]
         h = line_heights[i]
         cx = (x0 + x1) / 2 - w / 2
-        draw.text((cx, cy), ln, fill=fill, font=font)
+        if painter:
+            painter.text((cx, cy), ln, font, fill=fill, persist=persist)
+        else:
+            draw.text((cx, cy), ln, fill=fill, font=font)
         cy += h + 6
 
 
+class _RenderContext:
+    """Shared render state: templates, fonts and the text sprite atlas.
+
+    Text is blitted from pre-rasterized alpha masks (see ``sprite_atlas``);
+    ``cache_text=False`` draws with ``ImageDraw.text`` directly instead. A
+    context reused across renders keeps templates and fonts loaded, so later
+    images only copy the template buffer and paste masks.
+    """
+
+    def __init__(self, cache_text=True, atlas=None):
+        self.cache_text = cache_text
+        self.atlas = atlas if atlas is not None else SpriteAtlas()
+        self._templates = {}
+        self._fonts = {}
+        # id(subset font) -> (covered characters, size, kind)
+        self._subsets = {}
+        self._covers = {}
+        self._fits = {}
+        self.subset_fallbacks = 0
+
+    @property
+    def tile_hits(self):
+        return self.atlas.hits
+
+    @property
+    def tile_misses(self):
+        return self.atlas.misses
+
+    def template(self, tpl_name):
+        try:
+            stamp = os.stat(tpl_name).st_mtime
+        except OSError:
+            stamp = None
+        cached = self._templates.get(tpl_name)
+        if cached is None or cached[0] != stamp:
+            try:
+                base = Image.open(tpl_name).convert("RGB")
+            except Exception:
+                # Fallback to plain white background
+                base = Image.new("RGB", (1080, 1350), "white")
+            cached = (stamp, base)
+            self._templates[tpl_name] = cached
+        return cached[1].copy()
+
+    def font(self, size, kind="regular", full=False):
+        # Env overrides are part of the key so a changed FONT_*_PATH takes effect
+        key = (size, kind, _getenv("FONT_BOLD_PATH" if kind == "bold" else "FONT_REGULAR_PATH"), full)
+        f = self._fonts.get(key)
+        if f is None:
+            f, chars = _pick_font(size, kind=kind, subset=not full)
+            self._fonts[key] = f
+            if chars is not None:
+                self._subsets[id(f)] = (chars, size, kind)
+        return f
+
+    def cover(self, text, font):
+        """`font`, or the full font at the same size when `text` has glyphs its subset lacks."""
+        sub = self._subsets.get(id(font))
+        if sub is None:
+            return font
+        key = (id(font), text)
+        hit = self._covers.get(key)
+        if hit is None:
+            chars, size, kind = sub
+            missing = {c for c in text if c not in chars and not c.isspace()}
+            hit = font
+            if missing:
+                self.subset_fallbacks += 1
+                log.info("Glyphs %s not in the font subset; drawing %r with the full font (rebuild: python -m src.font_subset)",
+                         "".join(sorted(missing)), text)
+                hit = self.font(size, kind, full=True)
+            self._covers[key] = hit
+        return hit
+
+    def measure(self, text, font, persist=True):
+        return self.atlas.measure(text, font, persist)
+
+    def fit(self, text, width, size, kind="regular", min_size=None):
+        """(text, size) that fits `width` px: `size` if it already does, else the largest
+        size down to `min_size`, else the longest prefix + "…" at `min_size`.
+
+        Both searches are binary; results are memoized per (text, width, font), so
+        each distinct subject is measured once per context.
+        """
+        min_size = min(size, min_size or size)
+        key = (text, width, size, min_size, kind, _getenv("FONT_BOLD_PATH" if kind == "bold" else "FONT_REGULAR_PATH"))
+        hit = self._fits.get(key)
+        if hit is None:
+            hit = self._fits[key] = self._fit(text, width, size, kind, min_size)
+        return hit
+
+    def _fit(self, text, width, size, kind, min_size):
+        def w(t, s):
+            x0, _, x1, _ = self.cover(t, self.font(s, kind)).getbbox(t)
+            return x1 - x0
+
+        if width <= 0 or w(text, size) <= width:
+            return text, size
+        # Largest size in [min_size, size) that fits
+        lo, hi = min_size, size - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if w(text, mid) <= width:
+                lo = mid
+            else:
+                hi = mid - 1
+        if w(text, lo) <= width:
+            log.debug("Subject %r shrunk to %dpx to fit %dpx", text, lo, width)
+            return text, lo
+        # Still too wide at the minimum: longest prefix that fits with an ellipsis
+        lo, hi = 0, len(text) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if w(text[:mid].rstrip() + "…", min_size) <= width:
+                lo = mid
+            else:
+                hi = mid - 1
+        log.debug("Subject %r ellipsized to %d chars to fit %dpx", text, lo, width)
+        return text[:lo].rstrip() + "…", min_size
+
+    def tile(self, text, font, frac=(0.0, 0.0), persist=True):
+        return self.atlas.tile(text, font, frac, persist)
+
+    def painter(self, img):
+        return _Painter(img, self)
+
+
+_shared_ctx = None
+
+
+def _shared_context():
+    """Process-wide context backed by the persistent sprite atlas."""
+    global _shared_ctx
+    if _shared_ctx is None:
+        _shared_ctx = _RenderContext(atlas=shared_atlas())
+    return _shared_ctx
+
+
+def release_shared_context():
+    """Drop the process-wide context (templates, fonts, in-memory tiles); the next render rebuilds it."""
+    global _shared_ctx
+    _shared_ctx = None
+    release_shared_atlas()
+
+
+class _Painter:
+    """Draws text onto one image, through the context's tile cache when enabled."""
+
+    def __init__(self, img, ctx):
+        self.img = img
+        self.ctx = ctx
+        self.draw = ImageDraw.Draw(img)
+
+    def bbox(self, text, font, xy=(0, 0), persist=True):
+        font = self.ctx.cover(text, font)
+        if not self.ctx.cache_text:
+            return self.draw.textbbox(xy, text, font=font)
+        x0, y0, x1, y1 = self.ctx.measure(text, font, persist)
+        return (x0 + xy[0], y0 + xy[1], x1 + xy[0], y1 + xy[1])
+
+    def text(self, xy, text, font, fill="black", persist=True):
+        """Draw `text`; ``persist=False`` keeps one-off text (dates) out of the on-disk atlas."""
+        font = self.ctx.cover(text, font)
+        if not self.ctx.cache_text:
+            self.draw.text(xy, text, fill=fill, font=font)
+            return
+        x, y = int(xy[0]), int(xy[1])
+        mask, (ox, oy), _ = self.ctx.tile(text, font, (xy[0] - x, xy[1] - y), persist)
+        self.img.paste(fill, (x - ox, y - oy), mask)
+
+
 def _build_rows(timetable):
     # Insert lunch after 4th period for visual layout
     rows = []
-    for i, row in enumerate(timetable, start=1):
-        rows.append({"label": f"{i}교시", "subject": (row.get("subject") or "-").strip()})
+    for i, row in enumerate(Timetable.from_rows(timetable), start=1):
+        rows.append({"label": f"{i}교시", "subject": row.subject or "-"})
         # Allow override: LUNCH_AFTER_PERIOD env (default 4)
-        lunch_after = int(os.getenv("LUNCH_AFTER_PERIOD", "4") or 4)
+        lunch_after = int(_getenv("LUNCH_AFTER_PERIOD", "4") or 4)
         if i == lunch_after:
             rows.append({"label": "점심\n시간", "subject": ""})
     return rows
 
 
 def _env_box(key: str, default):
-    s = os.getenv(key)
+    s = _getenv(key)
     if s:
         try:
             x0, y0, x1, y1 = map(int, s.split(","))
@@ -103,14 +318,14 @@ def _env_box(key: str, default):
 
 def _env_int(key: str, default: int) -> int:
     try:
-        v = os.getenv(key)
+        v = _getenv(key)
         return int(v) if v not in (None, "") else default
     except Exception:
         return default
 
 
 def _env_xy(key: str):
-    s = os.getenv(key)
+    s = _getenv(key)
     if s:
         try:
             x, y = map(int, s.split(","))
@@ -120,31 +335,22 @@ def _env_xy(key: str):
     return None
 
 
-def render_timetable_image(
-    date_str,
-    timetable,
-    out_path,
-    brand_color="#2A6CF0",
-    *,
-    school_name=None,
-    grade=None,
-    class_nm=None,
-):
+def _is7(timetable) -> bool:
     # Choose template by period count (>=7 -> 7time)
-    period_count = sum(1 for r in timetable if (r.get("subject") or "").strip())
-    tpl_name = "assets/7time.png" if period_count >= 7 else "assets/6time.png"
-    try:
-        img = Image.open(tpl_name).convert("RGB")
-    except Exception:
-        # Fallback to plain white background
-        img = Image.new("RGB", (1080, 1350), "white")
-    d = ImageDraw.Draw(img)
+    return sum(1 for r in timetable if (r.get("subject") or "").strip()) >= 7
+
 
-    # Fonts
-    title_font = _pick_font(64, kind="bold")
-    date_font = _pick_font(32, kind="bold")
-    label_font = _pick_font(60, kind="bold")
-    subj_font = _pick_font(48, kind="bold")
+def _render_header(date_str, is7, ctx):
+    """The template with the date drawn on it: (image, template name, date box).
+
+    This layer depends only on the date and the template, so a batch draws it
+    once per (date, template) and copies it for each timetable.
+    """
+    tpl_name = _getenv("TEMPLATE_7TIME" if is7 else "TEMPLATE_6TIME") or ("assets/7time.png" if is7 else "assets/6time.png")
+    img = ctx.template(tpl_name)
+    pt = ctx.painter(img)
+    d = pt.draw
+    date_font = ctx.font(32, kind="bold")
 
     # Header text: date placement
     # Options (env overrides):
@@ -157,59 +363,50 @@ def render_timetable_image(
     default_date_box = (640, 110, 1015, 210)
 
     # Resolve per-template envs
-    is7 = "7time" in tpl_name
     date_box = _env_box("DATE_BOX_7TIME" if is7 else "DATE_BOX_6TIME", default_date_box)
-    offset_y = int(os.getenv("DATE_BOX_OFFSET_Y_7TIME" if is7 else "DATE_BOX_OFFSET_Y_6TIME", os.getenv("DATE_BOX_OFFSET_Y", "0") or 0))
-    center_y_env = os.getenv("DATE_CENTER_Y_7TIME" if is7 else "DATE_CENTER_Y_6TIME", os.getenv("DATE_CENTER_Y"))
+    offset_y = int(_getenv("DATE_BOX_OFFSET_Y_7TIME" if is7 else "DATE_BOX_OFFSET_Y_6TIME", _getenv("DATE_BOX_OFFSET_Y", "0") or 0))
+    center_y_env = _getenv("DATE_CENTER_Y_7TIME" if is7 else "DATE_CENTER_Y_6TIME", _getenv("DATE_CENTER_Y"))
 
     # Anchor controls
-    anchor_xy_env = os.getenv("DATE_ANCHOR_XY_7TIME" if is7 else "DATE_ANCHOR_XY_6TIME", os.getenv("DATE_ANCHOR_XY"))
-    anchor_mode = os.getenv("DATE_ANCHOR_MODE_7TIME" if is7 else "DATE_ANCHOR_MODE_6TIME", os.getenv("DATE_ANCHOR_MODE", "topleft")).lower()
+    anchor_xy_env = _getenv("DATE_ANCHOR_XY_7TIME" if is7 else "DATE_ANCHOR_XY_6TIME", _getenv("DATE_ANCHOR_XY"))
+    anchor_mode = _getenv("DATE_ANCHOR_MODE_7TIME" if is7 else "DATE_ANCHOR_MODE_6TIME", _getenv("DATE_ANCHOR_MODE", "topleft")).lower()
 
+    anchor_xy = None
     if anchor_xy_env:
-        # Absolute-anchored drawing
         try:
             ax, ay = map(int, anchor_xy_env.split(","))
-            bbox = d.textbbox((0, 0), str(date_str), font=date_font)
-            tw = bbox[2] - bbox[0]
-            th = bbox[3] - bbox[1]
-            if anchor_mode in ("center", "center_center"):
-                px, py = ax - tw // 2, ay - th // 2
-            elif anchor_mode in ("center_top", "topcenter", "top_center"):
-                px, py = ax - tw // 2, ay
-            elif anchor_mode in ("left_center", "center_left"):
-                px, py = ax, ay - th // 2
-            else:  # topleft
-                px, py = ax, ay
-            # Optional horizontal align within width (when using top-based modes)
-            date_align = (os.getenv("DATE_ALIGN", "left") or "left").lower()
-            if date_align != "left":
-                align_w = _env_int("DATE_ALIGN_W_7TIME" if is7 else "DATE_ALIGN_W_6TIME", _env_int("DATE_ALIGN_W", 0))
-                align_x1 = _env_int("DATE_ALIGN_X1_7TIME" if is7 else "DATE_ALIGN_X1_6TIME", _env_int("DATE_ALIGN_X1", 0))
-                width = align_w if align_w > 0 else (align_x1 - ax if align_x1 > 0 else None)
-                if width and width > 0:
-                    if date_align == "center":
-                        px = ax + (width - tw) // 2
-                    elif date_align == "right":
-                        px = ax + (width - tw)
-            d.text((px, py), str(date_str), fill="black", font=date_font)
-            # Optional debug marker
-            if (os.getenv("RENDER_DEBUG_BOXES", "false").lower() == "true"):
-                d.rectangle((px, py, px + tw, py + th), outline="#ff00ff", width=2)
-        except Exception:
-            # Fallback to box-based centering if parsing fails
-            x0, y0, x1, y1 = date_box
-            if center_y_env not in (None, ""):
-                try:
-                    cy = int(center_y_env)
-                    half = (y1 - y0) // 2
-                    y0, y1 = cy - half, cy + half
-                except Exception:
-                    pass
-            if offset_y:
-                y0 += offset_y
-                y1 += offset_y
-            _draw_centered_text(d, (x0, y0, x1, y1), str(date_str), date_font, fill="black")
+            anchor_xy = (ax, ay)
+        except ValueError:
+            log.warning("Ignoring malformed DATE_ANCHOR_XY %r; centering the date in its box", anchor_xy_env)
+
+    if anchor_xy:
+        # Absolute-anchored drawing
+        bbox = pt.bbox(str(date_str), date_font, persist=False)
+        tw = bbox[2] - bbox[0]
+        th = bbox[3] - bbox[1]
+        if anchor_mode in ("center", "center_center"):
+            px, py = ax - tw // 2, ay - th // 2
+        elif anchor_mode in ("center_top", "topcenter", "top_center"):
+            px, py = ax - tw // 2, ay
+        elif anchor_mode in ("left_center", "center_left"):
+            px, py = ax, ay - th // 2
+        else:  # topleft
+            px, py = ax, ay
+        # Optional horizontal align within width (when using top-based modes)
+        date_align = (_getenv("DATE_ALIGN", "left") or "left").lower()
+        if date_align != "left":
+            align_w = _env_int("DATE_ALIGN_W_7TIME" if is7 else "DATE_ALIGN_W_6TIME", _env_int("DATE_ALIGN_W", 0))
+            align_x1 = _env_int("DATE_ALIGN_X1_7TIME" if is7 else "DATE_ALIGN_X1_6TIME", _env_int("DATE_ALIGN_X1", 0))
+            width = align_w if align_w > 0 else (align_x1 - ax if align_x1 > 0 else None)
+            if width and width > 0:
+                if date_align == "center":
+                    px = ax + (width - tw) // 2
+                elif date_align == "right":
+                    px = ax + (width - tw)
+        pt.text((px, py), str(date_str), date_font, fill="black", persist=False)
+        # Optional debug marker
+        if (_getenv("RENDER_DEBUG_BOXES", "false").lower() == "true"):
+            d.rectangle((px, py, px + tw, py + th), outline="#ff00ff", width=2)
     else:
         # Box-based centering path
         x0, y0, x1, y1 = date_box
@@ -224,30 +421,42 @@ def render_timetable_image(
             y0 += offset_y
             y1 += offset_y
         date_box = (x0, y0, x1, y1)
-        _draw_centered_text(d, date_box, str(date_str), date_font, fill="black")
+        _draw_centered_text(d, date_box, str(date_str), date_font, fill="black", painter=pt, persist=False)
+
+    return img, tpl_name, date_box
+
+
+def _render_subjects(img, timetable, is7, date_box, ctx):
+    """Draw the subject column of `timetable` onto `img` (a header from `_render_header`)."""
+    pt = ctx.painter(img)
+    d = pt.draw
+    subj_size = 48
+    # Long subjects shrink down to this size, then get ellipsized, to fit their slot
+    subj_min_size = _env_int("SUBJECT_FONT_MIN", 34)
 
     # Rows
     rows = _build_rows(timetable)
     # Truncate/Pad depending on template type
-    max_rows = 8 if "7time" in tpl_name else 7
+    max_rows = 8 if is7 else 7
     rows = rows[:max_rows]
 
     # Subject placement supports two modes:
     # 1) Anchor mode: absolute (x,y) per first period + uniform DY spacing; optional separate anchor/dy after lunch
     # 2) Box mode: legacy box-centered drawing using template-aligned boxes
-    is7 = "7time" in tpl_name
 
     # Anchor mode parameters (per-template override → common)
     subj_anchor = _env_xy("SUBJECT_ANCHOR_XY_7TIME" if is7 else "SUBJECT_ANCHOR_XY_6TIME") or _env_xy("SUBJECT_ANCHOR_XY")
     subj_anchor_after = _env_xy("SUBJECT_ANCHOR_AFTER_LUNCH_XY_7TIME" if is7 else "SUBJECT_ANCHOR_AFTER_LUNCH_XY") or _env_xy("SUBJECT_ANCHOR_AFTER_LUNCH_XY")
     subj_dy = _env_int("SUBJECT_ROW_DY_7TIME" if is7 else "SUBJECT_ROW_DY_6TIME", _env_int("SUBJECT_ROW_DY", 0))
     subj_dy_after = _env_int("SUBJECT_ROW_DY_AFTER_LUNCH_7TIME" if is7 else "SUBJECT_ROW_DY_AFTER_LUNCH_6TIME", _env_int("SUBJECT_ROW_DY_AFTER_LUNCH", subj_dy or 0))
-    subj_anchor_mode = (os.getenv("SUBJECT_ANCHOR_MODE_7TIME" if is7 else "SUBJECT_ANCHOR_MODE", os.getenv("SUBJECT_ANCHOR_MODE", "topleft")) or "topleft").lower()
-    subj_align = (os.getenv("SUBJECT_ALIGN_7TIME" if is7 else "SUBJECT_ALIGN_6TIME", os.getenv("SUBJECT_ALIGN", "left")) or "left").lower()
+    subj_anchor_mode = (_getenv("SUBJECT_ANCHOR_MODE_7TIME" if is7 else "SUBJECT_ANCHOR_MODE", _getenv("SUBJECT_ANCHOR_MODE", "topleft")) or "topleft").lower()
+    subj_align = (_getenv("SUBJECT_ALIGN_7TIME" if is7 else "SUBJECT_ALIGN_6TIME", _getenv("SUBJECT_ALIGN", "left")) or "left").lower()
     subj_align_w = _env_int("SUBJECT_ALIGN_W_7TIME" if is7 else "SUBJECT_ALIGN_W_6TIME", _env_int("SUBJECT_ALIGN_W", 0))
     subj_align_x1 = _env_int("SUBJECT_ALIGN_X1_7TIME" if is7 else "SUBJECT_ALIGN_X1_6TIME", _env_int("SUBJECT_ALIGN_X1", 0))
+    # Slot width subjects are fitted to (default: from the align width, else up to the image edge)
+    subj_fit_w = _env_int("SUBJECT_FIT_W_7TIME" if is7 else "SUBJECT_FIT_W_6TIME", _env_int("SUBJECT_FIT_W", 0))
 
-    lunch_after = int(os.getenv("LUNCH_AFTER_PERIOD", "4") or 4)
+    lunch_after = int(_getenv("LUNCH_AFTER_PERIOD", "4") or 4)
 
     if subj_anchor:
         # Anchor-based absolute placement
@@ -256,8 +465,6 @@ def render_timetable_image(
         for r in rows:
             label = r["label"]
             subj = r["subject"] or "수업 시간표"
-            if len(subj) > 18:
-                subj = subj[:17] + "…"
 
             if "점심" in label:
                 after_lunch_flag = True
@@ -278,8 +485,20 @@ def render_timetable_image(
             px = base_x
             py = base_y + dy_use * (period_idx - base_idx)
 
+            fit_w = subj_fit_w
+            if fit_w <= 0:
+                fit_w = subj_align_w if subj_align_w > 0 else (subj_align_x1 - px if subj_align_x1 > 0 else 0)
+            if fit_w <= 0:
+                margin = 40
+                if subj_anchor_mode in ("center", "center_center", "center_top", "topcenter", "top_center"):
+                    fit_w = 2 * (min(px, img.width - px) - margin)
+                else:
+                    fit_w = img.width - px - margin
+            subj, size = ctx.fit(subj, fit_w, subj_size, kind="bold", min_size=subj_min_size)
+            font = ctx.font(size, kind="bold")
+
             # Render at anchor
-            bbox = d.textbbox((0, 0), subj, font=subj_font)
+            bbox = pt.bbox(subj, font)
             tw = bbox[2] - bbox[0]
             th = bbox[3] - bbox[1]
             if subj_anchor_mode in ("center", "center_center"):
@@ -303,10 +522,10 @@ def render_timetable_image(
                     elif subj_align == "right":
                         tx = px + (width - tw)
 
-            d.text((tx, ty), subj, fill="black", font=subj_font)
+            pt.text((tx, ty), subj, font, fill="black")
 
-            if (os.getenv("RENDER_DEBUG_BOXES", "false").lower() == "true"):
-                bbox = d.textbbox((tx, ty), subj, font=subj_font)
+            if (_getenv("RENDER_DEBUG_BOXES", "false").lower() == "true"):
+                bbox = pt.bbox(subj, font, (tx, ty))
                 d.rectangle(bbox, outline="#0000ff", width=1)
     else:
         # Box-centered legacy placement
@@ -327,20 +546,147 @@ def render_timetable_image(
 
             label = r["label"]
             subj = r["subject"] or "수업 시간표"
-            if len(subj) > 18:
-                subj = subj[:17] + "…"
             if "점심" not in label:
-                _draw_centered_text(d, box_right, subj, subj_font, fill="black")
+                fit_w = subj_fit_w if subj_fit_w > 0 else right_x1 - right_x0
+                subj, size = ctx.fit(subj, fit_w, subj_size, kind="bold", min_size=subj_min_size)
+                _draw_centered_text(d, box_right, subj, ctx.font(size, kind="bold"), fill="black", painter=pt)
 
     # Optional debug rectangles for calibration
-    if (os.getenv("RENDER_DEBUG_BOXES", "false").lower() == "true"):
+    if (_getenv("RENDER_DEBUG_BOXES", "false").lower() == "true"):
         # draw date box outline
         d.rectangle(date_box, outline="#ff0000", width=2)
         # draw a sample subject box outline (only if legacy box coords exist)
         if all(k in locals() for k in ("right_x0", "right_x1", "y_base")):
             d.rectangle((right_x0, y_base - 55, right_x1, y_base + 55), outline="#00aa00", width=2)
 
+
+
+def _render(
+    date_str,
+    timetable,
+    brand_color="#2A6CF0",
+    *,
+    school_name=None,
+    grade=None,
+    class_nm=None,
+    ctx=None,
+):
+    """Compose the timetable image in memory and return (image, template name)."""
+    ctx = ctx or _shared_context()
+    is7 = _is7(timetable)
+    img, tpl_name, date_box = _render_header(date_str, is7, ctx)
+    _render_subjects(img, timetable, is7, date_box, ctx)
+    return img, tpl_name
+
+
+def encode_jpeg(img, quality=95) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def write_image(data, out_path) -> str:
+    """Optional disk sink for encoded image bytes."""
     os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-    img.save(out_path, quality=95)
-    log.info("Saved image: %s (template=%s)", out_path, tpl_name)
+    with open(out_path, "wb") as f:
+        f.write(data)
+    return out_path
+
+
+def render_timetable_bytes(
+    date_str,
+    timetable,
+    brand_color="#2A6CF0",
+    *,
+    school_name=None,
+    grade=None,
+    class_nm=None,
+    out_path=None,
+) -> bytes:
+    """Render the timetable and return the encoded JPEG bytes.
+
+    The image never touches the disk unless ``out_path`` is given.
+    """
+    ctx = _shared_context()
+    img, tpl_name = _render(
+        date_str,
+        timetable,
+        brand_color,
+        school_name=school_name,
+        grade=grade,
+        class_nm=class_nm,
+        ctx=ctx,
+    )
+    data = encode_jpeg(img)
+    ctx.atlas.maybe_flush()
+    if out_path:
+        write_image(data, out_path)
+        log.info("Saved image: %s (template=%s, %d bytes)", out_path, tpl_name, len(data))
+    else:
+        log.info("Rendered image in memory (template=%s, %d bytes)", tpl_name, len(data))
+    return data
+
+
+def render_timetable_batch(
+    jobs,
+    brand_color="#2A6CF0",
+    *,
+    school_name=None,
+    grade=None,
+    class_nm=None,
+    out_paths=None,
+    ctx=None,
+):
+    """Render many (date_str, timetable) jobs that share one template set.
+
+    Templates and fonts are loaded once. The header layer (template plus
+    date) is drawn once per distinct (date, template) and copied for each job,
+    which then only gets its subject tiles pasted from the sprite atlas.
+    Returns a list of encoded JPEG bytes in job order; ``out_paths``
+    optionally writes each to disk.
+    """
+    ctx = ctx or _shared_context()
+    results = []
+    headers = {}
+    for i, (date_str, timetable) in enumerate(jobs):
+        is7 = _is7(timetable)
+        header = headers.get((date_str, is7))
+        if header is None:
+            header = headers[(date_str, is7)] = _render_header(date_str, is7, ctx)
+        img, _, date_box = header
+        img = img.copy()
+        _render_subjects(img, timetable, is7, date_box, ctx)
+        data = encode_jpeg(img)
+        if out_paths and out_paths[i]:
+            write_image(data, out_paths[i])
+        results.append(data)
+    ctx.atlas.maybe_flush()
+    log.info(
+        "Rendered batch: %d images (text tiles: %d rasterized, %d reused)",
+        len(results),
+        ctx.tile_misses,
+        ctx.tile_hits,
+    )
+    return results
+
+
+def render_timetable_image(
+    date_str,
+    timetable,
+    out_path,
+    brand_color="#2A6CF0",
+    *,
+    school_name=None,
+    grade=None,
+    class_nm=None,
+):
+    render_timetable_bytes(
+        date_str,
+        timetable,
+        brand_color,
+        school_name=school_name,
+        grade=grade,
+        class_nm=class_nm,
+        out_path=out_path,
+    )
     return out_path
@@ -0,0 +1,90 @@
+import os
+import re
+import json
+import time
+from typing import Dict, Optional
+
+from .config import get_logger
+
+log = get_logger(__name__)
+
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", os.path.join(os.getenv("STATE_DIR", "state"), "journal"))
+# Journals of days that never finished are dropped after this
+_KEEP_SEC = 3 * 86400
+
+# Stages, in pipeline order. "publish" is written before media_publish is called
+# (intent) and "published" after it returns, so a crash in between is detectable.
+UPLOAD, CONTAINER, PUBLISH, PUBLISHED = "upload", "container", "publish", "published"
+
+
+class Journal:
+    """Write-ahead log of one (tenant, date) posting attempt.
+
+    Every completed paid step is appended as one JSON line and fsynced before
+    the pipeline moves on, with the artifacts a rerun needs to skip it: image
+    digest and public URL, container id, post id. The journal is removed once
+    the post is recorded in the state file.
+    """
+
+    def __init__(self, key: str, directory: Optional[str] = None):
+        self.key = key
+        directory = directory or JOURNAL_DIR
+        self.path = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", key) + ".jsonl")
+        self._stages: Dict[str, dict] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        for ln in lines:
+            try:
+                rec = json.loads(ln)
+            except ValueError:
+                # A torn last line from a crash mid-append; that step did not complete
+                log.warning("Ignoring incomplete journal line in %s", self.path)
+                continue
+            self._stages[rec["stage"]] = rec
+
+    def __bool__(self) -> bool:
+        return bool(self._stages)
+
+    def get(self, stage: str) -> Optional[dict]:
+        """The latest record for `stage`, if that step completed."""
+        return self._stages.get(stage)
+
+    def record(self, stage: str, **artifacts) -> dict:
+        rec = {"stage": stage, "ts": int(time.time()), **artifacts}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._stages[stage] = rec
+        return rec
+
+    def clear(self) -> None:
+        self._stages.clear()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def prune(directory: Optional[str] = None) -> None:
+    """Drop journals untouched for a few days (their dates are long past)."""
+    directory = directory or JOURNAL_DIR
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    cutoff = time.time() - _KEEP_SEC
+    for name in names:
+        p = os.path.join(directory, name)
+        try:
+            if name.endswith(".jsonl") and os.path.getmtime(p) < cutoff:
+                os.remove(p)
+        except OSError:
+            pass
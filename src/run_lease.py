@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from .config import get_logger
+from .file_lock import locked
+
+log = get_logger(__name__)
+
+LEASE_DIR = os.getenv("LEASE_DIR", os.path.join(os.getenv("STATE_DIR", "state"), "leases"))
+# A holder renews every TTL/3; a lease that is not renewed in time was left by a crashed run
+LEASE_TTL_SEC = float(os.getenv("LEASE_TTL_SEC", "300") or 300)
+# How long a late arrival waits for the run in flight before giving up
+LEASE_WAIT_SEC = float(os.getenv("LEASE_WAIT_SEC", "900") or 900)
+LEASE_POLL_SEC = 2.0
+# Finished leases are kept (their result is what late arrivals reuse) and pruned after this
+_KEEP_SEC = 3 * 86400
+
+_HOST = socket.gethostname()
+
+
+class Lease:
+    """Outcome of `hold`: run the job (`acquired`), reuse `result`, or skip (`busy`)."""
+
+    __slots__ = ("key", "job", "owner", "acquired", "reused", "busy", "result")
+
+    def __init__(self, key: str, job: str):
+        self.key = key
+        self.job = job
+        self.owner = f"{_HOST}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.acquired = False
+        self.reused = False
+        self.busy = False
+        # Set by the holder before release; handed to runs that waited on it
+        self.result: Optional[dict] = None
+
+
+def _path(key: str) -> str:
+    return os.path.join(LEASE_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", key) + ".json")
+
+
+def _lock_path() -> str:
+    return os.path.join(LEASE_DIR, ".lock")
+
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            v = json.load(f)
+        return v if isinstance(v, dict) else None
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write(path: str, entry: dict) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _owner_alive(owner: str) -> bool:
+    """False only when the owner is provably gone (a dead pid on this host)."""
+    host, _, rest = owner.partition(":")
+    if host != _HOST or os.name != "posix":
+        return True
+    try:
+        os.kill(int(rest.split(":", 1)[0]), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+
+def _prune(now: float) -> None:
+    for name in os.listdir(LEASE_DIR):
+        if not name.endswith(".json"):
+            continue
+        p = os.path.join(LEASE_DIR, name)
+        cur = _read(p)
+        if cur and cur.get("status") != "running" and now - float(cur.get("finished", 0)) > _KEEP_SEC:
+            os.remove(p)
+
+
+def _try_take(lease: Lease, waited_for: Optional[str]):
+    """One locked attempt; returns ("taken" | "held" | "reuse", current entry)."""
+    path = _path(lease.key)
+    with locked(_lock_path()):
+        now = time.time()
+        cur = _read(path)
+        if cur and cur.get("status") == "running":
+            live = _owner_alive(cur.get("owner", ""))
+            if live and float(cur.get("expires", 0)) > now:
+                return "held", cur
+            log.warning(
+                "Reclaiming stale lease %s from %s (%s)",
+                lease.key, cur.get("owner"), "expired" if live else "owner exited",
+            )
+        elif (
+            cur and waited_for and cur.get("owner") == waited_for
+            and cur.get("status") == "done" and cur.get("job") == lease.job
+        ):
+            return "reuse", cur
+        _write(path, {"owner": lease.owner, "job": lease.job, "status": "running",
+                      "acquired": now, "expires": now + LEASE_TTL_SEC})
+        _prune(now)
+        return "taken", cur
+
+
+def _renew(lease: Lease, stop: threading.Event) -> None:
+    while not stop.wait(LEASE_TTL_SEC / 3):
+        path = _path(lease.key)
+        with locked(_lock_path()):
+            cur = _read(path)
+            if not cur or cur.get("owner") != lease.owner:
+                log.warning("Lease %s was taken over by %s", lease.key, cur and cur.get("owner"))
+                return
+            cur["expires"] = time.time() + LEASE_TTL_SEC
+            _write(path, cur)
+
+
+def _release(lease: Lease, ok: bool) -> None:
+    path = _path(lease.key)
+    with locked(_lock_path()):
+        cur = _read(path)
+        if not cur or cur.get("owner") != lease.owner:
+            return
+        cur.update(status="done" if ok else "failed", finished=time.time(), result=lease.result if ok else None)
+        cur.pop("expires", None)
+        _write(path, cur)
+
+
+@contextmanager
+def hold(key: str, job: str, wait: Optional[float] = None):
+    """Coordinate runs of `job` for one (tenant, date) `key` across processes and threads.
+
+    The first run takes the lease and does the work. A run that finds the lease
+    held waits for it: when the holder finishes the same job successfully, the
+    waiter reuses its `result` (`lease.reused`); when the holder fails or runs a
+    different job, the waiter takes over. After `wait` seconds (LEASE_WAIT_SEC)
+    the waiter gives up (`lease.busy`). Leases of crashed runs — owner pid gone,
+    or not renewed within LEASE_TTL_SEC — are reclaimed.
+    """
+    os.makedirs(LEASE_DIR, exist_ok=True)
+    lease = Lease(key, job)
+    wait = LEASE_WAIT_SEC if wait is None else wait
+    state, cur = _try_take(lease, None)
+    if state == "held":
+        holder = cur.get("owner")
+        log.info("%s for %s is already running (%s); waiting up to %.0fs", job, key, holder, wait)
+        deadline = time.monotonic() + wait
+        while state == "held" and time.monotonic() < deadline:
+            time.sleep(min(LEASE_POLL_SEC, max(0.0, deadline - time.monotonic())))
+            state, cur = _try_take(lease, holder)
+    if state == "reuse":
+        lease.reused = True
+        lease.result = cur.get("result") or {}
+        yield lease
+        return
+    if state == "held":
+        lease.busy = True
+        yield lease
+        return
+
+    lease.acquired = True
+    stop = threading.Event()
+    renewer = threading.Thread(target=_renew, args=(lease, stop), name=f"lease-{key}", daemon=True)
+    renewer.start()
+    ok = False
+    try:
+        yield lease
+        ok = True
+    finally:
+        stop.set()
+        renewer.join()
+        _release(lease, ok)
@@ -0,0 +1,269 @@
+import os
+import json
+import hashlib
+import argparse
+import multiprocessing.util
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import PIL
+from PIL import Image, ImageDraw, features
+
+from .config import get_logger
+from .file_lock import locked
+from .render_assets import collect_subjects, font_file_hash
+
+log = get_logger(__name__)
+
+SPRITE_CACHE_DIR = os.getenv("SPRITE_CACHE_DIR", "cache/sprites")
+# New tiles/measures held in memory before the atlas is written out (it is also written at exit)
+SPRITE_FLUSH_THRESHOLD = int(os.getenv("SPRITE_FLUSH_THRESHOLD", "64") or 64)
+SHEET_WIDTH = 2048
+# One-off text (dates) is kept in memory only, for this many recent runs
+_TRANSIENT_MAX = 32
+
+_raster_version: Optional[str] = None
+
+
+def _rasterizer() -> str:
+    """Short digest of what rasterizes the glyphs: Pillow, FreeType and raqm versions."""
+    global _raster_version
+    if _raster_version is None:
+        v = f"{PIL.__version__}/{features.version('freetype2')}/{features.version('raqm')}"
+        _raster_version = hashlib.sha256(v.encode("utf-8")).hexdigest()[:8]
+    return _raster_version
+
+
+def font_key(font) -> Optional[str]:
+    """Stable on-disk key for a FreeType font: file hash, size, layout engine and rasterizer
+    versions (a Pillow/FreeType upgrade can move pixels). None for bitmap/default fonts."""
+    path = getattr(font, "path", None)
+    size = getattr(font, "size", None)
+    if not isinstance(path, str) or not size or not os.path.exists(path):
+        return None
+    try:
+        return f"{font_file_hash(path)}-{size}-{getattr(font, 'layout_engine', 0)}-{_rasterizer()}"
+    except OSError:
+        return None
+
+
+def _tile_key(text: str, frac) -> str:
+    return f"{frac[0]:.4f},{frac[1]:.4f}|{text}"
+
+
+class _Sheet:
+    """All tiles and measurements for one font key, persisted as sheet.png + index.json."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.tiles: Dict[str, tuple] = {}
+        self.measures: Dict[str, list] = {}
+        # Tiles/measures added since the last save
+        self.dirty = 0
+        if path:
+            self._load()
+
+    def _load(self):
+        index_path = os.path.join(self.path, "index.json")
+        sheet_path = os.path.join(self.path, "sheet.png")
+        if not (os.path.exists(index_path) and os.path.exists(sheet_path)):
+            return
+        try:
+            with locked(os.path.join(self.path, ".lock")):
+                with open(index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                with Image.open(sheet_path) as im:
+                    sheet = im.convert("L")
+            for k, (x, y, w, h, ox, oy, bbox) in index.get("tiles", {}).items():
+                self.tiles[k] = (sheet.crop((x, y, x + w, y + h)), (ox, oy), tuple(bbox))
+            self.measures = {k: tuple(v) for k, v in index.get("measures", {}).items()}
+        except Exception as e:
+            log.warning("Sprite atlas %s unreadable, rebuilding: %s", self.path, e)
+            self.tiles, self.measures = {}, {}
+
+    def save(self):
+        if not (self.path and self.dirty):
+            return
+        # Shelf packing: tiles left to right, new shelf when the row is full
+        x = y = shelf_h = 0
+        placed = {}
+        for k, (mask, _, _) in self.tiles.items():
+            w, h = mask.size
+            if x + w > SHEET_WIDTH:
+                x, y, shelf_h = 0, y + shelf_h, 0
+            placed[k] = (x, y)
+            x += w
+            shelf_h = max(shelf_h, h)
+        sheet = Image.new("L", (SHEET_WIDTH, max(1, y + shelf_h)), 0)
+        index = {"tiles": {}, "measures": {k: list(v) for k, v in self.measures.items()}}
+        for k, (mask, (ox, oy), bbox) in self.tiles.items():
+            px, py = placed[k]
+            sheet.paste(mask, (px, py))
+            index["tiles"][k] = [px, py, mask.size[0], mask.size[1], ox, oy, list(bbox)]
+        os.makedirs(self.path, exist_ok=True)
+        # Write to temp files first so a concurrent reader never sees a torn atlas
+        tmp_sheet = os.path.join(self.path, f"sheet.png.{os.getpid()}.tmp")
+        tmp_index = os.path.join(self.path, f"index.json.{os.getpid()}.tmp")
+        sheet.save(tmp_sheet, format="PNG")
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        # Parallel renderers (generate_week --jobs) must not pair one process's sheet with another's index
+        with locked(os.path.join(self.path, ".lock")):
+            os.replace(tmp_sheet, os.path.join(self.path, "sheet.png"))
+            os.replace(tmp_index, os.path.join(self.path, "index.json"))
+        self.dirty = 0
+        log.info("Saved sprite atlas %s (%d tiles)", self.path, len(self.tiles))
+
+
+class SpriteAtlas:
+    """Cache of pre-rasterized text masks, keyed by font file hash and size.
+
+    Each distinct (text, font, sub-pixel offset) is rasterized once as an
+    alpha mask. With a ``cache_dir`` the masks persist across processes, so a
+    render only pastes memory copies no matter how complex the font is.
+    Text passed with ``persist=False`` (dates, which never come back) only
+    lives in a small in-memory cache and is never written to the sheets.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or None
+        self._sheets: Dict[object, _Sheet] = {}
+        self._transient: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._measure_draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+        self.hits = 0
+        self.misses = 0
+
+    def _sheet(self, font) -> _Sheet:
+        fk = font_key(font)
+        k = fk or id(font)
+        sh = self._sheets.get(k)
+        if sh is None:
+            path = os.path.join(self.cache_dir, fk) if (self.cache_dir and fk) else None
+            sh = _Sheet(path)
+            self._sheets[k] = sh
+        return sh
+
+    def _remember(self, key: tuple, value: tuple) -> tuple:
+        self._transient[key] = value
+        if len(self._transient) > _TRANSIENT_MAX:
+            self._transient.popitem(last=False)
+        return value
+
+    def measure(self, text: str, font, persist: bool = True):
+        sh = self._sheet(font)
+        bbox = sh.measures.get(text)
+        if bbox is None and not persist:
+            key = (id(sh), "m", text)
+            bbox = self._transient.get(key)
+            if bbox is None:
+                bbox = self._remember(key, tuple(self._measure_draw.textbbox((0, 0), text, font=font)))
+            return bbox
+        if bbox is None:
+            bbox = tuple(self._measure_draw.textbbox((0, 0), text, font=font))
+            sh.measures[text] = bbox
+            sh.dirty += 1
+        return bbox
+
+    def tile(self, text: str, font, frac=(0.0, 0.0), persist: bool = True):
+        """Return (mask, origin, bbox) for text rasterized at the given sub-pixel offset.
+
+        The mask is pasted at ``(int(x) - origin[0], int(y) - origin[1])`` and is
+        pixel-identical to ``ImageDraw.text`` at the same coordinates.
+        """
+        sh = self._sheet(font)
+        key = _tile_key(text, frac)
+        hit = sh.tiles.get(key) or (None if persist else self._transient.get((id(sh), "t", key)))
+        if hit is not None:
+            self.hits += 1
+            return hit
+        self.misses += 1
+        bbox = self.measure(text, font, persist)
+        ox, oy = -min(0, bbox[0]), -min(0, bbox[1])
+        mask = Image.new("L", (ox + max(1, bbox[2]) + 1, oy + max(1, bbox[3]) + 1), 0)
+        ImageDraw.Draw(mask).text((ox + frac[0], oy + frac[1]), text, fill=255, font=font)
+        hit = (mask, (ox, oy), bbox)
+        if not persist:
+            return self._remember((id(sh), "t", key), hit)
+        sh.tiles[key] = hit
+        sh.dirty += 1
+        return hit
+
+    def dirty(self) -> int:
+        return sum(sh.dirty for sh in self._sheets.values() if sh.path)
+
+    def maybe_flush(self) -> None:
+        """Write the sheets out once enough new tiles have piled up (see SPRITE_FLUSH_THRESHOLD)."""
+        if self.dirty() >= SPRITE_FLUSH_THRESHOLD:
+            self.flush()
+
+    def flush(self) -> None:
+        for sh in self._sheets.values():
+            try:
+                sh.save()
+            except Exception as e:
+                log.warning("Failed to save sprite atlas %s: %s", sh.path, e)
+
+
+_shared: Optional[SpriteAtlas] = None
+_finalizer_pid: Optional[int] = None
+
+
+def shared_atlas() -> SpriteAtlas:
+    """Process-wide atlas backed by SPRITE_CACHE_DIR (empty disables persistence)."""
+    global _shared, _finalizer_pid
+    if _shared is None:
+        _shared = SpriteAtlas(SPRITE_CACHE_DIR)
+    if _finalizer_pid != os.getpid():
+        # Runs at interpreter exit and when a multiprocessing worker exits (which skips atexit)
+        multiprocessing.util.Finalize(None, flush_shared_atlas, exitpriority=10)
+        _finalizer_pid = os.getpid()
+    return _shared
+
+
+def flush_shared_atlas() -> None:
+    """Write out the process-wide atlas's new tiles, if any."""
+    if _shared is not None:
+        _shared.flush()
+
+
+def release_shared_atlas() -> None:
+    """Persist and drop the process-wide atlas; tiles reload from SPRITE_CACHE_DIR on next use."""
+    global _shared
+    flush_shared_atlas()
+    _shared = None
+
+
+def build(subjects, cache_dir: str = SPRITE_CACHE_DIR) -> int:
+    """Pre-rasterize subjects by rendering them through the real layout, then persist."""
+    from .render_image import _RenderContext, render_timetable_batch
+
+    atlas = SpriteAtlas(cache_dir)
+    ctx = _RenderContext(atlas=atlas)
+    jobs = []
+    # Fill both templates so every layout slot (and sub-pixel offset) is covered
+    for periods in (6, 7):
+        for s in subjects:
+            tt = [{"period": i, "subject": s, "room": ""} for i in range(1, periods + 1)]
+            jobs.append(("", tt))
+    render_timetable_batch(jobs, ctx=ctx)
+    atlas.flush()
+    return atlas.misses
+
+
+def main():
+    p = argparse.ArgumentParser(description="Build the subject sprite atlas cache")
+    p.add_argument("--cache-dir", default=SPRITE_CACHE_DIR or "cache/sprites")
+    p.add_argument(
+        "sources",
+        nargs="*",
+        default=["data/subject_aliases.json", "data/sample_timetable.csv"],
+        help="Alias JSON / timetable CSV files to collect subject names from",
+    )
+    args = p.parse_args()
+    subjects = collect_subjects(args.sources)
+    n = build(subjects, args.cache_dir)
+    print(f"Sprite atlas: {len(subjects)} subjects, {n} masks rasterized -> {args.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import os
+import re
+import json
+import threading
+import contextvars
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import get_logger
+
+log = get_logger(__name__)
+
+# Optional; without the file the daemon serves the single tenant described by the env vars
+TENANTS_PATH = os.getenv("TENANTS_PATH", "tenants.json")
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+# Keys a tenant entry may set on top of the env defaults
+_CFG_KEYS = ("school_name", "school_level", "grade", "class_nm", "ay", "sem", "brand")
+
+_current: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("tenant", default=None)
+_shared: contextvars.ContextVar[Optional["SharedWork"]] = contextvars.ContextVar("shared_work", default=None)
+
+
+def _expand(entry: dict, defaults: dict) -> List[dict]:
+    name = str(entry.get("name") or "")
+    if not _NAME_RE.match(name):
+        raise ValueError(f"Tenant name must match {_NAME_RE.pattern}: {name!r}")
+    base = dict(defaults)
+    base.update({k: entry[k] for k in _CFG_KEYS if k in entry})
+    base.update(
+        name=name,
+        ig_business_id=str(entry.get("ig_business_id") or ""),
+        ig_access_token_env=str(entry.get("ig_access_token_env") or ""),
+        page_id=str(entry.get("page_id") or ""),
+        layout=dict(entry.get("layout") or {}),
+    )
+    classes = entry.get("classes")
+    if not classes:
+        return [base]
+    out = []
+    for c in classes:
+        # "classes": [11, 12] (tenant grade) or [{"grade": 2, "class_nm": 3}, ...]
+        c = c if isinstance(c, dict) else {"class_nm": c}
+        t = dict(base, grade=c.get("grade", base["grade"]), class_nm=c["class_nm"])
+        t["name"] = f"{name}-{t['grade']}-{t['class_nm']}"
+        out.append(t)
+    return out
+
+
+def load_tenants(defaults: dict, path: Optional[str] = None) -> List[dict]:
+    """Tenant configs from the tenants file, each filled in from `defaults` (the env config).
+
+    The file is a JSON list of entries:
+      {"name": "sunrin", "school_name": "...", "grade": 3, "classes": [11, 12],
+       "ig_business_id": "...", "ig_access_token_env": "IG_TOKEN_SUNRIN",
+       "layout": {"DATE_BOX_6TIME": "640,110,1015,210"}}
+    Instead of "ig_business_id", an entry may give the Facebook "page_id" its
+    page token belongs to (see `resolve_accounts`).
+    Without a file there is one unnamed tenant, which keeps the original state keys.
+    """
+    path = TENANTS_PATH if path is None else path
+    if not path or not os.path.exists(path):
+        return [dict(defaults, name="", ig_business_id="", ig_access_token_env="", page_id="", layout={})]
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    tenants = [t for e in entries for t in _expand(e, defaults)]
+    names = [t["name"] for t in tenants]
+    dupes = sorted({n for n in names if names.count(n) > 1})
+    if dupes:
+        raise ValueError(f"Duplicate tenant names in {path}: {', '.join(dupes)}")
+    return tenants
+
+
+def resolve_accounts(tenants: List[dict]) -> None:
+    """Fill in the IG account of tenants configured by page_id, in one Graph batch for all of them.
+
+    A tenant whose lookup fails keeps an empty ig_business_id; `active`
+    then refuses to run it rather than posting with the env credentials.
+    """
+    from .graph_throttle import GraphRateLimited
+    from .token_manager import get_creds_many
+
+    pending = [t for t in tenants if t.get("page_id") and t.get("ig_access_token_env") and not t.get("ig_business_id")]
+    if not pending:
+        return
+    accounts = [{"page_token": (os.getenv(t["ig_access_token_env"]) or "").strip(), "page_id": t["page_id"]} for t in pending]
+    try:
+        creds = get_creds_many(accounts)
+    except GraphRateLimited:
+        raise
+    except Exception as e:
+        # One bad account fails the batch result; look the rest up on their own
+        log.warning("IG account lookup for %d tenants failed (%s); retrying one by one", len(pending), e)
+        creds = []
+        for t, acc in zip(pending, accounts):
+            try:
+                creds.extend(get_creds_many([acc]))
+            except GraphRateLimited:
+                raise
+            except Exception as e:
+                log.warning("IG account lookup for tenant %s (page %s) failed: %s", t["name"], t["page_id"], e)
+                creds.append(("", ""))
+    for t, (_, ig_user_id) in zip(pending, creds):
+        t["ig_business_id"] = ig_user_id
+
+
+def current() -> Optional[dict]:
+    return _current.get()
+
+
+def state_key(ymd: str) -> str:
+    """Key for posted/staged state: the date, prefixed with the tenant name when there is one."""
+    t = _current.get()
+    return f"{t['name']}:{ymd}" if t and t["name"] else ymd
+
+
+@contextmanager
+def active(tenant: dict):
+    """Run the block as `tenant`: its config, IG account and render layout."""
+    # Imported here: both pull in the Graph/Pillow stacks
+    from .render_image import layout
+    from .token_manager import using_creds
+
+    token = _current.set(tenant)
+    try:
+        with ExitStack() as stack:
+            stack.enter_context(layout(tenant.get("layout")))
+            if tenant.get("page_id") and not tenant.get("ig_business_id"):
+                raise RuntimeError(f"Tenant {tenant['name']}: no IG account resolved for page {tenant['page_id']}")
+            if tenant.get("ig_business_id") and tenant.get("ig_access_token_env"):
+                env_key = tenant["ig_access_token_env"]
+                access = (os.getenv(env_key) or "").strip()
+                stack.enter_context(using_creds(access, tenant["ig_business_id"], source=f"{env_key} (tenant {tenant['name']})"))
+            yield tenant
+    finally:
+        _current.reset(token)
+
+
+class SharedWork:
+    """Memo for one job across tenants: the first caller of a key computes, the rest reuse.
+
+    Errors are shared too, so a failing NEIS query is not repeated per tenant.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results: Dict[tuple, Future] = {}
+        self.asked: Counter = Counter()
+        self.computed: Counter = Counter()
+
+    def get(self, kind: str, key: tuple, fn: Callable[[], Any]) -> Any:
+        k = (kind,) + tuple(key)
+        with self._lock:
+            self.asked[kind] += 1
+            fut = self._results.get(k)
+            owner = fut is None
+            if owner:
+                fut = self._results[k] = Future()
+                self.computed[kind] += 1
+        if owner:
+            try:
+                fut.set_result(fn())
+            except BaseException as e:
+                fut.set_exception(e)
+        return fut.result()
+
+    def saved(self) -> Dict[str, int]:
+        return {k: self.asked[k] - self.computed[k] for k in sorted(self.asked)}
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{k} {self.computed[k]}/{self.asked[k]} (saved {self.asked[k] - self.computed[k]})" for k in sorted(self.asked)
+        ) or "nothing shared"
+
+
+@contextmanager
+def sharing():
+    """Share `shared()` results inside the block (nested blocks reuse the outer memo)."""
+    outer = _shared.get()
+    if outer is not None:
+        yield outer
+        return
+    work = SharedWork()
+    token = _shared.set(work)
+    try:
+        yield work
+    finally:
+        _shared.reset(token)
+
+
+def shared(kind: str, key: tuple, fn: Callable[[], Any]) -> Any:
+    """fn(), computed once per key within the active `sharing()` block; a plain call outside one."""
+    work = _shared.get()
+    return fn() if work is None else work.get(kind, key, fn)
@@ -0,0 +1,392 @@
+import os
+import csv
+import mmap
+import time
+import argparse
+import threading
+from bisect import bisect_left, bisect_right
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import get_logger
+from .file_lock import locked
+
+log = get_logger(__name__)
+
+STATE_DIR = os.getenv("STATE_DIR", "state")
+# Empty disables archiving of fetched timetables
+ARCHIVE_DIR = os.getenv("TIMETABLE_ARCHIVE_DIR", os.path.join(STATE_DIR, "archive"))
+
+# Fixed-width integer columns, one file each, native byte order (little-endian on
+# every host we deploy to). Row i of every column belongs to the same period.
+COLUMNS: Dict[str, str] = {
+    "date": "I",  # YYYYMMDD
+    "school": "H",  # id into schools.txt ("ATPT_SD")
+    "grade": "B",
+    "class": "H",  # id into classes.txt (NEIS class names are not always numeric)
+    "period": "B",  # 0 marks a fetched day without any periods
+    "subject": "I",  # id into subjects.txt
+    "room": "I",  # id into rooms.txt
+    "fetched": "I",  # unix time of the fetch
+    "snap": "I",  # row index where the snapshot starts; groups one append's rows
+}
+DICTS = ("schools", "classes", "subjects", "rooms")
+
+Row = Tuple[int, str, str]  # (period, subject, room)
+Key = Tuple[int, int, int]  # (school id, grade, class id)
+
+
+class _Dict:
+    """Append-only string interning table: line N of <name>.txt has id N."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.values: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self._size = 0
+
+    def refresh(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._size)
+            chunk = f.read()
+        # Ignore a trailing partial line left by an interrupted writer
+        end = chunk.rfind(b"\n") + 1
+        for v in chunk[:end].decode("utf-8").split("\n")[:-1]:
+            self.ids.setdefault(v, len(self.values))
+            self.values.append(v)
+        self._size += end
+
+    def intern(self, value: str, pending: List[str]) -> int:
+        value = (value or "").replace("\n", " ").replace("\r", " ")
+        i = self.ids.get(value)
+        if i is None:
+            i = len(self.values)
+            self.values.append(value)
+            self.ids[value] = i
+            pending.append(value)
+        return i
+
+    def write(self, pending: List[str]):
+        if not pending:
+            return
+        data = "".join(v + "\n" for v in pending).encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(data)
+        self._size += len(data)
+
+
+class TimetableArchive:
+    """Append-only columnar store of every fetched timetable.
+
+    Reads memory-map the column files, so opening a year of whole-school data
+    costs a handful of mmap calls. An in-memory index, built once and then
+    extended as rows are added, lists each class's snapshots by date, so a
+    query bisects to its date range and only decodes the rows it returns. A
+    snapshot is appended only when a class/day differs from its last archived
+    version, so history doubles as a change log. Writers from several
+    processes are serialized by a file lock.
+    """
+
+    def __init__(self, path: str = ARCHIVE_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dicts = {name: _Dict(os.path.join(path, f"{name}.txt")) for name in DICTS}
+        self._maps: List[mmap.mmap] = []
+        self._cols: Optional[Dict[str, memoryview]] = None
+        self._files: Dict[str, object] = {}
+        # Rows on disk, and how many of them the current maps cover
+        self._rows = 0
+        self._mapped = 0
+        # Per class: snapshot dates (sorted) and their row spans, in the same order
+        self._index: Dict[Key, Tuple[List[int], List[Tuple[int, int]]]] = {}
+        # Last archived snapshot per (school, grade, class, date), for skipping unchanged appends
+        self._latest: Dict[Tuple[int, int, int, int], Tuple[Row, ...]] = {}
+        self._indexed = 0
+
+    # --- reading -------------------------------------------------------------
+
+    def _col_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.col")
+
+    def _release(self):
+        self._cols = None
+        self._mapped = 0
+        for m in self._maps:
+            try:
+                m.close()
+            except BufferError:
+                pass  # a caller still holds a view; the map is freed with it
+        self._maps = []
+
+    def _open(self):
+        """Map every column read-only; rows = shortest column (drops a torn tail)."""
+        self._release()
+        for d in self._dicts.values():
+            d.refresh()
+        cols, sizes = {}, []
+        for name, code in COLUMNS.items():
+            p = self._col_path(name)
+            size = os.path.getsize(p) if os.path.exists(p) else 0
+            if size == 0:
+                cols[name] = memoryview(b"").cast(code)
+            else:
+                with open(p, "rb") as f:
+                    m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps.append(m)
+                width = array(code).itemsize
+                cols[name] = memoryview(m)[: size - size % width].cast(code)
+            sizes.append(len(cols[name]))
+        self._rows = self._mapped = min(sizes) if sizes else 0
+        self._cols = cols
+        self._catch_up()
+
+    def _grown(self) -> bool:
+        """Another process appended rows ("snap" is the column each append writes last)."""
+        p = self._col_path("snap")
+        return os.path.exists(p) and os.path.getsize(p) // array(COLUMNS["snap"]).itemsize > self._rows
+
+    def _columns(self) -> Dict[str, memoryview]:
+        # Rows appended since the last mapping are mapped in on the next read, not per append
+        if self._cols is None or self._mapped < self._rows or self._grown():
+            self._open()
+        return self._cols
+
+    def _catch_up(self):
+        """Index the mapped rows not indexed yet (all of them on first open)."""
+        c = self._cols
+        subjects, rooms = self._dicts["subjects"].values, self._dicts["rooms"].values
+        i = self._indexed
+        while i < self._mapped:
+            start, snap = i, c["snap"][i]
+            rows = []
+            while i < self._mapped and c["snap"][i] == snap:
+                if c["period"][i]:
+                    rows.append((c["period"][i], subjects[c["subject"][i]], rooms[c["room"][i]]))
+                i += 1
+            self._add_snapshot((c["school"][start], c["grade"][start], c["class"][start]), c["date"][start], start, i, tuple(rows))
+        self._indexed = max(self._indexed, self._mapped)
+
+    def _add_snapshot(self, key: Key, date: int, start: int, end: int, rows: Tuple[Row, ...]):
+        dates, spans = self._index.setdefault(key, ([], []))
+        # After any earlier snapshot of the same date, so per-date order stays the append order
+        at = bisect_right(dates, date)
+        dates.insert(at, date)
+        spans.insert(at, (start, end))
+        self._latest[key + (date,)] = rows
+
+    def __len__(self) -> int:
+        self._columns()
+        return self._rows
+
+    def close(self):
+        self._release()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def _ids(self, atpt: str, sd: str, grade, class_nm) -> Optional[Key]:
+        self._columns()
+        school = self._dicts["schools"].ids.get(f"{atpt}_{sd}")
+        class_id = self._dicts["classes"].ids.get(str(class_nm).strip())
+        if school is None or class_id is None:
+            return None
+        return school, int(grade), class_id
+
+    def snapshots(
+        self, atpt: str, sd: str, grade, class_nm, start: Optional[str] = None, end: Optional[str] = None
+    ) -> List[dict]:
+        """Every archived version of a class's days, by date and oldest first within a date.
+
+        Each item is {"date": "YYYYMMDD", "fetched_at": unix, "timetable": [...]}
+        with timetable rows shaped like `get_timetable` output.
+        """
+        key = self._ids(atpt, sd, grade, class_nm)
+        if key is None or key not in self._index:
+            return []
+        c = self._columns()
+        subjects, rooms = self._dicts["subjects"].values, self._dicts["rooms"].values
+        dates, spans = self._index[key]
+        lo = bisect_left(dates, int(start)) if start else 0
+        hi = bisect_right(dates, int(end)) if end else len(dates)
+        out: List[dict] = []
+        for first, stop in spans[lo:hi]:
+            out.append({"date": str(c["date"][first]), "fetched_at": c["fetched"][first], "timetable": [
+                {"period": c["period"][i], "subject": subjects[c["subject"][i]], "room": rooms[c["room"][i]]}
+                for i in range(first, stop) if c["period"][i]
+            ]})
+        return out
+
+    def history(
+        self, atpt: str, sd: str, grade, class_nm, start: Optional[str] = None, end: Optional[str] = None
+    ) -> Dict[str, List[dict]]:
+        """Latest archived timetable per date for one class: {"YYYYMMDD": rows}."""
+        latest: Dict[str, List[dict]] = {}
+        for snap in self.snapshots(atpt, sd, grade, class_nm, start, end):
+            latest[snap["date"]] = snap["timetable"]
+        return latest
+
+    # --- writing -------------------------------------------------------------
+
+    def _sync(self):
+        """Bring the in-memory state up to the files, under the writer lock.
+
+        Only stats the columns when nothing changed; rows another process
+        appended are mapped and indexed, and a torn tail from an interrupted
+        append is cut back to the common row count.
+        """
+        sizes = {}
+        for name, code in COLUMNS.items():
+            p = self._col_path(name)
+            sizes[name] = (os.path.getsize(p) if os.path.exists(p) else 0, array(code).itemsize)
+        rows = min(size // width for size, width in sizes.values())
+        if rows != self._rows or self._cols is None:
+            self._open()
+            rows = self._rows
+        for name, (size, width) in sizes.items():
+            if size > rows * width:
+                log.warning("Timetable archive column %s has a torn tail; truncating", name)
+                with open(self._col_path(name), "r+b") as f:
+                    f.truncate(rows * width)
+
+    def _file(self, name: str):
+        f = self._files.get(name)
+        if f is None:
+            f = self._files[name] = open(self._col_path(name), "ab")
+        return f
+
+    def append(
+        self, atpt: str, sd: str, grade, class_nm, ymd: str, timetable: List[dict], fetched_at: Optional[int] = None
+    ) -> bool:
+        """Archive one fetched day for a class; returns False if it matches the last version."""
+        rows = tuple(
+            (int(r.get("period", 0)), (r.get("subject") or "").strip(), (r.get("room") or "").strip())
+            for r in timetable
+        )
+        fetched = int(fetched_at if fetched_at is not None else time.time())
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, locked(os.path.join(self.path, ".lock")):
+            self._sync()
+            pending = {name: [] for name in DICTS}
+            school = self._dicts["schools"].intern(f"{atpt}_{sd}", pending["schools"])
+            class_id = self._dicts["classes"].intern(str(class_nm).strip(), pending["classes"])
+            key, date = (school, int(grade), class_id), int(ymd)
+            if self._latest.get(key + (date,)) == rows:
+                return False
+            cols = {name: array(code) for name, code in COLUMNS.items()}
+            for period, subject, room in rows or ((0, "", ""),):
+                cols["date"].append(date)
+                cols["school"].append(school)
+                cols["grade"].append(key[1])
+                cols["class"].append(class_id)
+                cols["period"].append(period)
+                cols["subject"].append(self._dicts["subjects"].intern(subject, pending["subjects"]))
+                cols["room"].append(self._dicts["rooms"].intern(room, pending["rooms"]))
+                cols["fetched"].append(fetched)
+                cols["snap"].append(self._rows)
+            # Dictionaries first, so every id a column row references already exists
+            for name in DICTS:
+                self._dicts[name].write(pending[name])
+            for name, values in cols.items():
+                f = self._file(name)
+                values.tofile(f)
+                f.flush()
+            start, self._rows = self._rows, self._rows + len(cols["date"])
+            self._add_snapshot(key, date, start, self._rows, rows)
+            self._indexed = self._rows
+            return True
+
+    # --- CSV interop (data/sample_timetable.csv schema) -----------------------
+
+    def import_csv(self, csv_path: str, atpt: str, sd: str, grade, class_nm) -> int:
+        """Import a `date,period,subject,room` CSV for one class; returns days appended."""
+        days: Dict[str, List[dict]] = {}
+        with open(csv_path, "r", encoding="utf-8") as f:
+            for r in csv.DictReader(f):
+                ymd = (r.get("date") or "").replace("-", "").strip()
+                if not ymd:
+                    continue
+                days.setdefault(ymd, []).append(
+                    {"period": int(r.get("period") or 0), "subject": r.get("subject") or "", "room": r.get("room") or ""}
+                )
+        n = 0
+        for ymd, rows in sorted(days.items()):
+            rows.sort(key=lambda r: r["period"])
+            n += self.append(atpt, sd, grade, class_nm, ymd, rows)
+        return n
+
+    def export_csv(
+        self, csv_path: str, atpt: str, sd: str, grade, class_nm, start: Optional[str] = None, end: Optional[str] = None
+    ) -> int:
+        """Write a class's latest timetables as `date,period,subject,room`; returns rows written."""
+        n = 0
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["date", "period", "subject", "room"])
+            for ymd, rows in self.history(atpt, sd, grade, class_nm, start, end).items():
+                for r in rows:
+                    w.writerow([f"{ymd[:4]}-{ymd[4:6]}-{ymd[6:]}", r["period"], r["subject"], r["room"]])
+                    n += 1
+        return n
+
+
+_shared: Optional[TimetableArchive] = None
+
+
+def shared_archive() -> Optional[TimetableArchive]:
+    """Process-wide archive at TIMETABLE_ARCHIVE_DIR, or None when archiving is disabled."""
+    global _shared
+    if not ARCHIVE_DIR:
+        return None
+    if _shared is None:
+        _shared = TimetableArchive(ARCHIVE_DIR)
+    return _shared
+
+
+def release_shared_archive() -> None:
+    """Unmap the process-wide archive; it is reopened on next use."""
+    global _shared
+    if _shared is not None:
+        _shared.close()
+    _shared = None
+
+
+def main():
+    p = argparse.ArgumentParser(description="Query, import or export the columnar timetable archive")
+    p.add_argument("command", choices=["history", "import", "export", "stats"])
+    p.add_argument("--atpt", help="ATPT_OFCDC_SC_CODE (e.g. B10)")
+    p.add_argument("--sd", help="SD_SCHUL_CODE")
+    p.add_argument("--grade", type=int, default=int(os.getenv("GRADE", "3")))
+    p.add_argument("--class-nm", default=os.getenv("CLASS_NM", "11"))
+    p.add_argument("--start", help="From YYYYMMDD (inclusive)")
+    p.add_argument("--end", help="Until YYYYMMDD (inclusive)")
+    p.add_argument("--csv", help="CSV path for import/export (date,period,subject,room)")
+    p.add_argument("--dir", default=ARCHIVE_DIR, help="Archive directory (default: %(default)s)")
+    args = p.parse_args()
+
+    arch = TimetableArchive(args.dir)
+    t0 = time.perf_counter()
+    if args.command == "stats":
+        rows = len(arch)
+        print(f"{rows} rows, {len(arch._dicts['subjects'].values)} subjects, {len(arch._dicts['rooms'].values)} rooms "
+              f"(opened in {(time.perf_counter() - t0) * 1000:.1f} ms)")
+        return
+    if not (args.atpt and args.sd):
+        p.error("--atpt and --sd are required")
+    if args.command in ("import", "export") and not args.csv:
+        p.error("--csv is required for import/export")
+    if args.command == "import":
+        n = arch.import_csv(args.csv, args.atpt, args.sd, args.grade, args.class_nm)
+        print(f"Imported {n} day(s) from {args.csv}")
+    elif args.command == "export":
+        n = arch.export_csv(args.csv, args.atpt, args.sd, args.grade, args.class_nm, args.start, args.end)
+        print(f"Exported {n} row(s) to {args.csv}")
+    else:
+        for ymd, rows in arch.history(args.atpt, args.sd, args.grade, args.class_nm, args.start, args.end).items():
+            print(ymd, " · ".join(r["subject"] for r in rows) or "-")
+        print(f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
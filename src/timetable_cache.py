@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import datetime as dt
+import threading
+import contextvars
+from typing import Callable, Dict, List, Optional
+
+from .config import get_logger
+from .fetch_neis import find_school_codes, get_timetable_typed
+from . import tracing
+from .file_lock import locked
+from .timetable_types import Timetable, jsonable
+
+log = get_logger(__name__)
+
+STATE_DIR = os.getenv("STATE_DIR", "state")
+CACHE_DIR = os.getenv("TIMETABLE_CACHE_DIR", os.path.join(STATE_DIR, "timetable_cache"))
+SCHOOL_CODES_PATH = os.path.join(CACHE_DIR, "school_codes.json")
+# Cached timetables older than this are not served without a live fetch
+MAX_STALE_SEC = int(os.getenv("TIMETABLE_CACHE_MAX_STALE_SEC", str(7 * 86400)) or 0)
+
+_lock = threading.Lock()
+_pending: Dict[str, threading.Thread] = {}
+_changed: Dict[str, List[dict]] = {}
+_listeners: List[Callable[[], None]] = []
+
+
+def _key(school_level: str, atpt: str, sd: str, grade, class_nm, ymd: str, ay=None, sem=None) -> str:
+    # Everything the NEIS query is made of: the same class and day differ per endpoint, year and semester
+    key = f"{school_level}_{atpt}_{sd}_{grade}_{class_nm}_{ymd}"
+    if ay:
+        key += f"_AY{ay}"
+    if sem:
+        key += f"_SEM{sem}"
+    return key
+
+
+def _path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def load(key: str) -> Optional[dict]:
+    p = _path(key)
+    if not os.path.exists(p):
+        return None
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        log.warning("Timetable cache entry %s unreadable: %s", key, e)
+        return None
+
+
+def store(key: str, tt: List[dict]) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = _path(key) + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": int(time.time()), "timetable": tt}, f, ensure_ascii=False, default=jsonable)
+    os.replace(tmp, _path(key))
+
+
+def _load_school_codes() -> Dict[str, dict]:
+    if os.path.exists(SCHOOL_CODES_PATH):
+        try:
+            with open(SCHOOL_CODES_PATH, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            pass
+    return {}
+
+
+def find_school_codes_cached(school_name: str) -> Dict[str, str]:
+    """School codes practically never change; resolve once and reuse."""
+    hit = _load_school_codes().get(school_name)
+    if hit:
+        tracing.annotate(cache="hit")
+        return hit
+    sc = find_school_codes(school_name)
+    # Other processes (timers, tenants' one-off runs) may be adding their schools too:
+    # merge under the lock and replace the file whole
+    with locked(SCHOOL_CODES_PATH + ".lock"):
+        codes = _load_school_codes()
+        codes[school_name] = sc
+        tmp = f"{SCHOOL_CODES_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(codes, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, SCHOOL_CODES_PATH)
+    return sc
+
+
+def on_revalidated(fn: Callable[[], None]) -> None:
+    """Call `fn` (on the revalidation thread) whenever a background revalidation finishes."""
+    _listeners.append(fn)
+
+
+def _revalidate(key, served, args, kwargs):
+    try:
+        _refresh(key, served, args, kwargs)
+    finally:
+        for fn in _listeners:
+            try:
+                fn()
+            except Exception as e:
+                log.warning("Revalidation listener failed: %s", e)
+
+
+def _refresh(key, served, args, kwargs):
+    try:
+        live = get_timetable_typed(*args, **kwargs)
+    except Exception as e:
+        log.warning("Background revalidation failed for %s: %s", key, e)
+        return
+    store(key, live)
+    if live != served:
+        log.info("Timetable %s changed on revalidation", key)
+        with _lock:
+            _changed[key] = live
+    else:
+        log.debug("Timetable %s revalidated (unchanged)", key)
+
+
+def get_timetable_swr(
+    school_level: str,
+    ATPT: str,
+    SD_SCHUL_CODE: str,
+    yyyymmdd: str,
+    grade: int,
+    class_nm,
+    AY: Optional[str] = None,
+    SEM: Optional[str] = None,
+    *,
+    revalidate: bool = True,
+) -> Timetable:
+    """Stale-while-revalidate timetable lookup.
+
+    A cached copy (from the evening prefetch or an earlier run) is returned
+    immediately and a live fetch refreshes the cache in a background thread.
+    Without a usable cached copy the live fetch happens inline. Use
+    `wait_revalidation` to learn whether the served copy was out of date.
+    """
+    key = _key(school_level, ATPT, SD_SCHUL_CODE, grade, class_nm, yyyymmdd, AY, SEM)
+    args = (school_level, ATPT, SD_SCHUL_CODE, yyyymmdd, grade, class_nm)
+    kwargs = {"AY": AY, "SEM": SEM}
+    entry = load(key)
+    if entry and (not MAX_STALE_SEC or time.time() - entry.get("fetched_at", 0) < MAX_STALE_SEC):
+        with tracing.span("fetch", cache="hit", date=yyyymmdd, age_s=int(time.time() - entry.get("fetched_at", 0))):
+            served = Timetable.from_rows(entry["timetable"], date=yyyymmdd)
+        if revalidate:
+            with _lock:
+                if key not in _pending or not _pending[key].is_alive():
+                    # Copy the context so the live fetch keeps the caller's NEIS priority class
+                    ctx = contextvars.copy_context()
+                    t = threading.Thread(
+                        target=ctx.run, args=(_revalidate, key, served, args, kwargs), name=f"revalidate-{key}"
+                    )
+                    _pending[key] = t
+                    t.start()
+        return served
+
+    tt = get_timetable_typed(*args, **kwargs)
+    try:
+        store(key, tt)
+    except Exception as e:
+        log.warning("Failed to cache timetable %s: %s", key, e)
+    return tt
+
+
+def wait_revalidation(timeout: Optional[float] = None) -> Dict[str, List[dict]]:
+    """Wait for background revalidations; return {key: live timetable} for those that changed."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _lock:
+        threads = list(_pending.values())
+    for t in threads:
+        t.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+    with _lock:
+        changed = dict(_changed)
+        _changed.clear()
+        for k in [k for k, t in _pending.items() if not t.is_alive()]:
+            _pending.pop(k, None)
+    return changed
+
+
+def revalidating() -> int:
+    """Background revalidations still running (besides the calling thread's own)."""
+    me = threading.current_thread()
+    with _lock:
+        return sum(1 for t in _pending.values() if t.is_alive() and t is not me)
+
+
+def prefetch_dates(today: dt.date) -> List[dt.date]:
+    """Tomorrow through the next Friday on or after it (the rest of the school week)."""
+    start = today + dt.timedelta(days=1)
+    if start.weekday() >= 5:
+        start += dt.timedelta(days=7 - start.weekday())
+    end = start + dt.timedelta(days=(4 - start.weekday()) % 7)
+    return [start + dt.timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def prefetch(school_level, ATPT, SD_SCHUL_CODE, dates, grade, class_nm, AY=None, SEM=None) -> int:
+    """Fetch and cache timetables for the given dates; returns how many succeeded."""
+    ok = 0
+    for d in dates:
+        ymd = d.strftime("%Y%m%d")
+        try:
+            tt = get_timetable_typed(school_level, ATPT, SD_SCHUL_CODE, ymd, grade, class_nm, AY=AY, SEM=SEM)
+            store(_key(school_level, ATPT, SD_SCHUL_CODE, grade, class_nm, ymd, AY, SEM), tt)
+            ok += 1
+        except Exception as e:
+            log.warning("Prefetch failed for %s: %s", ymd, e)
+    log.info("Prefetched %d/%d timetables (%s..%s)", ok, len(dates), dates[0] if dates else "-", dates[-1] if dates else "-")
+    return ok
@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from .timetable_types import Period, Timetable
+
+# Change kinds, from most to least visible
+ADDED, REMOVED, SUBJECT, ROOM = "added", "removed", "subject", "room"
+
+
+class Change(NamedTuple):
+    kind: str
+    period: int
+    old: Optional[str] = None
+    new: Optional[str] = None
+    # True when the subject names differ only by normalization/alias spelling
+    cosmetic: bool = False
+
+    def describe(self) -> str:
+        if self.kind == ADDED:
+            return f"{self.period}교시 추가: {self.new}"
+        if self.kind == REMOVED:
+            return f"{self.period}교시 삭제: {self.old}"
+        label = "과목" if self.kind == SUBJECT else "교실"
+        return f"{self.period}교시 {label}: {self.old or '-'} → {self.new or '-'}"
+
+
+class TimetableDiff:
+    """Per-period differences between a posted timetable and a freshly fetched one."""
+
+    __slots__ = ("changes",)
+
+    def __init__(self, changes: List[Change]):
+        self.changes = changes
+
+    def __bool__(self) -> bool:
+        return bool(self.changes)
+
+    @property
+    def structural(self) -> bool:
+        """Periods were added or removed (the row layout changes)."""
+        return any(c.kind in (ADDED, REMOVED) for c in self.changes)
+
+    @property
+    def visible(self) -> List[Change]:
+        """Changes that show up in the image or caption.
+
+        Rooms are neither drawn nor captioned, and cosmetic subject changes
+        render the same text once normalized, so neither counts.
+        """
+        return [c for c in self.changes if c.kind in (ADDED, REMOVED) or (c.kind == SUBJECT and not c.cosmetic)]
+
+    @property
+    def affected_periods(self) -> List[int]:
+        return sorted({c.period for c in self.visible})
+
+    def summary(self) -> str:
+        return "; ".join(c.describe() for c in self.changes) or "no changes"
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [c._asdict() for c in self.changes]
+
+
+def _normalized(name: str) -> str:
+    # Imported lazily: fetch_neis pulls in the network/quota stack
+    from .fetch_neis import _normalize_subject
+
+    return _normalize_subject(name)
+
+
+def diff(old: Any, new: Any) -> TimetableDiff:
+    """Compare two timetables (Timetable or legacy list of dicts) period by period."""
+    before: Dict[int, Period] = {p.period: p for p in Timetable.from_rows(old)}
+    after: Dict[int, Period] = {p.period: p for p in Timetable.from_rows(new)}
+    changes: List[Change] = []
+    for n in sorted(before.keys() | after.keys()):
+        a, b = before.get(n), after.get(n)
+        if a is None:
+            changes.append(Change(ADDED, n, None, b.subject))
+        elif b is None:
+            changes.append(Change(REMOVED, n, a.subject, None))
+        else:
+            if a.subject != b.subject:
+                changes.append(Change(SUBJECT, n, a.subject, b.subject, _normalized(a.subject) == _normalized(b.subject)))
+            if a.room != b.room:
+                changes.append(Change(ROOM, n, a.room, b.room))
+    return TimetableDiff(changes)
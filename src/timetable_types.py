@@ -0,0 +1,181 @@
+import sys
+import struct
+import hashlib
+from typing import Any, Iterable, Iterator, List, Optional
+
+# Bumped if the binary digest layout ever changes; stored hashes carry it as a prefix
+DIGEST_VERSION = "v2"
+_FIELDS = ("period", "subject", "room")
+
+
+def _intern(s: Any) -> str:
+    return sys.intern(str(s or "").strip())
+
+
+class Period:
+    """One immutable timetable row; reads like the legacy {"period", "subject", "room"} dict."""
+
+    __slots__ = _FIELDS
+
+    def __init__(self, period: int, subject: str = "", room: str = ""):
+        object.__setattr__(self, "period", int(period or 0))
+        object.__setattr__(self, "subject", _intern(subject))
+        object.__setattr__(self, "room", _intern(room))
+
+    @classmethod
+    def from_row(cls, row: Any) -> "Period":
+        if isinstance(row, Period):
+            return row
+        return cls(row.get("period", 0), row.get("subject", ""), row.get("room", ""))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Period is immutable")
+
+    def __reduce__(self):
+        return Period, (self.period, self.subject, self.room)
+
+    # Mapping-style access for dict consumers
+    def __getitem__(self, key: str):
+        if key not in _FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in _FIELDS else default
+
+    def keys(self):
+        return _FIELDS
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in _FIELDS]
+
+    def __contains__(self, key) -> bool:
+        return key in _FIELDS
+
+    def to_dict(self) -> dict:
+        return {"period": self.period, "subject": self.subject, "room": self.room}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Period):
+            return (self.period, self.subject, self.room) == (other.period, other.subject, other.room)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.period, self.subject, self.room))
+
+    def __repr__(self) -> str:
+        return f"Period({self.period}, {self.subject!r}, {self.room!r})"
+
+
+def _pack(p: Period) -> bytes:
+    subj = p.subject.encode("utf-8")
+    room = p.room.encode("utf-8")
+    return struct.pack("<HH", p.period, len(subj)) + subj + struct.pack("<H", len(room)) + room
+
+
+class Timetable:
+    """Ordered Period rows for one date with an incrementally maintained digest.
+
+    Behaves as a read-only sequence (iteration, indexing, len, == against a list
+    of dicts), so code written for the legacy list of dicts keeps reading it;
+    `to_dicts()` gives that list back where it must be mutated or JSON-dumped.
+    Rows are only ever added with `append`, which folds them into a SHA-256 over
+    a length-prefixed binary encoding; `digest()` never re-serializes the rows.
+    """
+
+    __slots__ = ("date", "_rows", "_h", "_hex", "_raw")
+
+    def __init__(self, rows: Iterable[Any] = (), date: Optional[str] = None):
+        self.date = date
+        self._rows: List[Period] = []
+        self._h = hashlib.sha256(f"{DIGEST_VERSION}|{date or ''}|".encode("utf-8"))
+        self._hex: Optional[str] = None
+        # The rows as given, kept only once one differed from its stripped Period
+        self._raw: Optional[List[dict]] = None
+        for r in rows:
+            self.append(r)
+
+    @classmethod
+    def from_rows(cls, rows: Any, date: Optional[str] = None) -> "Timetable":
+        """Wrap legacy rows (list of dicts); Timetables for the same date are returned as-is."""
+        if isinstance(rows, Timetable) and (date is None or rows.date == date):
+            return rows
+        if isinstance(rows, Timetable):
+            rows = rows.legacy_rows()
+        return cls(rows or (), date=date)
+
+    def append(self, row: Any) -> None:
+        p = Period.from_row(row)
+        if not isinstance(row, Period):
+            given = {k: row.get(k, "" if k != "period" else 0) for k in _FIELDS}
+            if self._raw is None and given != p.to_dict():
+                self._raw = self.to_dicts()
+            if self._raw is not None:
+                self._raw.append(given)
+        elif self._raw is not None:
+            self._raw.append(p.to_dict())
+        self._rows.append(p)
+        self._h.update(_pack(p))
+        self._hex = None
+
+    def digest(self) -> str:
+        if self._hex is None:
+            self._hex = self._h.copy().hexdigest()
+        return self._hex
+
+    def to_dicts(self) -> List[dict]:
+        return [p.to_dict() for p in self._rows]
+
+    def legacy_rows(self) -> List[dict]:
+        """The rows exactly as they were added (unstripped), which legacy JSON hashes were taken over."""
+        return [dict(r) for r in self._raw] if self._raw is not None else self.to_dicts()
+
+    def __reduce__(self):
+        if self._raw is not None:
+            return Timetable, (self._raw, self.date)
+        return _rebuild, (self.date, [(p.period, p.subject, p.room) for p in self._rows])
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Period]:
+        return iter(self._rows)
+
+    def __getitem__(self, i):
+        return self._rows[i]
+
+    def __bool__(self) -> bool:
+        return bool(self._rows)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Timetable):
+            if self.date == other.date:
+                return self.digest() == other.digest()
+            return self._rows == other._rows
+        if isinstance(other, list):
+            return len(other) == len(self._rows) and all(p == o for p, o in zip(self._rows, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Timetable(date={self.date!r}, rows={self._rows!r})"
+
+
+def _rebuild(date, rows):
+    return Timetable((Period(*r) for r in rows), date=date)
+
+
+def jsonable(obj: Any):
+    """`json.dumps(default=...)` hook: serialize Timetable/Period in the legacy dict shape.
+
+    Timetables serialize as their unstripped rows, so `calc_hash` still matches
+    hashes stored before rows were stripped, and cached copies keep them too.
+    """
+    if isinstance(obj, Timetable):
+        return obj.legacy_rows()
+    if isinstance(obj, Period):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -1,15 +1,18 @@
 import os
 import json
 import time
-from typing import Tuple
+import contextvars
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
 
 import requests
 
 from .config import get_logger
+from . import graph_batch
 
 log = get_logger(__name__)
 
-GRAPH = "https://graph.facebook.com/v23.0"
+GRAPH = os.getenv("GRAPH_HOST", "https://graph.facebook.com").rstrip("/") + "/v23.0"
 STATE_DIR = os.getenv("STATE_DIR", "state")
 TOKEN_STATE_PATH = os.path.join(STATE_DIR, "token.json")
 
@@ -41,21 +44,6 @@ def _now() -> int:
     return int(time.time())
 
 
-def _debug_token(user_token: str, app_id: str, app_secret: str) -> dict:
-    try:
-        app_access = f"{app_id}|{app_secret}"
-        r = requests.get(
-            f"{GRAPH}/debug_token",
-            params={"input_token": user_token, "access_token": app_access},
-            timeout=30,
-        )
-        r.raise_for_status()
-        return r.json().get("data", {})
-    except Exception as e:
-        log.warning("debug_token failed: %s", e)
-        return {}
-
-
 def _exchange_long_lived(user_token: str, app_id: str, app_secret: str) -> str:
     r = requests.get(
         f"{GRAPH}/oauth/access_token",
@@ -71,26 +59,6 @@ def _exchange_long_lived(user_token: str, app_id: str, app_secret: str) -> str:
     return (r.json() or {}).get("access_token", "")
 
 
-def _get_page_token(user_token: str, page_id: str) -> str:
-    r = requests.get(
-        f"{GRAPH}/{page_id}",
-        params={"fields": "access_token", "access_token": user_token},
-        timeout=30,
-    )
-    r.raise_for_status()
-    return (r.json() or {}).get("access_token", "")
-
-
-def _get_ig_user_id(user_token: str, page_id: str) -> str:
-    r = requests.get(
-        f"{GRAPH}/{page_id}",
-        params={"fields": "instagram_business_account{id}", "access_token": user_token},
-        timeout=30,
-    )
-    r.raise_for_status()
-    return ((r.json() or {}).get("instagram_business_account") or {}).get("id", "")
-
-
 def _get_ig_user_id_via_page_token(page_token: str, page_id: str) -> str:
     """Resolve IG Business User ID using a page token + PAGE_ID.
 
@@ -105,13 +73,52 @@ def _get_ig_user_id_via_page_token(page_token: str, page_id: str) -> str:
     return ((r.json() or {}).get("instagram_business_account") or {}).get("id", "")
 
 
+_creds_cache: Tuple[float, Optional[Tuple[str, str]]] = (0.0, None)
+# Set per tenant (see tenants.py) when an account other than the env one posts
+_creds_override: contextvars.ContextVar[Optional[Tuple[str, str, str]]] = contextvars.ContextVar("creds_override", default=None)
+
+
+@contextmanager
+def using_creds(access_token: str, ig_user_id: str, source: str = ""):
+    """Make `get_creds` return these fixed credentials inside the block.
+
+    An empty token only fails when something actually needs credentials,
+    with `source` (e.g. the env var it should come from) in the error.
+    """
+    token = _creds_override.set((access_token, ig_user_id, source))
+    try:
+        yield
+    finally:
+        _creds_override.reset(token)
+
+
 def get_creds() -> Tuple[str, str]:
     """Return (access_token, ig_user_id) for posting.
 
     Modes:
     - Fixed: IG_PAGE_ACCESS_TOKEN + IG_BUSINESS_ID
     - Derived (auto): IG_USER_ACCESS_TOKEN + PAGE_ID [+ FB_APP_ID/FB_APP_SECRET for refresh]
+
+    Derived credentials are reused for CREDS_CACHE_SEC (default 300) so the
+    container-create and publish calls of one post share a single lookup.
     """
+    global _creds_cache
+    override = _creds_override.get()
+    if override:
+        access_token, ig_user_id, source = override
+        if not access_token:
+            raise RuntimeError(f"Missing creds: {source or 'access token'} is not set")
+        return access_token, ig_user_id
+    expires, cached = _creds_cache
+    if cached and time.monotonic() < expires:
+        return cached
+    creds = _resolve_creds()
+    ttl = float(_get("CREDS_CACHE_SEC") or 300)
+    _creds_cache = (time.monotonic() + ttl, creds)
+    return creds
+
+
+def _resolve_creds() -> Tuple[str, str]:
     # Fixed token mode (with optional IG id derivation from PAGE_ID)
     fixed_token = _get("IG_PAGE_ACCESS_TOKEN")
     fixed_ig = _get("IG_BUSINESS_ID")
@@ -133,9 +140,18 @@ def get_creds() -> Tuple[str, str]:
 
     app_id = _get("FB_APP_ID")
     app_secret = _get("FB_APP_SECRET")
+    # One batch round trip: token expiry (when app creds exist) + page token + IG user id
+    page_op = graph_batch.op("GET", page_id, {"fields": "access_token,instagram_business_account{id}"})
+    ops = [page_op]
+    if app_id and app_secret:
+        ops.append(graph_batch.op("GET", "debug_token", {"input_token": user_token, "access_token": f"{app_id}|{app_secret}"}))
+    res = graph_batch.batch(GRAPH, ops, user_token)
+    page = graph_batch.raise_for_item(res[0]) or {}
     try:
-        if app_id and app_secret:
-            info = _debug_token(user_token, app_id, app_secret)
+        if len(res) > 1:
+            if isinstance(res[1], Exception):
+                raise res[1]
+            info = (res[1] or {}).get("data", {})
             exp = int(info.get("expires_at") or 0)
             if exp:
                 days_left = (exp - _now()) / 86400
@@ -147,11 +163,47 @@ def get_creds() -> Tuple[str, str]:
                         st["user_token"] = new_user
                         _save_state(st)
                         log.info("Refreshed long-lived user token (days_left=%.1f)", days_left)
+                        # The page token above was derived from the old user token; derive it again
+                        page = graph_batch.raise_for_item(graph_batch.batch(GRAPH, [page_op], user_token)[0]) or {}
     except Exception as e:
         log.warning("Token refresh check failed: %s", e)
 
-    page_token = _get_page_token(user_token, page_id)
-    ig_user = _get_ig_user_id(user_token, page_id)
+    page_token = page.get("access_token", "")
+    ig_user = (page.get("instagram_business_account") or {}).get("id", "")
     if not (page_token and ig_user):
         raise RuntimeError("Failed to derive page token or IG user id. Check PAGE_ID linkage and token scopes.")
     return page_token, ig_user
+
+
+def get_creds_many(accounts: List[dict]) -> List[Tuple[str, str]]:
+    """Resolve (access_token, ig_user_id) for several accounts in one Graph round trip.
+
+    Each account is a dict with either ``page_token`` + ``ig_business_id``
+    (fixed, no lookup), ``page_token`` + ``page_id`` (derive the IG id), or
+    ``user_token`` + ``page_id`` (derive the page token and IG id). Lookups
+    for all accounts go into a single batch request; token refresh stays with
+    `get_creds`.
+    """
+    out: List[Optional[Tuple[str, str]]] = [None] * len(accounts)
+    ops, owners = [], []
+    for i, acc in enumerate(accounts):
+        page_token = acc.get("page_token")
+        if page_token and acc.get("ig_business_id"):
+            out[i] = (page_token, acc["ig_business_id"])
+            continue
+        token = page_token or acc.get("user_token")
+        if not (token and acc.get("page_id")):
+            raise RuntimeError(f"Account {i}: provide page_token+ig_business_id, or a token + page_id")
+        fields = "instagram_business_account{id}" if page_token else "access_token,instagram_business_account{id}"
+        ops.append(graph_batch.op("GET", acc["page_id"], {"fields": fields, "access_token": token}))
+        owners.append(i)
+    if ops:
+        res = graph_batch.batch(GRAPH, ops, accounts[owners[0]].get("page_token") or accounts[owners[0]]["user_token"])
+        for i, r in zip(owners, res):
+            page = graph_batch.raise_for_item(r) or {}
+            token = accounts[i].get("page_token") or page.get("access_token", "")
+            ig_user = (page.get("instagram_business_account") or {}).get("id", "")
+            if not (token and ig_user):
+                raise RuntimeError(f"Account {i}: failed to derive page token or IG user id")
+            out[i] = (token, ig_user)
+    return out
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from .config import get_logger, LOG_DIR, dropped_log_records
+
+log = get_logger(__name__)
+
+RUNS_LOG_PATH = os.getenv("RUNS_LOG_PATH", os.path.join(LOG_DIR, "runs.jsonl"))
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar("tracing_run", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("tracing_span", default=None)
+
+
+class Span:
+    __slots__ = ("stage", "start", "duration", "status", "attrs")
+
+    def __init__(self, stage: str, attrs: dict):
+        self.stage = stage
+        self.start = time.time()
+        self.duration = 0.0
+        self.status = "ok"
+        self.attrs = attrs
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.stage,
+            "start": round(self.start, 3),
+            "duration_s": round(self.duration, 6),
+            "status": self.status,
+            **self.attrs,
+        }
+
+
+class Run:
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.start = time.time()
+        self.duration = 0.0
+        self.status = "ok"
+        self.attrs = attrs
+        self.spans: List[Span] = []
+
+    def to_dict(self) -> dict:
+        return {
+            "run": self.name,
+            "start": round(self.start, 3),
+            "duration_s": round(self.duration, 6),
+            "status": self.status,
+            **self.attrs,
+            "spans": [s.to_dict() for s in self.spans],
+        }
+
+
+class _Metrics:
+    """In-process aggregates exposed in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_sum: Dict[str, float] = {}
+        self.stage_count: Dict[str, int] = {}
+        self.stage_last: Dict[str, float] = {}
+        self.stage_errors: Dict[str, int] = {}
+        self.stage_retries: Dict[str, int] = {}
+        self.stage_bytes: Dict[str, int] = {}
+        self.runs: Dict[str, int] = {}
+        self.shared_saved: Dict[str, int] = {}
+        self.rss_bytes = 0
+        self.objects = 0
+        self.recycles: Dict[str, int] = {}
+        self.last_run_ts = 0.0
+        self.last_run_duration = 0.0
+
+    def observe(self, run: Run) -> None:
+        with self._lock:
+            self.runs[run.status] = self.runs.get(run.status, 0) + 1
+            self.last_run_ts = run.start + run.duration
+            self.last_run_duration = run.duration
+            for s in run.spans:
+                k = s.stage
+                self.stage_sum[k] = self.stage_sum.get(k, 0.0) + s.duration
+                self.stage_count[k] = self.stage_count.get(k, 0) + 1
+                self.stage_last[k] = s.duration
+                if s.status != "ok":
+                    self.stage_errors[k] = self.stage_errors.get(k, 0) + 1
+                self.stage_retries[k] = self.stage_retries.get(k, 0) + int(s.attrs.get("retries", 0))
+                self.stage_bytes[k] = self.stage_bytes.get(k, 0) + int(s.attrs.get("bytes", 0))
+
+    def observe_shared(self, saved: Dict[str, int]) -> None:
+        """Add calls saved by sharing work across tenants, per kind (school, timetable, render)."""
+        with self._lock:
+            for k, n in saved.items():
+                self.shared_saved[k] = self.shared_saved.get(k, 0) + n
+
+    def observe_memory(self, rss: int, objects: int) -> None:
+        with self._lock:
+            self.rss_bytes = rss
+            self.objects = objects
+
+    def observe_recycle(self, kind: str) -> None:
+        """Count a memory recycle: "caches" (render/archive caches dropped) or "restart"."""
+        with self._lock:
+            self.recycles[kind] = self.recycles.get(kind, 0) + 1
+
+    def render(self) -> str:
+        out = []
+
+        def family(name, kind, help_, samples):
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, v in samples:
+                lbl = ",".join(f'{k}="{val}"' for k, val in labels.items())
+                out.append(f"{name}{{{lbl}}} {v}" if lbl else f"{name} {v}")
+
+        with self._lock:
+            st = sorted(self.stage_count)
+            family("timetable_runs_total", "counter", "Pipeline runs by final status.",
+                   [({"status": k}, v) for k, v in sorted(self.runs.items())])
+            family("timetable_last_run_timestamp_seconds", "gauge", "Unix time the last run finished.",
+                   [({}, f"{self.last_run_ts:.3f}")])
+            family("timetable_last_run_duration_seconds", "gauge", "Wall time of the last run.",
+                   [({}, f"{self.last_run_duration:.6f}")])
+            family("timetable_stage_duration_seconds_sum", "counter", "Total time spent per stage.",
+                   [({"stage": k}, f"{self.stage_sum[k]:.6f}") for k in st])
+            family("timetable_stage_duration_seconds_count", "counter", "Spans recorded per stage.",
+                   [({"stage": k}, self.stage_count[k]) for k in st])
+            family("timetable_stage_last_duration_seconds", "gauge", "Duration of the most recent span per stage.",
+                   [({"stage": k}, f"{self.stage_last[k]:.6f}") for k in st])
+            family("timetable_stage_errors_total", "counter", "Failed spans per stage.",
+                   [({"stage": k}, self.stage_errors.get(k, 0)) for k in st])
+            family("timetable_stage_retries_total", "counter", "Retry attempts per stage.",
+                   [({"stage": k}, self.stage_retries.get(k, 0)) for k in st])
+            family("timetable_stage_bytes_total", "counter", "Bytes transferred or produced per stage.",
+                   [({"stage": k}, self.stage_bytes.get(k, 0)) for k in st])
+            family("timetable_shared_calls_saved_total", "counter", "Lookups, fetches and renders reused across tenants.",
+                   [({"kind": k}, v) for k, v in sorted(self.shared_saved.items())])
+            family("timetable_process_resident_memory_bytes", "gauge", "RSS sampled after the last job.",
+                   [({}, self.rss_bytes)])
+            family("timetable_process_objects", "gauge", "Objects tracked by the garbage collector after the last job.",
+                   [({}, self.objects)])
+            family("timetable_memory_recycles_total", "counter", "Memory recycles between jobs by kind.",
+                   [({"kind": k}, v) for k, v in sorted(self.recycles.items())])
+        family("timetable_log_records_dropped_total", "counter", "Log records dropped because the log queue was full.",
+               [({}, dropped_log_records())])
+        return "\n".join(out) + "\n"
+
+
+metrics = _Metrics()
+
+
+def _write_run(run: Run) -> None:
+    try:
+        os.makedirs(os.path.dirname(RUNS_LOG_PATH) or ".", exist_ok=True)
+        with open(RUNS_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run.to_dict(), ensure_ascii=False) + "\n")
+    except Exception as e:
+        log.warning("Failed to write run trace: %s", e)
+
+
+@contextmanager
+def run(name: str, **attrs):
+    """Trace one pipeline run; spans opened inside it are attached to it.
+
+    On exit the run is folded into the metrics and appended as one JSON line
+    to RUNS_LOG_PATH (default: logs/runs.jsonl).
+    """
+    r = Run(name, attrs)
+    token = _current_run.set(r)
+    t0 = time.perf_counter()
+    try:
+        yield r
+    except BaseException:
+        r.status = "error"
+        raise
+    finally:
+        r.duration = time.perf_counter() - t0
+        _current_run.reset(token)
+        metrics.observe(r)
+        _write_run(r)
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Time one stage of the current run. A no-op outside of `run()`."""
+    r = _current_run.get()
+    if r is None:
+        yield None
+        return
+    s = Span(stage, dict(attrs))
+    token = _current_span.set(s)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "error"
+        s.attrs["error"] = str(e)[:200]
+        raise
+    finally:
+        s.duration = time.perf_counter() - t0
+        _current_span.reset(token)
+        r.spans.append(s)
+
+
+def annotate(**attrs) -> None:
+    """Set attributes on the innermost open span."""
+    s: Optional[Span] = _current_span.get()
+    if s is not None:
+        s.attrs.update(attrs)
+
+
+def incr(key: str, n: int = 1) -> None:
+    """Add to a numeric attribute (e.g. retries, bytes) on the innermost open span."""
+    s: Optional[Span] = _current_span.get()
+    if s is not None:
+        s.attrs[key] = s.attrs.get(key, 0) + n
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics in Prometheus text format from a daemon thread."""
+    srv = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+    log.info("Metrics endpoint listening on http://%s:%s/metrics", host, srv.server_address[1])
+    return srv
@@ -1,11 +1,19 @@
 import os
 import uuid
 import pathlib
+from typing import Optional, Union
+
 import requests
 from .config import get_logger
 
 log = get_logger(__name__)
 
+ImageData = Union[bytes, bytearray, memoryview]
+
+# Overridable so the pipeline can run against local fakes (src/fake_servers.py)
+TRANSFER_SH_HOST = os.getenv("TRANSFER_SH_HOST", "https://transfer.sh").rstrip("/")
+CATBOX_HOST = os.getenv("CATBOX_HOST", "https://catbox.moe").rstrip("/")
+
 
 def _template_url_for(img_path: str) -> str:
     tmpl = os.getenv("IMAGE_URL_TEMPLATE", "").strip()
@@ -20,58 +28,73 @@ def _template_url_for(img_path: str) -> str:
     )
 
 
-def _upload_transfer_sh(img_path: str) -> str:
+def _read_bytes(img_path: str) -> bytes:
+    with open(img_path, "rb") as f:
+        return f.read()
+
+
+def _upload_transfer_sh(data: ImageData, filename: str) -> str:
     """Upload an image to transfer.sh and return the public URL.
 
     Note: transfer.sh is a public, ephemeral file host. Use for testing or small scale only.
     """
-    filename = pathlib.Path(img_path).name
     # add short random suffix to reduce collisions
     suf = uuid.uuid4().hex[:8]
-    url = f"https://transfer.sh/{suf}-{filename}"
-    with open(img_path, "rb") as f:
-        r = requests.put(url, data=f, timeout=60)
-        r.raise_for_status()
-        final_url = r.text.strip()
-        log.info("Uploaded image to transfer.sh: %s", final_url)
-        return final_url
+    url = f"{TRANSFER_SH_HOST}/{suf}-{filename}"
+    r = requests.put(url, data=bytes(data), timeout=60)
+    r.raise_for_status()
+    final_url = r.text.strip()
+    log.info("Uploaded image to transfer.sh: %s", final_url)
+    return final_url
+
+
+def _upload_catbox(data: ImageData, filename: str) -> str:
+    # Public host that returns a direct URL
+    files = {"fileToUpload": (filename, bytes(data), "image/jpeg")}
+    form = {"reqtype": "fileupload"}
+    r = requests.post(f"{CATBOX_HOST}/user/api.php", data=form, files=files, timeout=60)
+    r.raise_for_status()
+    url = r.text.strip()
+    log.info("Uploaded image to catbox: %s", url)
+    return url
 
 
-def get_public_image_url(img_path: str) -> str:
+def get_public_image_url(
+    img_path: Optional[str] = None,
+    *,
+    data: Optional[ImageData] = None,
+    filename: Optional[str] = None,
+) -> str:
     """Return a public URL for the given image.
 
+    The image can be given as a file path or as encoded bytes (``data``);
+    in-memory bytes are streamed to the host directly without a disk round trip.
+    ``filename`` names the upload (defaults to the basename of ``img_path``).
+
     Priority:
-    1) IMAGE_URL_TEMPLATE env var
+    1) IMAGE_URL_TEMPLATE env var (requires the image to be served from ``img_path``)
     2) UPLOAD_PROVIDER=transfersh
     """
-    u = _template_url_for(img_path)
+    if img_path is None and data is None:
+        raise ValueError("Either img_path or data is required")
+    name = filename or (pathlib.Path(img_path).name if img_path else "timetable.jpg")
+
+    u = _template_url_for(img_path or name)
     if u:
         return u
 
+    if data is None:
+        data = _read_bytes(img_path)
+
     provider = os.getenv("UPLOAD_PROVIDER", "").strip().lower()
     if provider == "transfersh":
-        return _upload_transfer_sh(img_path)
+        return _upload_transfer_sh(data, name)
     if provider in ("catbox", "catbox.moe"):
-        # Public host that returns a direct URL
-        with open(img_path, "rb") as f:
-            files = {"fileToUpload": (pathlib.Path(img_path).name, f, "image/jpeg")}
-            data = {"reqtype": "fileupload"}
-            r = requests.post("https://catbox.moe/user/api.php", data=data, files=files, timeout=60)
-            r.raise_for_status()
-            url = r.text.strip()
-            log.info("Uploaded image to catbox: %s", url)
-            return url
+        return _upload_catbox(data, name)
 
     # Auto fallback: try transfer.sh then catbox
     try:
-        return _upload_transfer_sh(img_path)
+        return _upload_transfer_sh(data, name)
     except Exception as e:
         log.warning("transfer.sh failed: %s; falling back to catbox", e)
-        with open(img_path, "rb") as f:
-            files = {"fileToUpload": (pathlib.Path(img_path).name, f, "image/jpeg")}
-            data = {"reqtype": "fileupload"}
-            r = requests.post("https://catbox.moe/user/api.php", data=data, files=files, timeout=60)
-            r.raise_for_status()
-            url = r.text.strip()
-            log.info("Uploaded image to catbox: %s", url)
-            return url
+        return _upload_catbox(data, name)
@@ -0,0 +1,238 @@
+import io
+import os
+import json
+import time
+import shutil
+import hashlib
+import tarfile
+import argparse
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from .config import get_logger
+
+log = get_logger(__name__)
+
+FORMAT = "insta-timetable-warm-cache"
+# Bumped when the member layout changes; older readers refuse newer bundles
+VERSION = 1
+MANIFEST_NAME = "MANIFEST.json"
+COMPRESSION = {"gz": "gz", "xz": "xz", "none": ""}
+# Refreshable caches: bundled, but left out of the content digest so a revalidation
+# or a quota tick alone does not make CI save a new cache
+VOLATILE = ("timetables", "quota")
+_SKIP_SUFFIXES = (".lock", ".tmp")
+
+
+def _layout() -> Dict[str, Dict[str, str]]:
+    """section -> {label: local path}; labels name the same thing on every machine.
+
+    Token state (token_manager.TOKEN_STATE_PATH) is never bundled: it holds the
+    long-lived user token, and the bundle is stored as an Actions cache that
+    anyone with read access to the repository's Actions can download. Runs
+    derive their credentials from the secrets instead; the "credentials"
+    section of older bundles is ignored on import.
+    """
+    # Imported here so each module's env-derived paths are honoured
+    from . import detect_change, font_subset, graph_throttle, neis_quota, run_journal, sprite_atlas, timetable_archive
+    from . import timetable_cache
+
+    return {
+        "state": {
+            "posted.json": detect_change.STATE_PATH,
+            "staged.json": detect_change.STAGED_PATH,
+            "journal": run_journal.JOURNAL_DIR,
+        },
+        "codes": {"school_codes.json": timetable_cache.SCHOOL_CODES_PATH},
+        "timetables": {"timetable_cache": timetable_cache.CACHE_DIR},
+        "archive": {"archive": timetable_archive.ARCHIVE_DIR},
+        "render": {"sprites": sprite_atlas.SPRITE_CACHE_DIR, "fonts": font_subset.FONT_SUBSET_DIR},
+        "quota": {"neis_quota.json": neis_quota.QUOTA_PATH, "graph_usage.json": graph_throttle.USAGE_PATH},
+    }
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _collect(layout: Dict[str, Dict[str, str]], sections: List[str]) -> List[Tuple[str, str, str]]:
+    """(section, member name, local path) for every file that exists."""
+    claimed = {os.path.abspath(p) for entries in layout.values() for p in entries.values() if p}
+    out = []
+    for section in sections:
+        for label, path in layout[section].items():
+            if not path:  # disabled (e.g. SPRITE_CACHE_DIR=)
+                continue
+            if os.path.isfile(path):
+                out.append((section, f"{section}/{label}", path))
+                continue
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    # Files that are their own entry elsewhere (school_codes.json inside the timetable cache)
+                    if name.endswith(_SKIP_SUFFIXES) or ".tmp" in name or (os.path.abspath(full) in claimed and full != path):
+                        continue
+                    rel = os.path.relpath(full, path).replace(os.sep, "/")
+                    out.append((section, f"{section}/{label}/{rel}", full))
+    return out
+
+
+def content_digest(manifest: dict) -> str:
+    """Digest of the durable sections' files; equal digests mean nothing worth saving changed."""
+    h = hashlib.sha256()
+    for name in sorted(manifest["sections"]):
+        if name in VOLATILE:
+            continue
+        for member, meta in sorted(manifest["sections"][name]["files"].items()):
+            h.update(f"{member}\0{meta['sha256']}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def export_bundle(path: str, sections: Optional[List[str]] = None, compression: str = "gz") -> dict:
+    """Write the warm-cache bundle to `path`; returns its manifest.
+
+    The manifest (first member) lists every file with size and SHA-256 per section.
+    """
+    layout = _layout()
+    sections = sections or list(layout)
+    files = _collect(layout, sections)
+    manifest = {
+        "format": FORMAT,
+        "version": VERSION,
+        "created_at": int(time.time()),
+        "sections": {s: {"files": {}, "bytes": 0} for s in sections},
+    }
+    for section, member, local in files:
+        size = os.path.getsize(local)
+        manifest["sections"][section]["files"][member] = {"size": size, "sha256": _sha256(local)}
+        manifest["sections"][section]["bytes"] += size
+    manifest["digest"] = content_digest(manifest)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with tarfile.open(tmp, f"w:{COMPRESSION[compression]}" if COMPRESSION[compression] else "w") as tar:
+        data = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+        info = tarfile.TarInfo(MANIFEST_NAME)
+        info.size, info.mtime = len(data), manifest["created_at"]
+        tar.addfile(info, io.BytesIO(data))
+        for _, member, local in files:
+            tar.add(local, arcname=member, recursive=False)
+    os.replace(tmp, path)
+    return manifest
+
+
+def read_manifest(path: str) -> dict:
+    with tarfile.open(path, "r:*") as tar:
+        first = tar.next()
+        if first is None or first.name != MANIFEST_NAME:
+            raise ValueError(f"{path} is not a warm-cache bundle (no {MANIFEST_NAME})")
+        manifest = json.load(tar.extractfile(first))
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"{path}: unknown bundle format {manifest.get('format')!r}")
+    if int(manifest.get("version", 0)) > VERSION:
+        raise ValueError(f"{path}: bundle version {manifest['version']} is newer than supported ({VERSION})")
+    return manifest
+
+
+def import_bundle(path: str, sections: Optional[List[str]] = None) -> dict:
+    """Verify every member against the manifest, then install the files in place.
+
+    Nothing is written unless the whole bundle verifies. Members are mapped
+    through the local layout, so a different STATE_DIR etc. is honoured.
+    """
+    manifest = read_manifest(path)
+    layout = _layout()
+    wanted = [s for s in (sections or manifest["sections"]) if s in manifest["sections"] and s in layout]
+    expected = {m: meta for s in wanted for m, meta in manifest["sections"][s]["files"].items()}
+    staging = tempfile.mkdtemp(prefix="warm-cache-")
+    try:
+        seen = set()
+        with tarfile.open(path, "r:*") as tar:
+            for info in tar:
+                if info.name not in expected:
+                    continue
+                if not info.isfile():
+                    raise ValueError(f"{path}: {info.name} is not a regular file")
+                data = tar.extractfile(info).read()
+                meta = expected[info.name]
+                if len(data) != meta["size"] or hashlib.sha256(data).hexdigest() != meta["sha256"]:
+                    raise ValueError(f"{path}: checksum mismatch for {info.name}")
+                with open(os.path.join(staging, hashlib.sha256(info.name.encode("utf-8")).hexdigest()), "wb") as f:
+                    f.write(data)
+                seen.add(info.name)
+        missing = sorted(set(expected) - seen)
+        if missing:
+            raise ValueError(f"{path}: {len(missing)} member(s) missing, e.g. {missing[0]}")
+
+        for member in sorted(expected):
+            section, _, rest = member.partition("/")
+            label, _, rel = rest.partition("/")
+            base = layout[section].get(label)
+            if not base:
+                continue
+            target = os.path.join(base, *rel.split("/")) if rel else base
+            # Members only ever land inside their entry's directory
+            if rel and not os.path.abspath(target).startswith(os.path.abspath(base) + os.sep):
+                raise ValueError(f"{path}: unsafe member name {member}")
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            tmp = f"{target}.{os.getpid()}.tmp"
+            shutil.copyfile(os.path.join(staging, hashlib.sha256(member.encode("utf-8")).hexdigest()), tmp)
+            os.replace(tmp, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    manifest["imported"] = wanted
+    return manifest
+
+
+def report(manifest: dict, bundle_path: Optional[str] = None) -> str:
+    lines = [f"{'section':<12}{'files':>7}{'KB':>10}"]
+    total_files = total_bytes = 0
+    for name, sec in manifest["sections"].items():
+        n, b = len(sec["files"]), sec["bytes"]
+        total_files += n
+        total_bytes += b
+        lines.append(f"{name + (' *' if name in VOLATILE else ''):<12}{n:>7}{b / 1024:>10.1f}")
+    lines.append(f"{'total':<12}{total_files:>7}{total_bytes / 1024:>10.1f}")
+    if bundle_path and os.path.exists(bundle_path):
+        size = os.path.getsize(bundle_path)
+        ratio = f", {size / total_bytes:.0%} of raw" if total_bytes else ""
+        lines.append(f"bundle {bundle_path}: {size / 1024:.1f} KB{ratio}")
+    lines.append(f"v{manifest['version']} digest {manifest['digest']} (* volatile, not in digest)")
+    return "\n".join(lines)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Export or import the warm-cache bundle (state, codes, caches)")
+    p.add_argument("command", choices=["export", "import", "inspect", "digest"])
+    p.add_argument("bundle", help="Bundle path (e.g. warm-cache.tar.gz)")
+    p.add_argument("--sections", help=f"Comma-separated subset of: {', '.join(_layout())}")
+    p.add_argument("--compression", choices=list(COMPRESSION), default="gz", help="export only (default: gz)")
+    args = p.parse_args()
+    sections = [s.strip() for s in args.sections.split(",")] if args.sections else None
+
+    t0 = time.perf_counter()
+    if args.command == "export":
+        manifest = export_bundle(args.bundle, sections, args.compression)
+        print(report(manifest, args.bundle))
+    elif args.command == "import":
+        if not os.path.exists(args.bundle):
+            print(f"No bundle at {args.bundle}; starting cold")
+            return
+        manifest = import_bundle(args.bundle, sections)
+        print(report(manifest, args.bundle))
+        print(f"Imported {', '.join(manifest['imported']) or 'nothing'}")
+    elif args.command == "inspect":
+        print(report(read_manifest(args.bundle), args.bundle))
+    else:
+        print(read_manifest(args.bundle)["digest"])
+        return
+    print(f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# The src modules read their paths at import; keep state and logs out of the checkout
+_tmp = tempfile.mkdtemp(prefix="insta-timetable-tests-")
+os.environ.setdefault("STATE_DIR", os.path.join(_tmp, "state"))
+os.environ.setdefault("LOG_DIR", os.path.join(_tmp, "logs"))
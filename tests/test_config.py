@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import textwrap
+import threading
+
+from src import config
+from src.config import _DroppingQueueHandler, _JsonFormatter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_json_records_keep_the_traceback_in_its_own_field():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("t", logging.ERROR, __file__, 1, "failed for %s", ("x",), sys.exc_info())
+    prepared = _DroppingQueueHandler(None).prepare(record)
+
+    entry = json.loads(_JsonFormatter().format(prepared))
+    assert entry["msg"] == "failed for x"
+    assert entry["exc"].startswith("Traceback") and "ValueError: boom" in entry["exc"]
+
+
+def test_forked_worker_records_are_written(tmp_path):
+    script = textwrap.dedent(
+        """
+        import multiprocessing
+        from src.config import get_logger
+
+        def work():
+            for i in range(200):
+                get_logger("worker").warning("worker record %d", i)
+
+        if __name__ == "__main__":
+            get_logger("parent").info("starting")
+            p = multiprocessing.get_context("fork").Process(target=work)
+            p.start()
+            p.join()
+            assert p.exitcode == 0
+        """
+    )
+    env = dict(os.environ, LOG_DIR=str(tmp_path), LOG_LEVEL="INFO")
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, check=True, capture_output=True, timeout=60)
+
+    log = (tmp_path / "insta_timetable.log").read_text(encoding="utf-8")
+    # The child leaves through os._exit right after its last record
+    assert "worker record 199" in log
+
+
+def test_drops_from_many_threads_are_all_counted(monkeypatch):
+    full = queue.Queue(maxsize=1)
+    full.put_nowait(None)
+    handler = _DroppingQueueHandler(full)
+    monkeypatch.setattr(config, "_writer", object())  # queueing mode, but nothing drains
+    record = logging.LogRecord("t", logging.INFO, __file__, 1, "x", (), None)
+    before = config.dropped_log_records()
+
+    threads = [threading.Thread(target=lambda: [handler.enqueue(record) for _ in range(2000)]) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert config.dropped_log_records() - before == 16000
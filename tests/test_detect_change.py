@@ -0,0 +1,36 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src import detect_change
+
+TT = [{"period": 1, "subject": "국어", "room": ""}]
+
+
+@pytest.fixture(autouse=True)
+def state(tmp_path, monkeypatch):
+    monkeypatch.setattr(detect_change, "STATE_PATH", str(tmp_path / "posted.json"))
+    monkeypatch.setattr(detect_change, "STAGED_PATH", str(tmp_path / "staged.json"))
+    return tmp_path
+
+
+def test_concurrent_posts_are_all_recorded(state):
+    keys = [f"t{i}:20261019" for i in range(16)]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda k: detect_change.record_post(k, f"post-{k}", "h", timetable=TT), keys))
+
+    posted = json.loads((state / "posted.json").read_text(encoding="utf-8"))
+    assert {k: v["post_id"] for k, v in posted.items()} == {k: f"post-{k}" for k in keys}
+    assert not list(state.glob("*.tmp"))
+
+
+def test_concurrent_tenants_keep_their_staged_containers(state):
+    keys = [f"t{i}:20261019" for i in range(16)]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda k: detect_change.save_staged(k, {"creation_id": k}), keys))
+    assert all(detect_change.load_staged(k) == {"creation_id": k} for k in keys)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(detect_change.clear_staged, keys[:8]))
+    assert [k for k in keys if detect_change.load_staged(k)] == keys[8:]
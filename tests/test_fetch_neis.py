@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from src import detect_change, fake_servers, fetch_neis
+from src.timetable_types import Timetable
+
+ROWS = [{"period": 1, "subject": "국어", "room": ""}, {"period": 2, "subject": "수학", "room": "301"}]
+ARGS = ("his", "B10", "7010536", "20261019", 3, 11)
+
+
+def _serve(monkeypatch, rows):
+    srv, url = fake_servers.start_server(fake_servers.neis_route(rows))
+    monkeypatch.setattr(fetch_neis, "NEIS_HOST", url + "/hub")
+    monkeypatch.setattr(fetch_neis, "shared_archive", lambda: None)
+    monkeypatch.setenv("NEIS_KEY", "TEST")
+    return srv
+
+
+@pytest.fixture
+def neis(monkeypatch):
+    srv = _serve(monkeypatch, ROWS)
+    yield
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_get_timetable_returns_plain_rows(neis):
+    tt = fetch_neis.get_timetable(*ARGS)
+
+    assert tt == ROWS
+    assert json.loads(json.dumps(tt, ensure_ascii=False)) == ROWS
+    tt[0]["subject"] = "문학"  # callers may still edit rows in place
+
+
+def test_typed_accessor_returns_a_timetable(neis):
+    tt = fetch_neis.get_timetable_typed(*ARGS)
+
+    assert isinstance(tt, Timetable) and tt.date == "20261019"
+    assert tt == ROWS and tt.to_dicts() == fetch_neis.get_timetable(*ARGS)
+
+
+def test_padded_room_still_matches_its_legacy_hash(monkeypatch):
+    padded = [dict(ROWS[1], room=" 301 ")]
+    srv = _serve(monkeypatch, padded)
+    try:
+        # What posted.json stored before rows were stripped: the JSON hash of the raw rows
+        legacy = detect_change.calc_hash({"date": "20261019", "timetable": fetch_neis.get_timetable(*ARGS)})
+        tt = fetch_neis.get_timetable_typed(*ARGS)
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+    assert tt[0].room == "301"
+    current = detect_change.timetable_hash("20261019", tt)
+    assert detect_change.hash_matches(legacy, current, "20261019", tt)
@@ -0,0 +1,21 @@
+import json
+
+from src import font_subset
+from src.render_assets import font_file_hash
+
+
+def test_subset_built_after_a_miss_is_picked_up(tmp_path):
+    font = tmp_path / "Font.ttf"
+    font.write_bytes(b"full font")
+    subset_dir = tmp_path / "subsets"
+    subset_dir.mkdir()
+    assert font_subset.subset_for(str(font), str(subset_dir)) is None
+
+    (subset_dir / "Font.ttf").write_bytes(b"subset")
+    meta = {"source": str(font), "source_sha": font_file_hash(str(font)), "chars": "가나"}
+    (subset_dir / "Font.ttf.json").write_text(json.dumps(meta), encoding="utf-8")
+    assert font_subset.subset_for(str(font), str(subset_dir)) == (str(subset_dir / "Font.ttf"), frozenset("가나"))
+
+    # A changed font makes the subset stale
+    font.write_bytes(b"another full font")
+    assert font_subset.subset_for(str(font), str(subset_dir)) is None
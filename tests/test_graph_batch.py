@@ -0,0 +1,115 @@
+import pytest
+
+from src import daemon, fake_servers, graph_batch, post_instagram, run_journal, tenants, token_manager
+
+_ensure_creds = post_instagram._ensure_creds
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    calls = []
+
+    def route(req):
+        calls.append(req)
+        return fake_servers.graph_route(req)
+
+    srv, url = fake_servers.start_server(route)
+    monkeypatch.setattr(fake_servers, "_containers", {})
+    monkeypatch.setattr(post_instagram, "GRAPH", url + "/v21.0")
+    monkeypatch.setattr(post_instagram, "TEST_MODE", False)
+    monkeypatch.setattr(post_instagram, "_ensure_creds", lambda: ("TOKEN", "17841400000000000"))
+    monkeypatch.setattr(token_manager, "GRAPH", url + "/v23.0")
+    monkeypatch.setattr(graph_batch.time, "sleep", lambda s: None)
+    yield calls
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_retry_resends_only_the_failed_items(graph, monkeypatch):
+    real_op, failed = fake_servers._graph_op, []
+
+    def flaky(method, path, q):
+        if q.get("image_url") == "https://img.example/2.png" and not failed:
+            failed.append(path)
+            return 500, {"error": {"message": "transient", "code": 2}}
+        return real_op(method, path, q)
+
+    monkeypatch.setattr(fake_servers, "_graph_op", flaky)
+    urls = [f"https://img.example/{i}.png" for i in range(1, 4)]
+    post_instagram.create_carousel_container(urls, "caption")
+
+    # Three children and the carousel itself: the two children that went through were not created again
+    assert failed and len(fake_servers._containers) == 4
+    assert len(graph) == 3
+
+
+def test_ambiguous_failure_is_not_retried_for_posts(graph, monkeypatch):
+    monkeypatch.setattr(fake_servers, "graph_route", lambda req: (200, {"unexpected": True}))
+    ops = [graph_batch.op("POST", "17841400000000000/media", body={"image_url": "https://img.example/1.png"})]
+
+    with pytest.raises(RuntimeError, match="not retried"):
+        graph_batch.batch(post_instagram.GRAPH, ops, "TOKEN")
+    assert len(graph) == 1
+
+
+def test_resolve_accounts_batches_page_lookups(graph, monkeypatch):
+    monkeypatch.setenv("IG_TOKEN_A", "PAGE_TOKEN_A")
+    ts = [
+        {"name": "a", "page_id": "1001", "ig_business_id": "", "ig_access_token_env": "IG_TOKEN_A"},
+        {"name": "b", "page_id": "1002", "ig_business_id": "", "ig_access_token_env": "IG_TOKEN_A"},
+        {"name": "c", "page_id": "", "ig_business_id": "178", "ig_access_token_env": "IG_TOKEN_A"},
+    ]
+    tenants.resolve_accounts(ts)
+
+    assert [t["ig_business_id"] for t in ts] == ["IG_1001", "IG_1002", "178"]
+    assert len(graph) == 1
+
+
+def test_unresolved_tenant_does_not_post_with_env_creds(graph, monkeypatch):
+    monkeypatch.setenv("IG_TOKEN_A", "PAGE_TOKEN_A")
+    ts = [
+        {"name": "a", "page_id": "1001", "ig_business_id": "", "ig_access_token_env": "IG_TOKEN_A"},
+        {"name": "b", "page_id": "no-such-page", "ig_business_id": "", "ig_access_token_env": "IG_TOKEN_A"},
+    ]
+    tenants.resolve_accounts(ts)
+
+    assert [t["ig_business_id"] for t in ts] == ["IG_1001", ""]
+    with pytest.raises(RuntimeError, match="no IG account resolved"):
+        with tenants.active(ts[1]):
+            pass
+
+
+def test_refreshed_user_token_derives_the_page_token(graph, monkeypatch, tmp_path):
+    monkeypatch.setattr(token_manager, "TOKEN_STATE_PATH", str(tmp_path / "token.json"))
+    monkeypatch.setattr(token_manager, "STATE_DIR", str(tmp_path))
+    for k, v in {"IG_USER_ACCESS_TOKEN": "OLD_USER", "PAGE_ID": "1001", "FB_APP_ID": "1", "FB_APP_SECRET": "s"}.items():
+        monkeypatch.setenv(k, v)
+    monkeypatch.delenv("IG_PAGE_ACCESS_TOKEN", raising=False)
+    # The fake debug_token says 60 days left; move the clock so it is due for refresh
+    monkeypatch.setattr(token_manager, "_now", lambda: 10**10)
+
+    assert token_manager._resolve_creds() == ("PAGE_TOKEN_1001", "IG_1001")
+    batches = [r.params.get("access_token") for r in graph if "batch" in r.params]
+    assert batches == ["OLD_USER", "STUB_LONG_LIVED_TOKEN"]
+
+
+def test_tenants_create_their_containers_in_one_batch(graph, monkeypatch, tmp_path):
+    monkeypatch.setattr(post_instagram, "_ensure_creds", _ensure_creds)
+    monkeypatch.setattr(run_journal, "JOURNAL_DIR", str(tmp_path / "journal"))
+    ts = []
+    for n in "abc":
+        monkeypatch.setenv(f"IG_TOKEN_{n}", f"TOKEN_{n}")
+        ts.append({"name": n, "page_id": "", "ig_business_id": f"IG_{n}", "ig_access_token_env": f"IG_TOKEN_{n}", "layout": {}})
+    monkeypatch.setattr(tenants, "load_tenants", lambda cfg: ts)
+    created = {}
+
+    def job(run, revalidate=True):
+        name = tenants.current()["name"]
+        journal = run_journal.Journal(tenants.state_key("20261019"))
+        created[name] = daemon._create_container(journal, f"https://img.example/{name}.png", name)
+
+    daemon._run_tenants("daily_job", job, revalidate=False, coordinate=False)
+
+    assert {n: fake_servers._containers[cid] for n, cid in created.items()} == {"a": "a", "b": "b", "c": "c"}
+    posts = [r for r in graph if r.method == "POST"]
+    assert len(posts) == 1 and "batch" in posts[0].params
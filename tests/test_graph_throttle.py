@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from src.graph_throttle import GraphRateLimited, Throttle
+
+
+def test_usage_observed_by_another_process_is_honoured(tmp_path):
+    path = str(tmp_path / "graph_usage.json")
+    ours, theirs = Throttle(path), Throttle(path)
+    assert ours.delay_for("178") == 0
+
+    theirs.observe({"X-Business-Use-Case-Usage": json.dumps(
+        {"178": [{"call_count": 100, "estimated_time_to_regain_access": 30}]}
+    )})
+    assert ours.delay_for("178") == pytest.approx(1800, abs=5)
+    with pytest.raises(GraphRateLimited):
+        ours.wait("178")
+
+
+def test_updates_from_both_processes_are_kept(tmp_path):
+    path = str(tmp_path / "graph_usage.json")
+    ours, theirs = Throttle(path), Throttle(path)
+    ours.observe({"X-App-Usage": json.dumps({"call_count": 80})})
+    theirs.observe({"X-Business-Use-Case-Usage": json.dumps({"178": [{"call_count": 10}]})})
+
+    with open(path, encoding="utf-8") as f:
+        assert set(json.load(f)) == {"app", "178"}
+    assert ours.delay_for() > 0
@@ -0,0 +1,24 @@
+import threading
+
+from src import mem_watchdog, timetable_cache
+
+
+def test_recycle_deferred_for_a_revalidation_runs_when_it_ends(monkeypatch):
+    released = []
+    done = threading.Event()
+    monkeypatch.setattr(mem_watchdog, "MEM_SOFT_LIMIT_MB", 1)
+    monkeypatch.setattr(mem_watchdog, "release_caches", lambda: released.append(True))
+    monkeypatch.setattr(timetable_cache, "_listeners", [mem_watchdog._after_revalidation])
+    monkeypatch.setattr(timetable_cache, "_pending", {})
+    monkeypatch.setattr(timetable_cache, "_refresh", lambda *a: done.wait(10))
+
+    t = threading.Thread(target=timetable_cache._revalidate, args=("k", None, (), {}))
+    timetable_cache._pending["k"] = t
+    t.start()
+    with mem_watchdog.job("daily_job"):
+        pass
+    assert not released  # deferred while the revalidation runs
+
+    done.set()
+    t.join(10)
+    assert released == [True]
@@ -0,0 +1,57 @@
+import multiprocessing
+
+import pytest
+
+from src import neis_quota
+
+
+@pytest.fixture(autouse=True)
+def quota(tmp_path, monkeypatch):
+    monkeypatch.setattr(neis_quota, "QUOTA_PATH", str(tmp_path / "neis_quota.json"))
+    monkeypatch.setattr(neis_quota, "LOCK_PATH", str(tmp_path / "neis_quota.json.lock"))
+    monkeypatch.setattr(neis_quota, "PER_MIN", 6.0)
+    monkeypatch.setattr(neis_quota, "PER_DAY", 1000)
+
+
+def test_bucket_empties_then_refills_with_time():
+    t = 1_000_000.0
+    assert [neis_quota._try_take("post", t) for _ in range(6)] == [0.0] * 6
+    # Empty: the next token is 10 s away at 6/min
+    assert neis_quota._try_take("post", t) == pytest.approx(10.0)
+    assert neis_quota._try_take("post", t + 10) == 0.0
+    # A long pause refills only up to the bucket size
+    assert [neis_quota._try_take("post", t + 3600) for _ in range(7)][-1] > 0
+
+
+def test_lower_classes_leave_a_reserve_and_yield_to_posts():
+    t = 1_000_000.0
+    # "bulk" keeps half the bucket for higher classes
+    assert [neis_quota._try_take("bulk", t) for _ in range(3)] == [0.0] * 3
+    assert neis_quota._try_take("bulk", t) > 0
+    assert neis_quota._try_take("post", t) == 0.0
+    # A post pauses lower classes for NEIS_QUOTA_PREEMPT_SEC
+    assert neis_quota._try_take("update", t + 60) == pytest.approx(neis_quota.PREEMPT_SEC - 60)
+
+
+def _take(n):
+    for _ in range(n):
+        neis_quota.acquire()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_processes_draw_from_one_shared_bucket(monkeypatch):
+    monkeypatch.setattr(neis_quota, "PER_MIN", 600.0)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_take, args=(5,)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+    assert [p.exitcode for p in procs] == [0] * 4
+
+    before = neis_quota.spent()
+    with neis_quota.priority("post"):
+        _take(1)
+    assert neis_quota.summary()["day_used"] == 21
+    # The per-process count only has this process's request
+    assert neis_quota.spent() - before == 1
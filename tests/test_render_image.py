@@ -0,0 +1,97 @@
+import json
+
+from PIL import ImageChops
+
+from src import render_image, sprite_atlas
+from src.render_image import _RenderContext, _render, encode_jpeg, layout, render_timetable_batch
+from src.sprite_atlas import SpriteAtlas
+
+TT = [{"period": i, "subject": s} for i, s in enumerate(["국어", "수학", "영어"], start=1)]
+DATE = "2026년10월19일 월요일"
+
+
+def _img(overrides=None):
+    ctx = _RenderContext(atlas=SpriteAtlas(None))
+    with layout(overrides or {}):
+        return _render(DATE, TT, ctx=ctx)[0]
+
+
+def test_date_anchor_moves_the_date():
+    assert ImageChops.difference(_img(), _img({"DATE_ANCHOR_XY": "700,150"})).getbbox() is not None
+
+
+def test_malformed_date_anchor_falls_back_to_box():
+    assert ImageChops.difference(_img(), _img({"DATE_ANCHOR_XY": "bogus"})).getbbox() is None
+
+
+def _persisted_texts(cache_dir):
+    texts = set()
+    for index in cache_dir.glob("*/index.json"):
+        data = json.loads(index.read_text(encoding="utf-8"))
+        texts.update(k.split("|", 1)[1] for k in data["tiles"])
+        texts.update(data["measures"])
+    return texts
+
+
+def test_dates_stay_out_of_the_persisted_atlas(tmp_path):
+    atlas = SpriteAtlas(str(tmp_path))
+    ctx = _RenderContext(atlas=atlas)
+    for day in ("2026년10월19일 월요일", "2026년10월20일 화요일"):
+        _render(day, TT, ctx=ctx)
+    atlas.flush()
+
+    texts = _persisted_texts(tmp_path)
+    assert {"국어", "수학", "영어"} <= texts
+    assert not any("2026년" in t for t in texts)
+
+
+def test_atlas_is_written_only_past_the_threshold(tmp_path, monkeypatch):
+    monkeypatch.setattr(sprite_atlas, "SPRITE_FLUSH_THRESHOLD", 1000)
+    atlas = SpriteAtlas(str(tmp_path))
+    _render(DATE, TT, ctx=_RenderContext(atlas=atlas))
+    atlas.maybe_flush()
+    assert not list(tmp_path.glob("*/index.json"))
+
+    monkeypatch.setattr(sprite_atlas, "SPRITE_FLUSH_THRESHOLD", 1)
+    atlas.maybe_flush()
+    assert list(tmp_path.glob("*/index.json")) and atlas.dirty() == 0
+
+
+def test_batch_draws_each_date_header_once(monkeypatch):
+    calls = []
+    real = render_image._render_header
+    monkeypatch.setattr(render_image, "_render_header", lambda *a: calls.append(a[:2]) or real(*a))
+    other = [{"period": 1, "subject": "과학"}]
+    jobs = [(DATE, TT), (DATE, other), ("2026년10월20일 화요일", TT)]
+    out = render_timetable_batch(jobs, ctx=_RenderContext(atlas=SpriteAtlas(None)))
+
+    assert calls == [(DATE, False), ("2026년10월20일 화요일", False)]
+    for (day, tt), data in zip(jobs, out):
+        alone = _render(day, tt, ctx=_RenderContext(atlas=SpriteAtlas(None)))[0]
+        assert data == encode_jpeg(alone)
+
+
+def _width(ctx, text, size):
+    x0, _, x1, _ = ctx.cover(text, ctx.font(size, "bold")).getbbox(text)
+    return x1 - x0
+
+
+def test_fit_picks_the_largest_size_at_the_width_limit():
+    ctx = _RenderContext(atlas=SpriteAtlas(None))
+    text = "프로그래밍 실무와 응용"
+    exact = _width(ctx, text, 48)
+    assert ctx.fit(text, exact, 48, "bold", 20) == (text, 48)
+
+    fitted, size = ctx.fit(text, exact - 1, 48, "bold", 20)
+    assert fitted == text and size < 48
+    assert _width(ctx, text, size) <= exact - 1 < _width(ctx, text, size + 1)
+
+
+def test_fit_ellipsizes_to_the_longest_prefix_at_the_minimum_size():
+    ctx = _RenderContext(atlas=SpriteAtlas(None))
+    text = "프로그래밍 실무와 응용"
+    limit = _width(ctx, "프로그래밍…", 34)
+    fitted, size = ctx.fit(text, limit, 48, "bold", 34)
+
+    assert (fitted, size) == ("프로그래밍…", 34)
+    assert _width(ctx, "프로그래밍 실…", 34) > limit
@@ -0,0 +1,103 @@
+import types
+
+import pytest
+
+from src import daemon, detect_change, fake_servers, post_instagram, run_journal
+from src.run_journal import PUBLISH, PUBLISHED
+
+YMD = "20261019"
+TT = [{"period": 1, "subject": "국어"}]
+CAPTION = "2026년10월19일 월요일 시간표"
+
+
+class Crash(Exception):
+    """Stands in for the process dying at a pipeline step."""
+
+
+@pytest.fixture
+def graph(tmp_path, monkeypatch):
+    srv, url = fake_servers.start_server(fake_servers.graph_route)
+    monkeypatch.setattr(fake_servers, "_published", [])
+    monkeypatch.setattr(fake_servers, "_containers", {})
+    monkeypatch.setattr(post_instagram, "GRAPH", url + "/v21.0")
+    monkeypatch.setattr(post_instagram, "TEST_MODE", False)
+    monkeypatch.setattr(post_instagram, "_ensure_creds", lambda: ("TOKEN", "17841400000000000"))
+    monkeypatch.setattr(run_journal, "JOURNAL_DIR", str(tmp_path / "journal"))
+    monkeypatch.setattr(detect_change, "STATE_PATH", str(tmp_path / "posted.json"))
+    yield
+    srv.shutdown()
+    srv.server_close()
+
+
+def _publish(caption=CAPTION, crash_after=None):
+    """Create and publish a container through the daemon's journaled path, stopping after `crash_after`."""
+    journal = run_journal.Journal(YMD)
+    creation_id = post_instagram.create_media_container("https://img.example/t.png", caption)
+    real_publish, real_record = daemon.publish_container, journal.record
+
+    def publish(cid):
+        post_id = real_publish(cid)
+        if crash_after == PUBLISH:
+            raise Crash
+        return post_id
+
+    def record(stage, **artifacts):
+        rec = real_record(stage, **artifacts)
+        if stage == crash_after == PUBLISHED:
+            raise Crash
+        return rec
+
+    journal.record = record
+    daemon.publish_container, saved = publish, daemon.publish_container
+    try:
+        return creation_id, daemon._publish(journal, creation_id, daemon._caption_sha(caption), "h", None, TT)
+    except Crash:
+        return creation_id, None
+    finally:
+        daemon.publish_container = saved
+
+
+def _reopen():
+    run = types.SimpleNamespace(attrs={})
+    journal = daemon._open_journal(run, YMD)
+    return run, journal
+
+
+def test_crash_after_publish_intent_finds_the_post_by_caption(graph):
+    creation_id, _ = _publish(crash_after=PUBLISH)
+    # Something else posted to the account since; it must not be taken for ours
+    post_instagram.publish_container(post_instagram.create_media_container("https://img.example/o.png", "다른 게시물"))
+
+    run, journal = _reopen()
+    assert run.attrs["recovered_post_id"] == "STUB_POST_" + creation_id
+    assert detect_change.last_post_id(YMD) == "STUB_POST_" + creation_id
+    assert not journal
+
+
+def test_crash_after_published_records_the_journaled_post(graph):
+    creation_id, _ = _publish(crash_after=PUBLISHED)
+
+    run, journal = _reopen()
+    assert run.attrs["recovered_post_id"] == "STUB_POST_" + creation_id
+    assert not journal
+
+
+def test_unpublished_intent_keeps_the_journal(graph):
+    journal = run_journal.Journal(YMD)
+    creation_id = post_instagram.create_media_container("https://img.example/t.png", CAPTION)
+    journal.record(PUBLISH, creation_id=creation_id, caption_sha256=daemon._caption_sha(CAPTION), hash="h")
+
+    run, journal = _reopen()
+    assert "recovered_post_id" not in run.attrs
+    assert journal.get(PUBLISH) is not None
+    assert detect_change.last_post_id(YMD) == ""
+
+
+def test_published_container_without_matching_media_is_an_error(graph):
+    creation_id, _ = _publish(crash_after=PUBLISH)
+    journal = run_journal.Journal(YMD)
+    journal.record(PUBLISH, creation_id=creation_id, caption_sha256=daemon._caption_sha("다른 캡션"), hash="h")
+
+    with pytest.raises(RuntimeError, match="record the post id by hand"):
+        _reopen()
+    assert detect_change.last_post_id(YMD) == ""
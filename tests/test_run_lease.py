@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+
+import pytest
+
+from src import run_lease
+
+
+@pytest.fixture(autouse=True)
+def leases(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_lease, "LEASE_DIR", str(tmp_path))
+    monkeypatch.setattr(run_lease, "LEASE_POLL_SEC", 0.01)
+    return tmp_path
+
+
+def _entry(key):
+    with open(run_lease._path(key), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_waiter_reuses_the_holders_result():
+    entered, release, seen = threading.Event(), threading.Event(), []
+
+    def holder():
+        with run_lease.hold("t:20261019", "daily_job") as lease:
+            entered.set()
+            release.wait(5)
+            lease.result = {"outcome": "posted", "post_id": "1"}
+
+    t = threading.Thread(target=holder)
+    t.start()
+    entered.wait(5)
+
+    def waiter():
+        with run_lease.hold("t:20261019", "daily_job", wait=5) as lease:
+            seen.append((lease.acquired, lease.reused, lease.result))
+
+    w = threading.Thread(target=waiter)
+    w.start()
+    time.sleep(0.05)
+    release.set()
+    t.join(5)
+    w.join(5)
+    assert seen == [(False, True, {"outcome": "posted", "post_id": "1"})]
+    assert _entry("t:20261019")["status"] == "done"
+
+
+def test_waiter_gives_up_while_the_lease_is_held():
+    with run_lease.hold("t:20261019", "daily_job") as first:
+        with run_lease.hold("t:20261019", "daily_job", wait=0.05) as second:
+            assert first.acquired and second.busy and not second.acquired
+
+
+def test_holder_renews_before_expiry(monkeypatch):
+    monkeypatch.setattr(run_lease, "LEASE_TTL_SEC", 0.3)
+    with run_lease.hold("t:20261019", "daily_job"):
+        first = _entry("t:20261019")["expires"]
+        time.sleep(0.5)
+        # Renewed every TTL/3, so it never lapsed while the job ran
+        assert _entry("t:20261019")["expires"] > first
+        with run_lease.hold("t:20261019", "daily_job", wait=0) as other:
+            assert other.busy
+
+
+def test_stale_lease_is_reclaimed(monkeypatch):
+    path = run_lease._path("t:20261019")
+    now = time.time()
+    run_lease._write(path, {"owner": "elsewhere:1:dead", "job": "daily_job", "status": "running",
+                            "acquired": now - 600, "expires": now - 1})
+    with run_lease.hold("t:20261019", "daily_job", wait=0) as lease:
+        assert lease.acquired
+        assert _entry("t:20261019")["owner"] == lease.owner
+
+
+def test_lease_of_an_exited_process_is_reclaimed_before_expiry():
+    now = time.time()
+    # Our host, a pid that cannot exist
+    run_lease._write(run_lease._path("t:20261019"), {"owner": f"{run_lease._HOST}:999999999:x", "job": "daily_job",
+                                                      "status": "running", "acquired": now, "expires": now + 600})
+    with run_lease.hold("t:20261019", "daily_job", wait=0) as lease:
+        assert lease.acquired
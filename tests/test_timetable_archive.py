@@ -0,0 +1,57 @@
+from src.timetable_archive import TimetableArchive
+
+TT = [{"period": 1, "subject": "국어", "room": "101"}, {"period": 2, "subject": "수학", "room": ""}]
+SCHOOL = ("B10", "7010536")
+
+
+def test_append_and_query_round_trip(tmp_path):
+    arch = TimetableArchive(str(tmp_path))
+    assert arch.append(*SCHOOL, 3, 11, "20261020", TT, fetched_at=1)
+    assert arch.append(*SCHOOL, 3, 11, "20261019", TT[:1], fetched_at=2)
+    assert arch.append(*SCHOOL, 3, 11, "20261019", TT, fetched_at=3)
+    assert arch.append(*SCHOOL, 3, 12, "20261019", [], fetched_at=4)
+
+    assert [(s["date"], s["fetched_at"]) for s in arch.snapshots(*SCHOOL, 3, 11)] == [
+        ("20261019", 2), ("20261019", 3), ("20261020", 1),
+    ]
+    assert arch.history(*SCHOOL, 3, 11, start="20261019", end="20261019") == {"20261019": TT}
+    assert arch.history(*SCHOOL, 3, 12) == {"20261019": []}
+    assert arch.history(*SCHOOL, 2, 11) == {}
+
+
+def test_unchanged_day_is_not_appended_again(tmp_path):
+    arch = TimetableArchive(str(tmp_path))
+    assert arch.append(*SCHOOL, 3, 11, "20261019", TT)
+    padded = [dict(r, subject=f" {r['subject']} ") for r in TT]
+    assert not arch.append(*SCHOOL, 3, "11", "20261019", padded)
+    assert len(arch) == 2
+
+
+def test_non_numeric_class_names(tmp_path):
+    arch = TimetableArchive(str(tmp_path))
+    assert arch.append(*SCHOOL, 1, "가", "20261019", TT)
+    assert arch.append(*SCHOOL, 1, "나", "20261019", TT[:1])
+    assert arch.history(*SCHOOL, 1, "가") == {"20261019": TT}
+    assert arch.history(*SCHOOL, 1, "나") == {"20261019": TT[:1]}
+
+
+def test_reopened_archive_sees_every_snapshot(tmp_path):
+    arch = TimetableArchive(str(tmp_path))
+    arch.append(*SCHOOL, 3, 11, "20261019", TT)
+    arch.close()
+
+    reopened = TimetableArchive(str(tmp_path))
+    assert reopened.history(*SCHOOL, 3, 11) == {"20261019": TT}
+    assert not reopened.append(*SCHOOL, 3, 11, "20261019", TT)
+    assert reopened.append(*SCHOOL, 3, 11, "20261020", TT)
+
+
+def test_rows_from_another_writer_are_picked_up(tmp_path):
+    reader, writer = TimetableArchive(str(tmp_path)), TimetableArchive(str(tmp_path))
+    writer.append(*SCHOOL, 3, 11, "20261019", TT)
+    assert reader.history(*SCHOOL, 3, 11) == {"20261019": TT}
+
+    writer.append(*SCHOOL, 3, 11, "20261019", TT[:1])
+    assert reader.history(*SCHOOL, 3, 11) == {"20261019": TT[:1]}
+    # The reader's copy of the latest version includes the writer's append
+    assert not reader.append(*SCHOOL, 3, 11, "20261019", TT[:1])
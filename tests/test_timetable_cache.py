@@ -0,0 +1,32 @@
+import json
+import threading
+
+from src import timetable_cache
+
+ARGS = ("B10", "7010536", 3, 11, "20261019")
+
+
+def test_cache_key_covers_the_whole_query():
+    keys = {
+        timetable_cache._key("his", *ARGS),
+        timetable_cache._key("mis", *ARGS),
+        timetable_cache._key("his", *ARGS, ay="2026"),
+        timetable_cache._key("his", *ARGS, ay="2026", sem="2"),
+    }
+    assert len(keys) == 4
+
+
+def test_school_codes_from_concurrent_lookups_are_all_kept(tmp_path, monkeypatch):
+    path = tmp_path / "school_codes.json"
+    monkeypatch.setattr(timetable_cache, "SCHOOL_CODES_PATH", str(path))
+    monkeypatch.setattr(timetable_cache, "find_school_codes", lambda name: {"SCHUL_NM": name})
+    names = [f"학교{i}" for i in range(8)]
+
+    threads = [threading.Thread(target=timetable_cache.find_school_codes_cached, args=(n,)) for n in names]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(json.loads(path.read_text(encoding="utf-8"))) == sorted(names)
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,33 @@
+from src.timetable_diff import ADDED, REMOVED, ROOM, SUBJECT, diff
+
+OLD = [{"period": 1, "subject": "국어", "room": ""}, {"period": 2, "subject": "수학", "room": "301"}]
+
+
+def test_identical_timetables_have_no_changes():
+    d = diff(OLD, [dict(r) for r in OLD])
+    assert not d and d.summary() == "no changes"
+
+
+def test_added_and_removed_periods():
+    new = [OLD[0], {"period": 3, "subject": "영어", "room": ""}]
+    d = diff(OLD, new)
+
+    assert [(c.kind, c.period) for c in d.changes] == [(REMOVED, 2), (ADDED, 3)]
+    assert d.structural and d.affected_periods == [2, 3]
+
+
+def test_subject_change_is_visible():
+    d = diff(OLD, [OLD[0], dict(OLD[1], subject="과학")])
+
+    assert [(c.kind, c.old, c.new, c.cosmetic) for c in d.changes] == [(SUBJECT, "수학", "과학", False)]
+    assert d.visible == d.changes and not d.structural
+
+
+def test_room_and_alias_respellings_are_not_visible(monkeypatch):
+    monkeypatch.setenv("SUBJECT_ALIASES", '{"인쇄 편집": "광고 콘텐츠"}')
+    old = [{"period": 1, "subject": "인쇄 편집", "room": ""}, OLD[1]]
+    new = [{"period": 1, "subject": "광고 콘텐츠", "room": ""}, dict(OLD[1], room="302")]
+    d = diff(old, new)
+
+    assert [(c.kind, c.cosmetic) for c in d.changes] == [(SUBJECT, True), (ROOM, False)]
+    assert d and not d.visible and d.affected_periods == []
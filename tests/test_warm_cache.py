@@ -0,0 +1,69 @@
+import pytest
+
+from src import (
+    detect_change, font_subset, graph_throttle, neis_quota, run_journal, sprite_atlas, timetable_archive,
+    timetable_cache, token_manager, warm_cache,
+)
+
+
+def _point_layout_at(monkeypatch, root):
+    """Every warm-cache entry under `root`, as a separate machine's STATE_DIR etc. would be."""
+    monkeypatch.setattr(detect_change, "STATE_PATH", str(root / "state" / "posted.json"))
+    monkeypatch.setattr(detect_change, "STAGED_PATH", str(root / "state" / "staged.json"))
+    monkeypatch.setattr(run_journal, "JOURNAL_DIR", str(root / "state" / "journal"))
+    monkeypatch.setattr(timetable_cache, "CACHE_DIR", str(root / "state" / "timetable_cache"))
+    monkeypatch.setattr(timetable_cache, "SCHOOL_CODES_PATH", str(root / "state" / "timetable_cache" / "school_codes.json"))
+    monkeypatch.setattr(timetable_archive, "ARCHIVE_DIR", str(root / "state" / "archive"))
+    monkeypatch.setattr(sprite_atlas, "SPRITE_CACHE_DIR", str(root / "cache" / "sprites"))
+    monkeypatch.setattr(font_subset, "FONT_SUBSET_DIR", str(root / "cache" / "fonts"))
+    monkeypatch.setattr(neis_quota, "QUOTA_PATH", str(root / "state" / "neis_quota.json"))
+    monkeypatch.setattr(graph_throttle, "USAGE_PATH", str(root / "state" / "graph_usage.json"))
+    monkeypatch.setattr(token_manager, "TOKEN_STATE_PATH", str(root / "state" / "token.json"))
+
+
+@pytest.fixture
+def machine(tmp_path, monkeypatch):
+    root = tmp_path / "a"
+    _point_layout_at(monkeypatch, root)
+    files = {
+        "state/posted.json": '{"20261019": {"post_id": "1"}}',
+        "state/timetable_cache/school_codes.json": "{}",
+        "state/timetable_cache/B10_7010536_3_11_20261019.json": '{"timetable": []}',
+        "state/archive/subjects.txt": "국어\n",
+        "cache/sprites/abc/index.json": "{}",
+        "state/neis_quota.json": '{"spent": 1}',
+        "state/token.json": '{"user_token": "SECRET"}',
+    }
+    for rel, text in files.items():
+        p = root / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text, encoding="utf-8")
+    return root
+
+
+def test_digest_is_stable_and_ignores_volatile_sections(machine, tmp_path):
+    first = warm_cache.export_bundle(str(tmp_path / "1.tar.gz"))
+    assert warm_cache.export_bundle(str(tmp_path / "2.tar.gz"))["digest"] == first["digest"]
+
+    (machine / "state" / "neis_quota.json").write_text('{"spent": 2}', encoding="utf-8")
+    (machine / "state" / "timetable_cache" / "B10_7010536_3_11_20261019.json").write_text('{"timetable": [1]}')
+    assert warm_cache.export_bundle(str(tmp_path / "3.tar.gz"))["digest"] == first["digest"]
+
+    (machine / "state" / "posted.json").write_text('{"20261019": {"post_id": "2"}}', encoding="utf-8")
+    assert warm_cache.export_bundle(str(tmp_path / "4.tar.gz"))["digest"] != first["digest"]
+
+
+def test_import_round_trip_without_the_token(machine, tmp_path, monkeypatch):
+    bundle = str(tmp_path / "bundle.tar.gz")
+    exported = warm_cache.export_bundle(bundle)
+    members = {m for s in exported["sections"].values() for m in s["files"]}
+    assert not any("token" in m for m in members)
+
+    other = tmp_path / "b"
+    _point_layout_at(monkeypatch, other)
+    imported = warm_cache.import_bundle(bundle)
+
+    assert (other / "state" / "posted.json").read_text(encoding="utf-8") == '{"20261019": {"post_id": "1"}}'
+    assert (other / "state" / "archive" / "subjects.txt").read_text(encoding="utf-8") == "국어\n"
+    assert not (other / "state" / "token.json").exists()
+    assert warm_cache.export_bundle(str(tmp_path / "again.tar.gz"))["digest"] == imported["digest"]